@@ -0,0 +1,43 @@
+"""
+Benchmarks for the password manager.
+
+Run them from the repository root, e.g. ``python -m benchmarks.bench_wordlist``.
+They use the project settings and, where views are exercised, a throwaway
+test database so the development database is never touched.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+
+def setup_django():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "security_tools.settings")
+    import django
+    django.setup()
+
+
+@contextmanager
+def test_database(verbosity=0):
+    """Create the test database for the default alias and drop it afterwards"""
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=verbosity, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+        teardown_test_environment()
+
+
+def measure_rate(func, duration=2.0, min_calls=5):
+    """Call ``func`` repeatedly for ``duration`` seconds and return calls/sec"""
+    calls = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < duration or calls < min_calls:
+        func()
+        calls += 1
+        elapsed = time.perf_counter() - start
+    return calls / elapsed
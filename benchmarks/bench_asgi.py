@@ -0,0 +1,108 @@
+"""
+Concurrent throughput of the async views under uvicorn against the sync views
+under gunicorn sync workers.
+
+    python -m benchmarks.bench_asgi [--workers N] [--users 4,16,64] [--duration SECONDS]
+
+Both servers get the same number of workers and a fresh SQLite database
+(benchmarks.settings). Each virtual user registers once, outside the
+measurement, then loops login (login_step1, plus login_step2 once per TOTP
+step) and vault CRUD, the endpoints that have async versions. With more
+users than workers a sync worker holds each request for its whole duration,
+including password hashing and queries, while an event loop keeps accepting
+requests; the table shows requests/sec, p95 and errors per server and
+concurrency.
+
+On Django 4.1 the async ORM still runs each query through sync_to_async,
+so the async views only pay off where requests mostly wait (remote
+database, DynamoDB via aiobotocore, hashing on other cores).
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+
+from benchmarks import setup_django
+from benchmarks.bench_endpoints import (
+    TOTP_STEP, FlowError, HTTPClient, RealClock, Recorder, VirtualUser, endpoint_urls,
+    percentile, spawn_server,
+)
+
+SERVERS = ("gunicorn", "uvicorn")
+
+
+def run_load(url, users, duration):
+    """Registered users loop login and vault CRUD; returns a result row"""
+    urls = endpoint_urls()
+    clock = RealClock()
+    recorder = Recorder()
+    virtual_users = [VirtualUser(HTTPClient(url), Recorder(), clock, urls) for _ in range(users)]
+    for user in virtual_users:
+        user.register()
+        user.recorder = recorder
+
+    def loop(user, deadline):
+        while time.perf_counter() < deadline:
+            try:
+                if user.account["last_step"] <= int(time.time() // TOTP_STEP):
+                    user.login()
+                else:
+                    # A device takes one code per TOTP step; between steps
+                    # exercise the password check alone
+                    user.call("login_step1", "POST", urls["login_step1"], {
+                        "uuid": user.account["uuid"], "auth_hash": user.account["auth_hash"],
+                    })
+                user.vault_crud()
+            except FlowError as e:
+                print(f"flow failed: {e}", file=sys.stderr)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=loop, args=(user, start + duration)) for user in virtual_users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = [value for values in recorder.latencies.values() for value in values]
+    return {
+        "users": users,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1) if latencies else None,
+        "errors": sum(recorder.errors.values()),
+        "endpoints": recorder.summary(elapsed),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--users", default="4,16,64",
+                        help="Comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--output", help="Also write the JSON result to this file")
+    args = parser.parse_args()
+    levels = [int(level) for level in args.users.split(",")]
+
+    setup_django()
+    results = {}
+    for server in SERVERS:
+        with spawn_server(args.workers, server) as (url, _):
+            results[server] = [run_load(url, users, args.duration) for users in levels]
+
+    print(f"{args.workers} workers, {args.duration:.0f} s per run")
+    print(f"  {'users':>5}  {'server':<9} {'req/s':>8} {'p95 ms':>8} {'errors':>7}")
+    for index, users in enumerate(levels):
+        for server in SERVERS:
+            row = results[server][index]
+            print(f"  {users:>5}  {server:<9} {row['rps']:>8.1f} {row['p95_ms']:>8.1f} {row['errors']:>7}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"workers": args.workers, "duration_s": args.duration, "results": results},
+                      f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,505 @@
+"""
+Throughput and latency of the registration, login and vault endpoints.
+
+    python -m benchmarks.bench_endpoints [--duration SECONDS] [--output FILE]
+    python -m benchmarks.bench_endpoints --mode http --spawn-gunicorn 4 --users 16
+    python -m benchmarks.bench_endpoints --mode http --spawn-uvicorn 4 --users 16
+    python -m benchmarks.bench_endpoints --mode http --url http://127.0.0.1:8000
+    python -m benchmarks.bench_endpoints --compare baseline.json [--tolerance 0.2]
+
+Every virtual user loops over three flows: registration (initial_registration
+-> verify_totp -> complete_registration), login (login_step1 -> login_step2)
+and vault CRUD (create, list, get, update, delete). Results are printed as
+JSON: requests/sec and p50/p95/p99 latency per endpoint, DB queries per
+request (in-process mode only) and peak RSS.
+
+In-process mode drives the Django test client on a throwaway test database
+with a fake TOTP clock that moves one step per verification, so a run is
+reproducible. HTTP mode runs ``--users`` concurrent clients (locust-style)
+against a server; ``--spawn-gunicorn N`` starts gunicorn with N workers (and
+``--spawn-uvicorn N`` uvicorn with the async views) on benchmarks.settings
+and a fresh SQLite database, and the real clock is used.
+Either way each login sends the code for the step after the one its device
+last accepted, which the server's one-step tolerance admits.
+
+``--compare`` exits non-zero if any endpoint's requests/sec dropped, or p95
+grew, by more than ``--tolerance`` against an earlier JSON result.
+"""
+import argparse
+import base64
+import hashlib
+import hmac
+import html
+import http.cookiejar
+import json
+import os
+import platform
+import re
+import resource
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from contextlib import contextmanager
+
+from benchmarks import setup_django, test_database
+
+
+TOTP_STEP = 30
+
+UUID_RE = re.compile(r'<code id="uuid-display">(.*?)</code>')
+SECRET_RE = re.compile(r'<code id="totp-code">(.*?)</code>')
+WORDS_RE = re.compile(r'<ul id="word-list">(.*?)</ul>', re.S)
+WORD_RE = re.compile(r'<li>(.*?)</li>')
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class TOTPClock:
+    """
+    A fake clock for TOTP: starts at a fixed time and only moves when
+    ``advance`` is called, one TOTP step at a time.
+    """
+
+    def __init__(self, start=1_700_000_000):
+        self.now = float(start)
+        self._lock = threading.Lock()
+
+    def time(self):
+        return self.now
+
+    def advance(self):
+        with self._lock:
+            self.now += TOTP_STEP
+            return self.now
+
+
+class RealClock:
+    def time(self):
+        return time.time()
+
+    def advance(self):
+        return time.time()
+
+
+def totp_code(secret, at):
+    """The 6-digit code for a base32 ``secret`` at unix time ``at``"""
+    from django_otp.oath import TOTP
+
+    totp = TOTP(base64.b32decode(secret), step=TOTP_STEP)
+    totp.time = at
+    return f"{totp.token():06d}"
+
+
+class Recorder:
+    """Per-endpoint latencies, query counts and errors, shared by all clients"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.queries = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, elapsed, ok, queries=None):
+        with self._lock:
+            self.latencies.setdefault(endpoint, []).append(elapsed)
+            if queries is not None:
+                self.queries.setdefault(endpoint, []).append(queries)
+            if not ok:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def summary(self, duration):
+        endpoints = {}
+        for endpoint, latencies in sorted(self.latencies.items()):
+            queries = self.queries.get(endpoint)
+            endpoints[endpoint] = {
+                "requests": len(latencies),
+                "errors": self.errors.get(endpoint, 0),
+                "rps": round(len(latencies) / duration, 2),
+                "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+                "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+                "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+                "queries_per_request": (
+                    round(sum(queries) / len(queries), 2) if queries else None
+                ),
+            }
+        return endpoints
+
+
+class InProcessClient:
+    """Django test client that also counts the queries each request runs"""
+
+    def __init__(self):
+        from django.test import Client
+        self.client = Client()
+
+    def request(self, method, path, body=None):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        kwargs = {}
+        if body is not None:
+            kwargs = {"data": json.dumps(body), "content_type": "application/json"}
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = getattr(self.client, method.lower())(path, **kwargs)
+            content = (b"".join(response.streaming_content) if response.streaming
+                       else response.content)
+            elapsed = time.perf_counter() - start
+        return response.status_code, content, elapsed, len(queries)
+
+
+class HTTPClient:
+    """One virtual user against a live server: its own cookie jar"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+        )
+
+    def request(self, method, path, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method)
+        if data is not None:
+            request.add_header("Content-Type", "application/json")
+        start = time.perf_counter()
+        try:
+            with self.opener.open(request, timeout=30) as response:
+                status, content = response.status, response.read()
+        except urllib.error.HTTPError as e:
+            status, content = e.code, e.read()
+        return status, content, time.perf_counter() - start, None
+
+
+class VirtualUser:
+    """Runs the flows with one client, recording every call"""
+
+    def __init__(self, client, recorder, clock, urls):
+        self.client = client
+        self.recorder = recorder
+        self.clock = clock
+        self.urls = urls
+        self.account = None
+
+    def call(self, endpoint, method, path, body=None, expect=(200, 201)):
+        status, content, elapsed, queries = self.client.request(method, path, body)
+        ok = status in expect
+        self.recorder.record(endpoint, elapsed, ok, queries)
+        if not ok:
+            raise FlowError(f"{endpoint} returned {status}: {content[:200]!r}")
+        return content
+
+    def register(self):
+        page = self.call("initial_registration", "GET", self.urls["initial_registration"])
+        page = page.decode()
+        user_id = UUID_RE.search(page).group(1)
+        secret = SECRET_RE.search(page).group(1)
+        words = [html.unescape(w) for w in WORD_RE.findall(WORDS_RE.search(page).group(1))]
+
+        self.call("verify_totp", "POST", self.urls["verify_totp"],
+                  {"totp_code": totp_code(secret, self.clock.advance())})
+
+        username = secrets.token_bytes(16)
+        auth_hash = secrets.token_urlsafe(32)
+        wrapped_key = secrets.token_bytes(40)
+        signature = hmac.new(" ".join(words[5:]).encode(), wrapped_key, hashlib.sha256).digest()
+        self.call("complete_registration", "POST", self.urls["complete_registration"], {
+            "username_hash": base64.b64encode(hashlib.sha512(username).digest()).decode(),
+            "auth_hash": auth_hash,
+            "wrapped_key": base64.b64encode(wrapped_key).decode(),
+            "hmac_wrapped_key": base64.b64encode(signature).decode(),
+            "algorithm": "aesgcm",
+        })
+        self.account = {"uuid": user_id, "secret": secret, "auth_hash": auth_hash,
+                        "last_step": int(self.clock.time() // TOTP_STEP)}
+
+    def login(self):
+        # A device only accepts a code for a later step than the last one it
+        # verified, but tolerates one step of skew: use the next step's code
+        account = self.account
+        step = max(int(self.clock.time() // TOTP_STEP), account["last_step"] + 1)
+        body = json.loads(self.call("login_step1", "POST", self.urls["login_step1"], {
+            "uuid": account["uuid"], "auth_hash": account["auth_hash"],
+        }))
+        self.call("login_step2", "POST", self.urls["login_step2"], {
+            "totp_code": totp_code(account["secret"], step * TOTP_STEP),
+            "login_token": body["login_token"],
+        })
+        account["last_step"] = step
+
+    def vault_crud(self):
+        created = json.loads(self.call("vault_create", "POST", self.urls["user_data_create"], {
+            "name": "bench item", "encrypted_data": base64.b64encode(os.urandom(256)).decode(),
+        }))
+        detail = self.urls["user_data_detail"].replace("00000000-0000-0000-0000-000000000000",
+                                                       created["id"])
+        self.call("vault_list", "GET", self.urls["user_data_list"])
+        self.call("vault_get", "GET", detail)
+        self.call("vault_update", "PUT", detail, {
+            "name": "bench item", "encrypted_data": base64.b64encode(os.urandom(256)).decode(),
+        })
+        self.call("vault_delete", "DELETE", detail)
+
+    def run(self, deadline, iterations=None):
+        done = 0
+        while (iterations is None and time.perf_counter() < deadline) or \
+                (iterations is not None and done < iterations):
+            try:
+                self.register()
+                self.login()
+                self.vault_crud()
+            except FlowError as e:
+                print(f"flow failed: {e}", file=sys.stderr)
+            done += 1
+
+
+class FlowError(Exception):
+    pass
+
+
+def endpoint_urls():
+    from django.urls import reverse
+
+    urls = {name: reverse(f"password_manager:{name}") for name in (
+        "initial_registration", "verify_totp", "complete_registration",
+        "login_step1", "login_step2", "user_data_list", "user_data_create",
+    )}
+    urls["user_data_detail"] = reverse(
+        "password_manager:user_data_detail", args=["00000000-0000-0000-0000-000000000000"]
+    )
+    return urls
+
+
+@contextmanager
+def fake_totp_clock(clock):
+    """Make the server's TOTP checks read ``clock`` instead of the real time"""
+    from types import SimpleNamespace
+    from unittest import mock
+    from password_manager.utils import device_cache
+
+    # The module's LRU expiry keeps using the real monotonic clock
+    fake_time = SimpleNamespace(time=clock.time, monotonic=time.monotonic)
+    with mock.patch.object(device_cache, "time", fake_time):
+        yield
+
+
+def run_in_process(duration, iterations=None):
+    """Run the flows with the test client; returns (recorder, elapsed seconds)"""
+    recorder = Recorder()
+    clock = TOTPClock()
+    user = VirtualUser(InProcessClient(), recorder, clock, endpoint_urls())
+    with fake_totp_clock(clock):
+        # Warm up (word list, hashers, QR pool) outside the measurement
+        VirtualUser(InProcessClient(), Recorder(), clock, endpoint_urls()).run(0, iterations=1)
+        start = time.perf_counter()
+        user.run(start + duration, iterations)
+        elapsed = time.perf_counter() - start
+    return recorder, elapsed
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def process_tree_rss_kib(pid):
+    """Current RSS in KiB of ``pid`` and each of its children"""
+    rss = {}
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            pids += [int(child) for child in f.read().split()]
+    except OSError:
+        pass
+    for each in pids:
+        try:
+            with open(f"/proc/{each}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        rss[each] = int(line.split()[1])
+        except OSError:
+            continue
+    return rss
+
+
+@contextmanager
+def fresh_database():
+    """Migrate a new SQLite database; yields the environment for servers using it"""
+    db = tempfile.NamedTemporaryFile(suffix=".sqlite3", delete=False)
+    db.close()
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE="benchmarks.settings", BENCHMARK_DB=db.name)
+    try:
+        subprocess.run([sys.executable, "manage.py", "migrate", "-v", "0"], env=env, check=True)
+        yield env
+    finally:
+        os.unlink(db.name)
+
+
+@contextmanager
+def spawn_server(workers, server="gunicorn"):
+    """
+    Migrate a fresh SQLite database and serve it with gunicorn sync workers,
+    or with ``server="uvicorn"`` uvicorn workers running the async views
+    """
+    with fresh_database() as env:
+        port = free_port()
+        if server == "uvicorn":
+            env["ASYNC_VIEWS_ENABLED"] = "true"
+            command = ["uvicorn", "security_tools.asgi:application", "--host", "127.0.0.1",
+                       "--port", str(port), "--workers", str(workers), "--log-level", "warning"]
+        else:
+            command = ["gunicorn", "security_tools.wsgi:application", "--bind", f"127.0.0.1:{port}",
+                       "--workers", str(workers), "--log-level", "warning"]
+        process = subprocess.Popen([sys.executable, "-m", *command], env=env)
+        url = f"http://127.0.0.1:{port}"
+        try:
+            deadline = time.time() + 30
+            while True:
+                try:
+                    urllib.request.urlopen(url + "/password_manager/ready/", timeout=5).close()
+                    break
+                except OSError:
+                    # Refused until bound; the first request may also time out while a worker warms up
+                    if time.time() > deadline or process.poll() is not None:
+                        raise RuntimeError(f"{server} did not start")
+                    time.sleep(0.2)
+            yield url, process.pid
+        finally:
+            process.terminate()
+            process.wait(10)
+
+
+def run_http(url, users, duration, server_pid=None):
+    """Run ``users`` concurrent virtual users; returns (recorder, elapsed, rss)"""
+    recorder = Recorder()
+    urls = endpoint_urls()
+    clock = RealClock()
+    peak = {"total_kib": 0, "worker_kib": 0}
+    stop = threading.Event()
+
+    def sample_rss():
+        while not stop.wait(0.25):
+            rss = process_tree_rss_kib(server_pid)
+            peak["total_kib"] = max(peak["total_kib"], sum(rss.values()))
+            workers = [v for pid, v in rss.items() if pid != server_pid]
+            peak["worker_kib"] = max([peak["worker_kib"]] + workers)
+
+    sampler = threading.Thread(target=sample_rss, daemon=True) if server_pid else None
+    if sampler:
+        sampler.start()
+    start = time.perf_counter()
+    deadline = start + duration
+    threads = [
+        threading.Thread(target=VirtualUser(HTTPClient(url), recorder, clock, urls).run,
+                         args=(deadline,))
+        for _ in range(users)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    rss = None
+    if sampler:
+        sampler.join()
+        rss = {"server_peak_rss_mib": round(peak["total_kib"] / 1024, 1),
+               "worker_peak_rss_mib": round(peak["worker_kib"] / 1024, 1)}
+    return recorder, elapsed, rss
+
+
+def compare(result, baseline, tolerance):
+    """Return a list of regressions of ``result`` against ``baseline``"""
+    regressions = []
+    for endpoint, before in baseline.get("endpoints", {}).items():
+        after = result["endpoints"].get(endpoint)
+        if after is None:
+            continue
+        if before["rps"] and after["rps"] < before["rps"] * (1 - tolerance):
+            regressions.append(f"{endpoint}: rps {before['rps']} -> {after['rps']}")
+        if before["p95_ms"] and after["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{endpoint}: p95 {before['p95_ms']} ms -> {after['p95_ms']} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mode", choices=["inprocess", "http"], default="inprocess")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--users", type=int, default=8, help="Concurrent clients (http)")
+    parser.add_argument("--url", help="Server to benchmark (http)")
+    parser.add_argument("--spawn-gunicorn", type=int, metavar="WORKERS",
+                        help="Start gunicorn with this many workers (http)")
+    parser.add_argument("--spawn-uvicorn", type=int, metavar="WORKERS",
+                        help="Start uvicorn and the async views with this many workers (http)")
+    parser.add_argument("--output", help="Also write the JSON result to this file")
+    parser.add_argument("--compare", help="Earlier JSON result to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "benchmarks.settings")
+    setup_django()
+    import django
+    import logging
+    # Failed requests are reported by the flows; don't log each one
+    logging.getLogger("django.request").setLevel(logging.CRITICAL)
+
+    result = {
+        "mode": args.mode,
+        "duration_s": args.duration,
+        "environment": {
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "cpus": os.cpu_count(),
+            "host": platform.node(),
+        },
+    }
+    if args.mode == "inprocess":
+        with test_database():
+            recorder, elapsed = run_in_process(args.duration)
+        result["peak_rss_mib"] = round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+        )
+    else:
+        result["users"] = args.users
+        spawn = [(server, getattr(args, f"spawn_{server}")) for server in ("gunicorn", "uvicorn")
+                 if getattr(args, f"spawn_{server}")]
+        if spawn:
+            server, workers = spawn[0]
+            result[f"{server}_workers"] = workers
+            with spawn_server(workers, server) as (url, pid):
+                recorder, elapsed, rss = run_http(url, args.users, args.duration, pid)
+            result.update(rss)
+        elif args.url:
+            recorder, elapsed, _ = run_http(args.url, args.users, args.duration)
+        else:
+            parser.error("--mode http needs --url, --spawn-gunicorn or --spawn-uvicorn")
+    result["endpoints"] = recorder.summary(elapsed)
+
+    output = json.dumps(result, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Import cost of the project at worker boot, from ``python -X importtime``.
+
+    python -m benchmarks.bench_imports [--top N] [--budget MS]
+
+Runs ``django.setup()`` and imports the root URLconf (what a worker or a
+management command running system checks does) in a fresh interpreter,
+then reports the time spent importing the project's modules together with
+the third-party modules they pull in first, the slowest of those, and which
+heavy optional dependencies were loaded. Bytecode caching is on and the
+garbage collector off in the measured interpreter, so the numbers reflect
+import work rather than compilation or a collection that happened to run.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+BOOT = (
+    "import gc; gc.disable(); import django; django.setup(); "
+    "import security_tools.urls"
+)
+# Measured at ~14 ms; python-jose alone used to add ~60 ms
+DEFAULT_BUDGET_MS = 50
+PROJECT_PACKAGES = ("password_manager", "security_tools")
+# Loaded on first use only; none of them may be imported at boot
+LAZY_MODULES = (
+    "jose", "qrcode", "PIL", "boto3", "concurrent.futures.process",
+    "msgpack", "cbor2", "brotli", "zstandard",
+)
+
+
+def import_times(statement=BOOT, settings="security_tools.settings", runs=2):
+    """
+    Return ``[(depth, self_us, cumulative_us, module), ...]`` from the last
+    of ``runs`` interpreters running ``statement``; the earlier runs warm
+    the bytecode cache.
+    """
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for _ in range(runs):
+        stderr = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", statement],
+            env=env, cwd=root, capture_output=True, text=True, check=True,
+        ).stderr
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((depth, int(self_us), int(cumulative_us), name.strip()))
+    return entries
+
+
+def project_import_ms(entries):
+    """
+    Milliseconds spent in imports the project started: top-level imports of
+    its modules (as done by django.setup and the URLconf), including the
+    dependencies they loaded first
+    """
+    return sum(
+        cumulative for depth, _, cumulative, name in entries
+        if depth == 0 and name.split(".")[0] in PROJECT_PACKAGES
+    ) / 1000
+
+
+def loaded_lazy_modules(entries):
+    names = {name for _, _, _, name in entries}
+    return [module for module in LAZY_MODULES if module in names]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--budget", type=float, nargs="?", const=DEFAULT_BUDGET_MS,
+                        help="Exit non-zero if project imports take longer "
+                             f"(milliseconds; default {DEFAULT_BUDGET_MS}) or load a lazy module")
+    args = parser.parse_args()
+
+    entries = import_times()
+    print(f"project imports: {project_import_ms(entries):.1f} ms")
+    print("slowest project modules (cumulative ms):")
+    project = sorted(
+        (entry for entry in entries if entry[3].split(".")[0] in PROJECT_PACKAGES),
+        key=lambda entry: entry[2], reverse=True,
+    )
+    for _, self_us, cumulative_us, name in project[:args.top]:
+        print(f"  {cumulative_us / 1000:>7.1f}  {name}")
+    lazy = loaded_lazy_modules(entries)
+    print(f"lazy modules loaded at boot: {', '.join(lazy) or 'none'}")
+    if args.budget is not None and (project_import_ms(entries) > args.budget or lazy):
+        sys.exit(f"over the import budget of {args.budget:g} ms or loading lazy modules")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Check that login_step1 takes as long for unknown users as for known ones.
+
+    python -m benchmarks.bench_login_timing [--samples N] [--threshold FRACTION]
+
+Records login_step1 latency for a known user with a wrong auth hash and for
+usernames that don't exist, interleaving the two, and exits non-zero if
+their p10/p50/p90 differ by more than the threshold (relative).
+"""
+import argparse
+import base64
+import hashlib
+import json
+import logging
+import secrets
+import sys
+import time
+
+
+QUANTILES = (0.1, 0.5, 0.9)
+
+
+def login_latencies(client, url, payloads, samples):
+    """
+    Time ``samples`` POSTs of each payload to ``url``, round-robin so drift
+    in machine load affects every payload alike. Returns one list per payload.
+    """
+    timings = [[] for _ in payloads]
+    for _ in range(samples):
+        for index, payload in enumerate(payloads):
+            body = json.dumps(payload() if callable(payload) else payload)
+            start = time.perf_counter()
+            client.post(url, body, content_type="application/json")
+            timings[index].append(time.perf_counter() - start)
+    return timings
+
+
+def compare_distributions(first, second, threshold):
+    """
+    Return ``(diverged, report)`` for two latency samples.
+
+    ``report`` maps each quantile to (first, second, relative difference).
+    """
+    from password_manager.management.commands.calibrate_hashers import percentile
+
+    report = {}
+    diverged = False
+    for quantile in QUANTILES:
+        a, b = percentile(first, quantile), percentile(second, quantile)
+        difference = abs(a - b) / max(a, b)
+        report[quantile] = (a, b, difference)
+        diverged = diverged or difference > threshold
+    return diverged, report
+
+
+def known_and_unknown_payloads(user):
+    """A wrong auth hash for ``user`` and a fresh unknown username per call"""
+    known = {
+        "username_hash": base64.b64encode(bytes(user.sha512hash)).decode(),
+        "auth_hash": "wrong-auth-hash",
+    }
+
+    def unknown():
+        username = hashlib.sha512(secrets.token_bytes(16)).digest()
+        return {
+            "username_hash": base64.b64encode(username).decode(),
+            "auth_hash": "wrong-auth-hash",
+        }
+
+    return known, unknown
+
+
+def create_known_user():
+    from password_manager.models import CustomUser
+    from password_manager.utils.hashing import get_hashing_service
+
+    user = CustomUser.objects.create(sha512hash=hashlib.sha512(b"timing").digest())
+    get_hashing_service().set_password(user, "auth-hash")
+    user.save()
+    return user
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--samples", type=int, default=50)
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args()
+
+    from benchmarks import setup_django, test_database
+    setup_django()
+    from django.test import Client, override_settings
+    from django.urls import reverse
+
+    # Every sample is a 401; don't log each one
+    logging.getLogger("django.request").setLevel(logging.ERROR)
+    # Measure the login pipeline itself, not the brute-force throttle
+    with test_database(), override_settings(THROTTLING={"ENABLED": False}):
+        client = Client()
+        known, unknown = known_and_unknown_payloads(create_known_user())
+        url = reverse("password_manager:login_step1")
+        # Warm up connections, the dummy hash and the hasher
+        login_latencies(client, url, [known, unknown], 3)
+        known_times, unknown_times = login_latencies(
+            client, url, [known, unknown], args.samples
+        )
+
+    diverged, report = compare_distributions(known_times, unknown_times, args.threshold)
+    print(f"login_step1 latency, {args.samples} samples each (ms)")
+    print(f"  {'quantile':>8} {'known':>9} {'unknown':>9} {'diff':>7}")
+    for quantile, (a, b, difference) in report.items():
+        print(f"  {'p%d' % (quantile * 100):>8} {a * 1000:>9.2f} {b * 1000:>9.2f} {difference:>7.1%}")
+    if diverged:
+        print(f"FAIL: distributions differ by more than {args.threshold:.0%}")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
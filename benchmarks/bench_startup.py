@@ -0,0 +1,111 @@
+"""
+Startup time and per-worker memory of the gunicorn.conf.py server profiles.
+
+    python -m benchmarks.bench_startup [--workers N] [--requests N]
+
+Starts gunicorn with the project config for each profile (sync, uvicorn),
+with and without preloading, on benchmarks.settings and a fresh SQLite
+database. Reports the time from launch to the first 200 from the readiness
+endpoint, then, after ``--requests`` requests have warmed the workers, each
+worker's RSS, PSS (shared pages split between the processes sharing them)
+and private memory from /proc/<pid>/smaps_rollup. Preloading shows up as a
+lower PSS and private size for the same RSS.
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+import urllib.request
+
+from benchmarks.bench_endpoints import fresh_database, free_port
+
+PROFILES = [("sync", True), ("sync", False), ("uvicorn", True), ("uvicorn", False)]
+READY_PATH = "/password_manager/ready/"
+
+
+def memory_kib(pid):
+    """RSS, PSS and private KiB of ``pid`` from smaps_rollup"""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            if name in ("Rss", "Pss", "Private_Clean", "Private_Dirty"):
+                values[name] = int(rest.split()[0])
+    return {
+        "rss_mib": round(values["Rss"] / 1024, 1),
+        "pss_mib": round(values["Pss"] / 1024, 1),
+        "private_mib": round((values["Private_Clean"] + values["Private_Dirty"]) / 1024, 1),
+    }
+
+
+def children(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(child) for child in f.read().split()]
+
+
+def measure(env, profile, preload, workers, requests):
+    port = free_port()
+    env = dict(env, SERVER_PROFILE=profile, GUNICORN_PRELOAD=str(preload).lower(),
+               WEB_CONCURRENCY=str(workers), PORT=str(port))
+    url = f"http://127.0.0.1:{port}{READY_PATH}"
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-m", "gunicorn"], env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            try:
+                urllib.request.urlopen(url, timeout=5).close()
+                break
+            except OSError:
+                if process.poll() is not None or time.perf_counter() - start > 60:
+                    raise RuntimeError(f"{profile} profile did not become ready")
+                time.sleep(0.01)
+        first_request = time.perf_counter() - start
+
+        for _ in range(requests):
+            urllib.request.urlopen(url, timeout=5).close()
+        worker_pids = children(process.pid)
+        return {
+            "profile": profile,
+            "preload": preload,
+            "time_to_first_request_s": round(first_request, 3),
+            "master": memory_kib(process.pid),
+            "workers": [memory_kib(pid) for pid in worker_pids],
+        }
+    finally:
+        process.terminate()
+        process.wait(15)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--requests", type=int, default=50,
+                        help="Requests sent to warm the workers before measuring memory")
+    parser.add_argument("--output", help="Also write the JSON result to this file")
+    args = parser.parse_args()
+
+    with fresh_database() as env:
+        results = [measure(env, profile, preload, args.workers, args.requests)
+                   for profile, preload in PROFILES]
+
+    print(f"{args.workers} workers; memory per worker (MiB), mean over workers")
+    print(f"  {'profile':<8} {'preload':<8} {'first req s':>11} {'rss':>7} {'pss':>7} {'private':>8}")
+    for result in results:
+        workers = result["workers"]
+
+        def mean(key):
+            return sum(worker[key] for worker in workers) / len(workers)
+
+        print(f"  {result['profile']:<8} {str(result['preload']):<8} "
+              f"{result['time_to_first_request_s']:>11.2f} {mean('rss_mib'):>7.1f} "
+              f"{mean('pss_mib'):>7.1f} {mean('private_mib'):>8.1f}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"workers": args.workers, "results": results}, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Bytes on the wire and serialization CPU of vault payloads per 1,000 items.
+
+    python -m benchmarks.bench_vault_encoding [--items N] [--ciphertext BYTES] [--rounds N]
+
+Encodes a listing page (metadata only) and a batch of full items, as the
+views do, with the stdlib JSON encoder (what JsonResponse used), the JSON
+encoder now in use, MessagePack and CBOR, and compresses the listing with
+each available coding. Formats whose package isn't installed are skipped.
+"""
+import argparse
+import base64
+import json
+import os
+import time
+import uuid
+from datetime import timedelta
+
+
+def sample_items(count, ciphertext_size):
+    from django.utils import timezone
+    from password_manager.models import UserData
+
+    now = timezone.now()
+    return [
+        UserData(
+            item_id=uuid.uuid4(),
+            name=f"login {index}",
+            encrypted_data=base64.b64encode(os.urandom(ciphertext_size)).decode(),
+            created_at=now - timedelta(days=index),
+            updated_at=now - timedelta(minutes=index),
+        )
+        for index in range(count)
+    ]
+
+
+def listing_payload(items):
+    return {
+        'success': True,
+        'items': [{
+            'id': str(item.item_id),
+            'name': item.name,
+            'created_at': item.created_at.isoformat(),
+            'updated_at': item.updated_at.isoformat(),
+        } for item in items],
+        'next_cursor': None,
+    }
+
+
+def cpu_per_call(func, rounds):
+    """Process CPU seconds per call of ``func``, best of ``rounds``"""
+    best = None
+    for _ in range(rounds):
+        start = time.process_time()
+        func()
+        elapsed = time.process_time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def measure(items, rounds):
+    """
+    Return rows of ``(payload, encoding, bytes, cpu seconds)``, scaled to
+    1,000 items.
+    """
+    from password_manager.utils import encoding
+    from password_manager.views import vault_item_data
+
+    scale = 1000 / len(items)
+    listing = listing_payload(items)
+    full = {'success': True, 'items': [vault_item_data(item) for item in items], 'missing': []}
+    raw_full = encoding._raw_ciphertext(full)
+
+    encoders = [("json (stdlib)", lambda data: json.dumps(data).encode(), False)]
+    if encoding.orjson is not None:
+        encoders.append(("json (orjson)", encoding.dumps_json, False))
+    for media_type in (encoding.MSGPACK, encoding.CBOR):
+        if media_type in encoding.ENCODERS:
+            encoders.append((media_type.split('/')[1], encoding.ENCODERS[media_type], True))
+
+    rows = []
+    for name, payload, raw in (("listing", listing, listing), ("full items", full, raw_full)):
+        for label, encoder, binary in encoders:
+            data = raw if binary else payload
+            body = encoder(data)
+            rows.append((name, label, len(body) * scale, cpu_per_call(lambda: encoder(data), rounds) * scale))
+
+    body = encoding.dumps_json(listing)
+    for coding, compress in encoding.COMPRESSORS.items():
+        def encode_and_compress():
+            return compress(encoding.dumps_json(listing))
+        rows.append((
+            "listing", f"json + {coding}",
+            len(compress(body)) * scale, cpu_per_call(encode_and_compress, rounds) * scale,
+        ))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--ciphertext", type=int, default=256, help="Ciphertext bytes per item")
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    from benchmarks import setup_django
+    setup_django()
+
+    rows = measure(sample_items(args.items, args.ciphertext), args.rounds)
+    print(f"per 1,000 items ({args.ciphertext}-byte ciphertexts)")
+    print(f"  {'payload':<11} {'encoding':<16} {'bytes':>10} {'cpu ms':>8}")
+    for payload, label, size, cpu in rows:
+        print(f"  {payload:<11} {label:<16} {size:>10.0f} {cpu * 1000:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Compare the legacy per-call word list loading with the preloaded index.
+
+    python -m benchmarks.bench_wordlist [--duration SECONDS]
+
+Reports word draws/sec and initial_registration GETs/sec before and after.
+"""
+import argparse
+import os
+import random
+from unittest import mock
+
+from benchmarks import measure_rate, setup_django, test_database
+
+
+def legacy_generate_random_words(num_words=10):
+    """The pre-index implementation: re-read and re-split the file per call"""
+    from django.conf import settings
+
+    word_list_path = os.path.join(settings.BASE_DIR, 'cli', 'my_list1.txt')
+    with open(word_list_path, 'r') as f:
+        word_list = f.read().splitlines()
+    return random.sample(word_list, num_words)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--duration", type=float, default=2.0)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import Client
+    from django.urls import reverse
+    from password_manager import views
+
+    print("word draws/sec (10 words)")
+    print(f"  before: {measure_rate(legacy_generate_random_words, args.duration):10.1f}")
+    print(f"  after:  {measure_rate(views.generate_random_words, args.duration):10.1f}")
+
+    url = reverse("password_manager:initial_registration")
+    with test_database():
+        client = Client()
+        print("initial_registration GETs/sec")
+        with mock.patch.object(views, "generate_random_words", legacy_generate_random_words):
+            before = measure_rate(lambda: client.get(url), args.duration)
+        after = measure_rate(lambda: client.get(url), args.duration)
+        print(f"  before: {before:10.1f}")
+        print(f"  after:  {after:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
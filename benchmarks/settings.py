@@ -0,0 +1,29 @@
+"""
+Settings for benchmark servers: the project settings on a throwaway SQLite
+database, with brute-force throttling off so load isn't rejected.
+
+    BENCHMARK_DB=/tmp/bench.sqlite3 DJANGO_SETTINGS_MODULE=benchmarks.settings ...
+
+With DB_DEFAULT=postgres the project's Postgres configuration (DB_* variables,
+including the connection pool and replica) is used instead.
+"""
+import os
+import tempfile
+
+from security_tools.settings import *  # noqa: F401,F403
+
+DEBUG = False
+ALLOWED_HOSTS = ["*"]
+
+if os.environ.get("DB_DEFAULT") != "postgres":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.environ.get(
+                "BENCHMARK_DB", os.path.join(tempfile.gettempdir(), "password-manager-bench.sqlite3")
+            ),
+        }
+    }
+    VAULT_READ_REPLICA = None
+
+THROTTLING = {"ENABLED": False}
@@ -0,0 +1,68 @@
+"""
+Production server profile, read by gunicorn from the working directory:
+
+    gunicorn                                # SERVER_PROFILE=sync (default)
+    SERVER_PROFILE=uvicorn gunicorn         # uvicorn workers, async views
+
+"sync" serves security_tools.wsgi with sync workers (gthread with
+GUNICORN_THREADS > 1). "uvicorn" serves security_tools.asgi with
+uvicorn's gunicorn worker, one event loop per core, and turns on
+ASYNC_VIEWS. Worker counts come from security_tools.server unless
+WEB_CONCURRENCY is set; token login with several workers and no shared
+cache is refused at startup.
+
+The app is preloaded in the master (settings, URLconf, word list) so
+workers share those pages copy-on-write; nothing that starts threads or
+opens connections runs before the fork. Workers are recycled after
+GUNICORN_MAX_REQUESTS requests, jittered so they don't restart together.
+"""
+import os
+
+from security_tools import server
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "security_tools.settings")
+
+profile = os.environ.get("SERVER_PROFILE", "sync")
+if profile not in ("sync", "uvicorn"):
+    raise RuntimeError(f"Unknown SERVER_PROFILE {profile!r}; use sync or uvicorn")
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '3000')}"
+
+if profile == "uvicorn":
+    os.environ.setdefault("ASYNC_VIEWS_ENABLED", "true")
+    wsgi_app = "security_tools.asgi:application"
+    worker_class = "uvicorn.workers.UvicornWorker"
+else:
+    wsgi_app = "security_tools.wsgi:application"
+    threads = int(os.environ.get("GUNICORN_THREADS", "1"))
+    worker_class = "gthread" if threads > 1 else "sync"
+
+if "WEB_CONCURRENCY" in os.environ:
+    workers = int(os.environ["WEB_CONCURRENCY"])
+else:
+    import django
+    django.setup()
+    workers = server.worker_count(
+        profile,
+        server.cpu_count(),
+        server.memory_limit(),
+        int(os.environ.get("WORKER_BASE_RSS_MIB", "96")) * server.MiB + server.hashing_memory(),
+    )
+# Several workers don't share in-process caches
+server.check_shared_state(workers)
+
+preload_app = os.environ.get("GUNICORN_PRELOAD", "true").lower() == "true"
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", "1000"))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", str(max_requests // 10)))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = timeout
+keepalive = 5
+# Worker heartbeats on tmpfs, not a possibly slow container disk
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+
+def when_ready(arbiter):
+    # Runs in the master after preloading, before the first fork: don't
+    # hand database connections opened while loading down to the workers
+    from django.db import connections
+    connections.close_all()
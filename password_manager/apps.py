@@ -4,3 +4,20 @@ from django.apps import AppConfig
 class PasswordManagerConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "password_manager"
+
+    def ready(self):
+        # Load the registration word list once per worker process
+        from .utils.wordlist import load_word_list
+        load_word_list()
+
+        # Connect the TOTP device cache invalidation signals
+        from .utils import device_cache  # noqa: F401
+
+        # ...and the vault principal cache invalidation signals
+        from .utils import principal  # noqa: F401
+
+        # python-jose is imported lazily; load it here only when tokens are
+        # in use, so a preloading server shares it between workers
+        from .utils import tokens
+        if tokens.tokens_enabled():
+            tokens._jose()
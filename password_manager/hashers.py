@@ -1,18 +1,58 @@
+import base64
+import hashlib
+
+from django.conf import settings
 from django.contrib.auth.hashers import ScryptPasswordHasher
 from django.contrib.auth.hashers import Argon2PasswordHasher
 
+# Cost parameters come from settings so `manage.py calibrate_hashers` can tune
+# them per host. Hashes made with older parameters report must_update() and
+# are re-hashed on the user's next successful login.
+
 
 class MyScryptPasswordHasher(ScryptPasswordHasher):
-    work_factor = 2**15
-    block_size = 8
-    parallelism = 1
     extra_margin = 1024 * 8
-    maxmem = work_factor * 2 * block_size * 64 + extra_margin
-    # max memory is 32 MiB when maxmem = 0. Min memory for above config is also 32MiB.
-    # So just a little extra margin
+
+    @property
+    def work_factor(self):
+        return getattr(settings, "PASSWORD_SCRYPT_N", 2**15)
+
+    @property
+    def block_size(self):
+        return getattr(settings, "PASSWORD_SCRYPT_R", 8)
+
+    @property
+    def parallelism(self):
+        return getattr(settings, "PASSWORD_SCRYPT_P", 1)
+
+    def encode(self, password, salt, n=None, r=None, p=None):
+        self._check_encode_args(password, salt)
+        n = n or self.work_factor
+        r = r or self.block_size
+        p = p or self.parallelism
+        # OpenSSL's scrypt needs 128 * r * (N + p + 2) bytes (just over 32 MiB
+        # for N=2**15, r=8) and hashlib's default limit is 32 MiB, so allow the
+        # exact size plus a little margin. Sized from the hash's own parameters
+        # so hashes made before a recalibration still verify.
+        maxmem = 128 * r * (n + p + 2) + self.extra_margin
+        hash_ = hashlib.scrypt(
+            password.encode(), salt=salt.encode(), n=n, r=r, p=p,
+            maxmem=maxmem, dklen=64,
+        )
+        hash_ = base64.b64encode(hash_).decode("ascii").strip()
+        return "%s$%d$%s$%d$%d$%s" % (self.algorithm, n, salt, r, p, hash_)
 
 
 class MyArgon2PasswordHasher(Argon2PasswordHasher):
-    time_cost = 3
-    memory_cost = 12 * 1024  # 12 MiB according to OWASP recommendations
-    parallelism = 1
+    @property
+    def time_cost(self):
+        return getattr(settings, "PASSWORD_ARGON2_TIME_COST", 3)
+
+    @property
+    def memory_cost(self):
+        # KiB; 12 MiB according to OWASP recommendations
+        return getattr(settings, "PASSWORD_ARGON2_MEMORY_COST", 12 * 1024)
+
+    @property
+    def parallelism(self):
+        return getattr(settings, "PASSWORD_ARGON2_PARALLELISM", 1)
@@ -0,0 +1,234 @@
+import multiprocessing
+import os
+import platform
+import resource
+import time
+
+from django.contrib.auth.hashers import Argon2PasswordHasher, ScryptPasswordHasher
+from django.core.management.base import BaseCommand, CommandError
+
+
+# OWASP Password Storage Cheat Sheet minimums. Each row is an equally strong
+# configuration; a candidate passes if it meets or exceeds any one row.
+OWASP_ARGON2_MINIMUMS = (
+    # (memory_cost KiB, time_cost, parallelism)
+    (47104, 1, 1),
+    (19456, 2, 1),
+    (12288, 3, 1),
+    (9216, 4, 1),
+    (7168, 5, 1),
+)
+OWASP_SCRYPT_MINIMUMS = (
+    # (N, r, p)
+    (2**17, 8, 1),
+    (2**16, 8, 2),
+    (2**15, 8, 3),
+    (2**14, 8, 5),
+    (2**13, 8, 10),
+)
+
+
+def meets_owasp_argon2(memory_cost, time_cost, parallelism):
+    return any(
+        memory_cost >= m and time_cost >= t and parallelism >= p
+        for m, t, p in OWASP_ARGON2_MINIMUMS
+    )
+
+
+def meets_owasp_scrypt(n, r, p):
+    return any(
+        n >= min_n and r >= min_r and p >= min_p
+        for min_n, min_r, min_p in OWASP_SCRYPT_MINIMUMS
+    )
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _make_hasher(algorithm, params):
+    if algorithm == "argon2":
+        hasher = Argon2PasswordHasher()
+        hasher.memory_cost, hasher.time_cost, hasher.parallelism = params
+    else:
+        hasher = ScryptPasswordHasher()
+        hasher.work_factor, hasher.block_size, hasher.parallelism = params
+        n, r, p = params
+        hasher.maxmem = 128 * r * (n + p + 2) + 1024 * 8
+    return hasher
+
+
+def _benchmark_child(algorithm, params, samples, conn):
+    """Runs in a fresh process so ru_maxrss reflects this configuration only"""
+    try:
+        hasher = _make_hasher(algorithm, params)
+        salt = hasher.salt()
+        baseline_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        timings = []
+        for _ in range(samples):
+            start = time.perf_counter()
+            hasher.encode("calibration-password", salt)
+            timings.append(time.perf_counter() - start)
+        peak_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        conn.send((timings, baseline_kib, peak_kib, None))
+    except Exception as e:
+        conn.send(([], 0, 0, str(e)))
+    finally:
+        conn.close()
+
+
+def benchmark(algorithm, params, samples):
+    """
+    Hash ``samples`` times with one configuration in a child process.
+
+    Returns a dict with p50/p99 latency in ms and peak RSS in MiB.
+    """
+    context = multiprocessing.get_context("fork")
+    parent_conn, child_conn = context.Pipe(duplex=False)
+    process = context.Process(
+        target=_benchmark_child, args=(algorithm, params, samples, child_conn)
+    )
+    process.start()
+    child_conn.close()
+    timings, baseline_kib, peak_kib, error = parent_conn.recv()
+    process.join()
+    if error:
+        raise CommandError(f"{algorithm} {params} failed: {error}")
+    return {
+        "p50_ms": percentile(timings, 0.50) * 1000,
+        "p99_ms": percentile(timings, 0.99) * 1000,
+        "peak_rss_mib": peak_kib / 1024,
+        "rss_growth_mib": max(0, peak_kib - baseline_kib) / 1024,
+    }
+
+
+def select(results, target_ms, strength):
+    """Pick the strongest OWASP-compliant result whose p99 fits the budget"""
+    eligible = [r for r in results if r["owasp"] and r["p99_ms"] <= target_ms]
+    if not eligible:
+        return None
+    return max(eligible, key=lambda r: (strength(r["params"]), -r["p99_ms"]))
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark Argon2id and scrypt across a parameter grid on this host, "
+        "report p50/p99 latency and peak RSS, and print a settings block that "
+        "fits the latency budget while meeting OWASP minimums."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--target-ms", type=float, default=250.0,
+            help="Latency budget (p99, one core) for a single hash. Default: 250",
+        )
+        parser.add_argument(
+            "--samples", type=int, default=10,
+            help="Hashes per configuration. Default: 10",
+        )
+        parser.add_argument(
+            "--argon2-memory", type=int, nargs="+", default=[12, 19, 32, 46, 64],
+            help="Argon2 memory costs to try, in MiB",
+        )
+        parser.add_argument(
+            "--argon2-time", type=int, nargs="+", default=[1, 2, 3, 4, 5],
+            help="Argon2 time costs to try",
+        )
+        parser.add_argument(
+            "--argon2-parallelism", type=int, nargs="+", default=[1],
+            help="Argon2 lanes to try (each lane can use a core)",
+        )
+        parser.add_argument(
+            "--scrypt-n", type=int, nargs="+", default=[13, 14, 15, 16, 17],
+            help="scrypt log2(N) values to try",
+        )
+        parser.add_argument(
+            "--scrypt-r", type=int, nargs="+", default=[8],
+            help="scrypt block sizes to try",
+        )
+        parser.add_argument(
+            "--scrypt-p", type=int, nargs="+", default=[1, 2, 3, 5, 10],
+            help="scrypt parallelism values to try",
+        )
+
+    def handle(self, *args, **options):
+        target_ms = options["target_ms"]
+        samples = options["samples"]
+        if samples < 1:
+            raise CommandError("--samples must be at least 1")
+
+        argon2_grid = [
+            (m * 1024, t, p)
+            for m in options["argon2_memory"]
+            for t in options["argon2_time"]
+            for p in options["argon2_parallelism"]
+        ]
+        scrypt_grid = [
+            (2**n, r, p)
+            for n in options["scrypt_n"]
+            for r in options["scrypt_r"]
+            for p in options["scrypt_p"]
+        ]
+
+        self.stdout.write(
+            f"Host: {platform.node()} ({os.cpu_count()} cores), "
+            f"target p99 {target_ms:.0f} ms, {samples} samples per configuration\n"
+        )
+
+        argon2_results = self._run_grid(
+            "argon2", argon2_grid, samples, lambda p: meets_owasp_argon2(*p),
+            lambda p: f"m={p[0] // 1024}MiB t={p[1]} p={p[2]}",
+        )
+        scrypt_results = self._run_grid(
+            "scrypt", scrypt_grid, samples, lambda p: meets_owasp_scrypt(*p),
+            lambda p: f"N=2**{p[0].bit_length() - 1} r={p[1]} p={p[2]}",
+        )
+
+        argon2 = select(argon2_results, target_ms, lambda p: p[0] * p[1])
+        scrypt = select(scrypt_results, target_ms, lambda p: p[0] * p[1] * p[2])
+        if argon2 is None:
+            self.stderr.write(
+                "No Argon2 configuration met OWASP minimums within the budget; "
+                "using the OWASP m=12MiB t=3 p=1 baseline."
+            )
+            argon2 = {"params": (12288, 3, 1)}
+        if scrypt is None:
+            self.stderr.write(
+                "No scrypt configuration met OWASP minimums within the budget; "
+                "using the OWASP N=2**15 r=8 p=3 baseline."
+            )
+            scrypt = {"params": (2**15, 8, 3)}
+
+        memory_cost, time_cost, argon2_p = argon2["params"]
+        n, r, scrypt_p = scrypt["params"]
+        self.stdout.write(
+            "\n# Generated by `manage.py calibrate_hashers` on "
+            f"{platform.node()} ({os.cpu_count()} cores), target {target_ms:.0f} ms\n"
+            f"PASSWORD_ARGON2_TIME_COST = {time_cost}\n"
+            f"PASSWORD_ARGON2_MEMORY_COST = {memory_cost}  # KiB\n"
+            f"PASSWORD_ARGON2_PARALLELISM = {argon2_p}\n"
+            f"PASSWORD_SCRYPT_N = 2**{n.bit_length() - 1}\n"
+            f"PASSWORD_SCRYPT_R = {r}\n"
+            f"PASSWORD_SCRYPT_P = {scrypt_p}\n"
+        )
+
+    def _run_grid(self, algorithm, grid, samples, owasp, describe):
+        self.stdout.write(
+            f"{algorithm:<8} {'parameters':<24} {'p50 ms':>9} {'p99 ms':>9} "
+            f"{'peak RSS MiB':>13} {'OWASP':>6}"
+        )
+        results = []
+        for params in grid:
+            result = benchmark(algorithm, params, samples)
+            result["params"] = params
+            result["owasp"] = owasp(params)
+            results.append(result)
+            self.stdout.write(
+                f"{algorithm:<8} {describe(params):<24} {result['p50_ms']:>9.1f} "
+                f"{result['p99_ms']:>9.1f} {result['peak_rss_mib']:>13.1f} "
+                f"{'yes' if result['owasp'] else 'no':>6}"
+            )
+        self.stdout.write("")
+        return results
@@ -0,0 +1,77 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django_otp.plugins.otp_totp.models import TOTPDevice
+
+from password_manager.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete registration placeholders (and their TOTP devices) that were "
+        "never completed. Runs in small batches, each in its own short "
+        "transaction, so it is safe to schedule (e.g. every 15 minutes from "
+        "cron) against a live database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than", type=int, default=None,
+            help="Age in seconds after which a pending registration is stale. "
+                 "Default: PENDING_REGISTRATION_TTL",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=500,
+            help="Placeholders deleted per transaction. Default: 500",
+        )
+        parser.add_argument(
+            "--pause", type=float, default=0.0,
+            help="Seconds to sleep between batches. Default: 0",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Only report how many placeholders would be deleted",
+        )
+
+    def handle(self, *args, **options):
+        older_than = options["older_than"]
+        if older_than is None:
+            older_than = getattr(settings, "PENDING_REGISTRATION_TTL", 3600)
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("--batch-size must be at least 1")
+
+        cutoff = timezone.now() - timedelta(seconds=older_than)
+        # Served by the partial customuser_pending_idx index
+        stale = CustomUser.objects.filter(
+            registration_pending=True, date_joined__lt=cutoff
+        ).order_by("date_joined")
+
+        if options["dry_run"]:
+            self.stdout.write(f"{stale.count()} stale pending registrations")
+            return
+
+        users = devices = 0
+        while True:
+            user_ids = list(stale.values_list("pk", flat=True)[:batch_size])
+            if not user_ids:
+                break
+            with transaction.atomic():
+                # Re-check the flag in case a registration completed meanwhile;
+                # devices go with their users (on_delete=CASCADE), so a
+                # completed registration keeps its device
+                deleted = CustomUser.objects.filter(
+                    pk__in=user_ids, registration_pending=True
+                ).delete()[1]
+            users += deleted.get(CustomUser._meta.label, 0)
+            devices += deleted.get(TOTPDevice._meta.label, 0)
+            if options["pause"]:
+                time.sleep(options["pause"])
+
+        self.stdout.write(
+            f"Deleted {users} stale pending registrations and {devices} TOTP devices"
+        )
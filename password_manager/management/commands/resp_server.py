@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from password_manager.utils.resp_server import RESPServer
+
+
+class Command(BaseCommand):
+    help = (
+        "Run an in-process Redis-protocol stand-in for local multi-worker "
+        "development (point CACHE_URL at it). Data lives in memory only."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1", help="Default: 127.0.0.1")
+        parser.add_argument("--port", type=int, default=6379, help="Default: 6379")
+
+    def handle(self, *args, **options):
+        server = RESPServer(options["host"], options["port"])
+        self.stdout.write(f"Serving on {server.url} (CACHE_URL={server.url})")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,65 @@
+import asyncio
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from .utils.instrumentation import install_query_recorder, observe, recording, server_timing
+
+
+class InstrumentationMiddleware:
+    """
+    Time each request's views and the spans inside them.
+
+    Database time and query counts are collected by an execute wrapper
+    installed on every connection, which reads the request being recorded
+    from a context variable, so queries made from sync_to_async threads
+    under ASGI count too. Code marked with ``instrumentation.span()``
+    (hashing, QR rendering, serialization, ...) adds its own spans. The
+    results go to the view_* metrics and, with SERVER_TIMING on, to a
+    ``Server-Timing`` response header. Enabled by
+    ``INSTRUMENTATION["ENABLED"]``; when off the middleware unloads itself
+    and spans cost one context variable lookup.
+
+    Place it first in MIDDLEWARE so session and auth queries are included.
+    Works in sync and async middleware chains without a thread switch.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        config = getattr(settings, 'INSTRUMENTATION', {})
+        if not config.get('ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.server_timing = config.get('SERVER_TIMING', True)
+        if asyncio.iscoroutinefunction(get_response):
+            # Marks the instance as a coroutine function for Django's handler
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+        connection_created.connect(install_query_recorder, dispatch_uid='instrumentation')
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        with recording() as timings:
+            response = self.get_response(request)
+        return self.finish(request, response, timings, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        with recording() as timings:
+            response = await self.get_response(request)
+        return self.finish(request, response, timings, time.perf_counter() - start)
+
+    def finish(self, request, response, timings, total):
+        match = request.resolver_match
+        observe(match.view_name if match else 'unmatched', timings, total)
+        if self.server_timing:
+            response['Server-Timing'] = server_timing(timings, total)
+        return response
@@ -0,0 +1,17 @@
+# Generated by Django 4.1.13 on 2026-10-18 01:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('password_manager', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userdata',
+            index=models.Index(fields=['user', '-updated_at', '-item_id'], name='userdata_user_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.1.13 on 2026-10-18 01:47
+
+from django.db import migrations, models
+import password_manager.models
+import password_manager.utils.blob_storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('password_manager', '0003_vaulttombstone'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userdata',
+            name='blob_size',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userdata',
+            name='encrypted_blob',
+            field=models.FileField(blank=True, max_length=255, storage=password_manager.utils.blob_storage.get_blob_storage, upload_to=password_manager.models.vault_blob_path),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.1.13 on 2026-10-18 01:55
+
+from django.db import migrations, models
+
+
+def flag_existing_placeholders(apps, schema_editor):
+    # Placeholders from before this migration never got a password or HMAC words
+    CustomUser = apps.get_model('password_manager', 'CustomUser')
+    CustomUser.objects.filter(password='', hmac_words_hash__isnull=True).update(
+        registration_pending=True
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('password_manager', '0004_userdata_encrypted_blob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='registration_pending',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(condition=models.Q(('registration_pending', True)), fields=['date_joined'], name='customuser_pending_idx'),
+        ),
+        migrations.RunPython(flag_existing_placeholders, migrations.RunPython.noop),
+    ]
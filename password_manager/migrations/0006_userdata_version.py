@@ -0,0 +1,18 @@
+# Generated by Django 4.1.13 on 2026-10-18 02:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('password_manager', '0005_customuser_registration_pending'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userdata',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -7,6 +7,7 @@ import hashlib
 import base64
 from django_otp.models import Device
 from django_otp.plugins.otp_totp.models import TOTPDevice
+from .utils.blob_storage import get_blob_storage
 
 
 class CustomUserManager(UserManager):
@@ -58,6 +59,10 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     is_staff = models.BooleanField(default=False)
     date_joined = models.DateTimeField(auto_now_add=True)
 
+    # Placeholder saved by initial_registration until complete_registration;
+    # purge_pending_registrations removes the ones left behind
+    registration_pending = models.BooleanField(default=False)
+
     USERNAME_FIELD = "sha512hash"
     REQUIRED_FIELDS = ["wrapped_key", "alg_unwrap_key", "hmac_wrapped_key"]
 
@@ -81,6 +86,16 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
         related_query_name="custom_user",
     )
 
+    class Meta:
+        indexes = [
+            # Partial index: only pending placeholders, oldest first
+            models.Index(
+                fields=['date_joined'],
+                name='customuser_pending_idx',
+                condition=models.Q(registration_pending=True),
+            ),
+        ]
+
     def __str__(self):
         return str({
             "username": base64.b64encode(self.sha512hash).decode("utf-8"),
@@ -91,6 +106,12 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
 # Using django-otp models directly instead of custom OTP device
 
 
+def vault_blob_path(instance, filename):
+    # A fresh name per upload, so replacing a blob never overwrites the
+    # object a concurrent download is reading
+    return f"vault/{instance.user_id}/{instance.item_id}/{uuid.uuid4().hex}"
+
+
 class UserData(models.Model):
     """
     Model to store encrypted user data (password vault items)
@@ -101,6 +122,16 @@ class UserData(models.Model):
     
     # Encrypted data JSON structure (Base64 encoded string containing IV + ciphertext)
     encrypted_data = models.TextField()
+
+    # Binary mode for large items: raw ciphertext in VAULT_BLOB_STORAGE
+    # instead of base64 in encrypted_data
+    encrypted_blob = models.FileField(
+        upload_to=vault_blob_path, storage=get_blob_storage, blank=True, max_length=255
+    )
+    blob_size = models.PositiveBigIntegerField(null=True, blank=True)
+
+    # Bumped on every update; the item's ETag is (item_id, version)
+    version = models.PositiveIntegerField(default=1)
     
     # Metadata
     name = models.CharField(max_length=100)  # Optional plaintext identifier (could be encrypted too)
@@ -109,6 +140,13 @@ class UserData(models.Model):
     
     class Meta:
         ordering = ['-updated_at']
+        indexes = [
+            # Backs `ordering` and keyset pagination of a user's vault
+            models.Index(
+                fields=['user', '-updated_at', '-item_id'],
+                name='userdata_user_updated_idx',
+            ),
+        ]
         verbose_name = "User Data Item"
         verbose_name_plural = "User Data Items"
     
@@ -116,6 +154,24 @@ class UserData(models.Model):
         return f"Item {self.name} for user {self.user.id}"
 
 
+class VaultTombstone(models.Model):
+    """
+    Record of a deleted vault item, so delta sync can tell other devices
+    to drop it. Kept for VAULT_SYNC["TOMBSTONE_RETENTION_DAYS"].
+    """
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='vault_tombstones')
+    item_id = models.UUIDField()
+    deleted_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'deleted_at'], name='tombstone_user_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f"Deleted item {self.item_id} for user {self.user_id}"
+
+
 class RememberedDevice(models.Model):
     """
     Model to store information about remembered devices
@@ -1,13 +1,14 @@
 
 // Main Vault App Component
 const VaultApp = () => {
-  const { useState, useEffect } = React;
+  const { useState, useEffect, useRef } = React;
   const { useSelector, useDispatch } = ReactRedux;
   
   const dispatch = useDispatch();
   const { items, loading, error } = useSelector(state => state.vault);
   const [showCreateForm, setShowCreateForm] = useState(false);
   const [selectedItem, setSelectedItem] = useState(null);
+  const syncToken = useRef(null);
 
   useEffect(() => {
     // Fetch vault items when component mounts
@@ -17,11 +18,31 @@ const VaultApp = () => {
   const fetchItems = async () => {
     dispatch({ type: 'FETCH_ITEMS_REQUEST' });
     try {
-      const response = await fetch('/password_manager/vault/items/');
-      if (!response.ok) throw new Error('Failed to fetch items');
-      
-      const data = await response.json();
-      dispatch({ type: 'FETCH_ITEMS_SUCCESS', payload: data });
+      // Delta sync: after the first full sync only changes and deletions
+      // since the last sync_token come back
+      const merged = new Map(syncToken.current ? items.map(item => [item.id, item]) : []);
+      let hasMore;
+      do {
+        const query = syncToken.current ? '?since=' + encodeURIComponent(syncToken.current) : '';
+        const response = await fetch('/password_manager/vault/sync/' + query);
+        if (response.status === 410) {
+          // Token too old to cover every deletion; start over
+          syncToken.current = null;
+          merged.clear();
+          hasMore = true;
+          continue;
+        }
+        if (!response.ok) throw new Error('Failed to fetch items');
+
+        const data = await response.json();
+        data.changed.forEach(item => merged.set(item.id, item));
+        data.deleted.forEach(id => merged.delete(id));
+        syncToken.current = data.sync_token;
+        hasMore = data.has_more;
+      } while (hasMore);
+      const synced = Array.from(merged.values())
+        .sort((a, b) => b.updated_at.localeCompare(a.updated_at));
+      dispatch({ type: 'FETCH_ITEMS_SUCCESS', payload: synced });
     } catch (error) {
       dispatch({ type: 'FETCH_ITEMS_FAILURE', payload: error.message });
     }
@@ -1,10 +1,71 @@
 from django.contrib.staticfiles.testing import StaticLiveServerTestCase
-from .models import CustomUser
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.test import SimpleTestCase, TestCase, override_settings
+from unittest import skipUnless
+from django_otp.plugins.otp_totp.models import TOTPDevice
+from django_otp.oath import TOTP
+from django_otp.util import random_hex
+from .models import CustomUser, UserData
+from benchmarks.bench_endpoints import compare, run_in_process
+from benchmarks.bench_imports import import_times, loaded_lazy_modules
+from benchmarks.bench_login_timing import (
+    compare_distributions, create_known_user, known_and_unknown_payloads, login_latencies
+)
+from .management.commands.calibrate_hashers import meets_owasp_argon2, meets_owasp_scrypt
+from .utils.db_router import DatabaseRouter
+from .utils.device_cache import get_device_cache, get_totp_device, verify_totp_token
+from .utils.encoding import negotiate_compression, negotiate_media_type
+from .utils.instrumentation import VIEW_DB_QUERIES, current_timings, span
+from .utils.hashing import HASH_LATENCY, HashingOverloaded, HashingService, get_hashing_service
+from .utils.principal import get_principal_cache
+from .utils.dynamodb_setup import create_dynamodb_table
+from .utils.qr import QRRenderPool, QRRenderQueueFull
+from .utils.resp_server import RESPServer
+from .utils.throttling import SlidingWindowThrottle, Throttled
+from .utils.tokens import ACCESS, issue_token, verify_token
+from .utils.vault_storage import VersionConflict, encode_cursor, get_vault_storage
+from .utils.wordlist import WordList
+from security_tools.server import MiB, check_shared_state, hashing_memory, worker_count
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.webdriver import WebDriver
 from selenium.webdriver.support.wait import WebDriverWait
-from django.urls import reverse
+from django.urls import clear_url_caches, resolve, reverse
+from django.utils import timezone
+import asyncio
+import base64
+import gzip
 import hashlib
+import hmac
+import importlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+from unittest import mock
+
+try:
+    from moto import mock_dynamodb
+except ImportError:
+    mock_dynamodb = None
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
 
 
 class RegisterViewTests(StaticLiveServerTestCase):
@@ -46,3 +107,1447 @@ class RegisterViewTests(StaticLiveServerTestCase):
 
 # class CustomUserModel(TestCase):
 #     def SetUp(self):
+
+
+class WordListTests(SimpleTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.words_path = os.path.join(self.tmpdir.name, "words.txt")
+        self.dirty_path = os.path.join(self.tmpdir.name, "dirty.json")
+        with open(self.words_path, "w") as f:
+            f.write("alpha\nbravo\nbloody\ncharlie\n\ndelta\nalpha\n")
+        with open(self.dirty_path, "w") as f:
+            json.dump({"RECORDS": [{"word": "Bloody", "language": "en"}]}, f)
+
+    def testFiltersDirtyAndDuplicateWords(self):
+        word_list = WordList(self.words_path, self.dirty_path)
+        self.assertEqual(
+            [word_list[i] for i in range(len(word_list))],
+            ["alpha", "bravo", "charlie", "delta"],
+        )
+
+    def testSampleIsUniqueWhenListIsLargeEnough(self):
+        word_list = WordList(self.words_path, self.dirty_path)
+        words = word_list.sample(4)
+        self.assertCountEqual(words, ["alpha", "bravo", "charlie", "delta"])
+        self.assertEqual(len(word_list.sample(10)), 10)
+
+    def testReloadIfChanged(self):
+        word_list = WordList(self.words_path, self.dirty_path)
+        self.assertFalse(word_list.reload_if_changed())
+        with open(self.words_path, "w") as f:
+            f.write("echo\n")
+        os.utime(self.words_path, ns=(0, 0))
+        self.assertTrue(word_list.reload_if_changed())
+        self.assertEqual(word_list.sample(2), ["echo", "echo"])
+
+
+class RegistrationQRTests(TestCase):
+    def testRegistrationPageLinksToQRImage(self):
+        response = self.client.get(reverse("password_manager:initial_registration"))
+        self.assertEqual(response.status_code, 200)
+        qr_url = reverse("password_manager:registration_qr")
+        self.assertEqual(response.context["qr_code"], qr_url)
+
+        response = self.client.get(qr_url, {"format": "svg"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/svg+xml")
+        self.assertEqual(response["Cache-Control"], "no-store")
+
+        response = self.client.get(qr_url, {"format": "matrix"})
+        matrix = json.loads(response.content)
+        self.assertEqual(len(matrix["modules"]), matrix["size"])
+
+    def testQRWithoutRegistrationSession(self):
+        response = self.client.get(reverse("password_manager:registration_qr"))
+        self.assertEqual(response.status_code, 400)
+
+    def testRenderPoolRejectsWhenFull(self):
+        pool = QRRenderPool(workers=1, max_pending=0)
+        self.addCleanup(pool.shutdown)
+        release = threading.Event()
+        with mock.patch("password_manager.utils.qr.render_qr", lambda *args: release.wait(5)):
+            future = pool.submit("otpauth://totp/test")
+            with self.assertRaises(QRRenderQueueFull):
+                pool.submit("otpauth://totp/test")
+            release.set()
+            future.result()
+        self.assertTrue(pool.submit("otpauth://totp/test", "svg").result().startswith(b"<?xml"))
+
+
+class HashingServiceTests(TestCase):
+    def setUp(self):
+        self.service = HashingService(workers=1, memory_budget=64 * 1024 * 1024,
+                                      queue_timeout=0, max_queue=1)
+        self.addCleanup(self.service.shutdown)
+        self.user = CustomUser.objects.create(sha512hash=hashlib.sha512(b"hashing").digest())
+
+    def testSetAndCheckPassword(self):
+        self.service.set_password(self.user, "auth-hash")
+        self.assertTrue(self.user.password.startswith("argon2$"))
+        self.assertTrue(self.service.check_password(self.user, "auth-hash"))
+        self.assertFalse(self.service.check_password(self.user, "wrong"))
+        self.assertFalse(self.service.check_password(self.user, None))
+
+    def testLegacyPlaintextAuthHashIsUpgraded(self):
+        self.user.password = "legacy-auth-hash"
+        self.user.save()
+        self.assertTrue(self.service.check_password(self.user, "legacy-auth-hash"))
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("argon2$"))
+
+    def testRehashesOnLoginAfterRecalibration(self):
+        self.service.set_password(self.user, "auth-hash")
+        self.user.save()
+        self.assertIn("t=3", self.user.password)
+        with override_settings(PASSWORD_ARGON2_TIME_COST=4):
+            self.assertTrue(self.service.check_password(self.user, "auth-hash"))
+        self.user.refresh_from_db()
+        self.assertIn("t=4", self.user.password)
+
+    def testShedsWhenMemoryBudgetIsExhausted(self):
+        self.assertTrue(self.service.budget.acquire(64 * 1024 * 1024))
+        self.addCleanup(self.service.budget.release, 64 * 1024 * 1024)
+        with self.assertRaises(HashingOverloaded):
+            self.service.set_password(self.user, "auth-hash")
+
+    def testLoginStep1ReturnsRetryAfterWhenOverloaded(self):
+        self.service.set_password(self.user, "auth-hash")
+        self.user.save()
+        with mock.patch("password_manager.views.get_hashing_service") as get_service:
+            get_service.return_value.check_password.side_effect = HashingOverloaded(3)
+            response = self.client.post(
+                reverse("password_manager:login_step1"),
+                json.dumps({"uuid": str(self.user.id), "auth_hash": "auth-hash"}),
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "3")
+
+    @override_settings(METRICS_ENABLED=True)
+    def testMetricsEndpoint(self):
+        self.service.set_password(self.user, "auth-hash")
+        response = self.client.get(reverse("password_manager:metrics"))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"password_hash_seconds_count", response.content)
+        self.assertIn(b"password_hash_queue_depth", response.content)
+
+    @override_settings(METRICS_ALLOWED_IPS=["10.0.0.5"], METRICS_TOKEN="scrape-token")
+    def testMetricsAccess(self):
+        url = reverse("password_manager:metrics")
+        self.assertEqual(self.client.get(url, REMOTE_ADDR="10.0.0.5").status_code, 404)
+        with override_settings(METRICS_ENABLED=True):
+            self.assertEqual(self.client.get(url, REMOTE_ADDR="10.0.0.5").status_code, 200)
+            self.assertEqual(self.client.get(url).status_code, 403)
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION="Bearer wrong").status_code, 403)
+            self.assertEqual(
+                self.client.get(url, HTTP_AUTHORIZATION="Bearer scrape-token").status_code, 200
+            )
+
+
+@override_settings(THROTTLING={"ENABLED": False})
+class LoginTimingTests(TestCase):
+    def setUp(self):
+        self.known, self.unknown = known_and_unknown_payloads(create_known_user())
+        self.url = reverse("password_manager:login_step1")
+
+    def testUnknownUserRunsTheHasher(self):
+        checks = HASH_LATENCY.count(algorithm="argon2", operation="check")
+        response = self.client.post(self.url, json.dumps(self.unknown()), content_type="application/json")
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(HASH_LATENCY.count(algorithm="argon2", operation="check"), checks + 1)
+
+    def testKnownAndUnknownLatencyMatch(self):
+        payloads = [self.known, self.unknown]
+        login_latencies(self.client, self.url, payloads, 2)
+        known, unknown = login_latencies(self.client, self.url, payloads, 15)
+        diverged, report = compare_distributions(known, unknown, threshold=0.35)
+        self.assertFalse(diverged, report)
+
+
+@override_settings(THROTTLING={"ENABLED": False})
+class EndpointBenchmarkTests(TestCase):
+    def testFlowsRunCleanly(self):
+        recorder, elapsed = run_in_process(duration=0, iterations=2)
+        endpoints = recorder.summary(elapsed)
+        self.assertEqual(set(endpoints), {
+            "initial_registration", "verify_totp", "complete_registration",
+            "login_step1", "login_step2", "vault_create", "vault_list",
+            "vault_get", "vault_update", "vault_delete",
+        })
+        for name, stats in endpoints.items():
+            self.assertEqual(stats["requests"], 2, name)
+            self.assertEqual(stats["errors"], 0, name)
+            self.assertGreater(stats["queries_per_request"], 0, name)
+
+    def testCompareFlagsRegressions(self):
+        baseline = {"endpoints": {"login_step1": {"rps": 100, "p95_ms": 50}}}
+        faster = {"endpoints": {"login_step1": {"rps": 110, "p95_ms": 45}}}
+        slower = {"endpoints": {"login_step1": {"rps": 70, "p95_ms": 80}}}
+        self.assertEqual(compare(faster, baseline, 0.2), [])
+        self.assertEqual(len(compare(slower, baseline, 0.2)), 2)
+
+
+class CalibrateHashersTests(SimpleTestCase):
+    def testOwaspMinimums(self):
+        self.assertTrue(meets_owasp_argon2(12 * 1024, 3, 1))
+        self.assertFalse(meets_owasp_argon2(12 * 1024, 2, 1))
+        self.assertTrue(meets_owasp_scrypt(2**15, 8, 3))
+        self.assertFalse(meets_owasp_scrypt(2**15, 8, 1))
+
+    def testEmitsSettingsBlock(self):
+        out = io.StringIO()
+        call_command(
+            "calibrate_hashers", "--samples", "1", "--target-ms", "10000",
+            "--argon2-memory", "12", "--argon2-time", "2", "3",
+            "--scrypt-n", "13", "--scrypt-p", "10",
+            stdout=out, stderr=io.StringIO(),
+        )
+        output = out.getvalue()
+        self.assertIn("PASSWORD_ARGON2_TIME_COST = 3", output)
+        self.assertIn("PASSWORD_ARGON2_MEMORY_COST = 12288", output)
+        self.assertIn("PASSWORD_SCRYPT_N = 2**13", output)
+        self.assertIn("PASSWORD_SCRYPT_P = 10", output)
+
+
+class PurgePendingRegistrationsTests(TestCase):
+    def testDeletesOnlyStalePlaceholders(self):
+        self.client.get(reverse("password_manager:initial_registration"))
+        fresh = CustomUser.objects.get(registration_pending=True)
+        stale = []
+        for i in range(3):
+            user = CustomUser.objects.create(
+                sha512hash=hashlib.sha512(f"stale {i}".encode()).digest(), registration_pending=True
+            )
+            TOTPDevice.objects.create(user=user, name="default", key=random_hex(20))
+            stale.append(user.pk)
+        CustomUser.objects.filter(pk__in=stale).update(
+            date_joined=timezone.now() - timedelta(hours=2)
+        )
+        registered = CustomUser.objects.create(sha512hash=hashlib.sha512(b"registered").digest())
+        CustomUser.objects.filter(pk=registered.pk).update(date_joined=timezone.now() - timedelta(days=1))
+
+        out = io.StringIO()
+        call_command("purge_pending_registrations", "--batch-size", "2", stdout=out)
+        self.assertIn("Deleted 3 stale pending registrations and 3 TOTP devices", out.getvalue())
+        self.assertFalse(CustomUser.objects.filter(pk__in=stale).exists())
+        self.assertFalse(TOTPDevice.objects.filter(user_id__in=stale).exists())
+        self.assertCountEqual(
+            CustomUser.objects.values_list("pk", flat=True), [fresh.pk, registered.pk]
+        )
+
+    def testKeepsRegistrationsCompletedDuringThePurge(self):
+        user = CustomUser.objects.create(
+            sha512hash=hashlib.sha512(b"racing").digest(), registration_pending=True
+        )
+        TOTPDevice.objects.create(user=user, name="default", key=random_hex(20))
+        CustomUser.objects.filter(pk=user.pk).update(date_joined=timezone.now() - timedelta(hours=2))
+        command = importlib.import_module(
+            "password_manager.management.commands.purge_pending_registrations"
+        )
+        atomic = command.transaction.atomic
+
+        def complete_then_atomic(*args, **kwargs):
+            # complete_registration runs after the batch was selected
+            CustomUser.objects.filter(pk=user.pk).update(registration_pending=False)
+            return atomic(*args, **kwargs)
+
+        with mock.patch.object(command.transaction, "atomic", complete_then_atomic):
+            call_command("purge_pending_registrations", stdout=io.StringIO())
+        self.assertTrue(CustomUser.objects.filter(pk=user.pk).exists())
+        self.assertTrue(TOTPDevice.objects.filter(user=user).exists())
+
+
+@override_settings(OTP_TOTP_THROTTLE_FACTOR=0)
+class TOTPDeviceCacheTests(TestCase):
+    def setUp(self):
+        get_device_cache().clear()
+        self.addCleanup(get_device_cache().clear)
+        self.user = CustomUser.objects.create(sha512hash=hashlib.sha512(b"totp").digest())
+        self.device = TOTPDevice.objects.create(user=self.user, name="default", key=random_hex(20))
+
+    def testLookupQueries(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(get_totp_device(self.user.pk).pk, self.device.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_totp_device(self.user.pk).pk, self.device.pk)
+
+    def testInvalidatedOnSaveAndDelete(self):
+        get_totp_device(self.user.pk)
+        self.device.name = "renamed"
+        self.device.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_totp_device(self.user.pk).name, "renamed")
+        self.device.delete()
+        self.assertIsNone(get_totp_device(self.user.pk))
+
+    def testLoginStep2Queries(self):
+        session = self.client.session
+        session["login_data"] = {
+            "user_id": str(self.user.pk),
+            "login_token": "token",
+            "timestamp": datetime.now().timestamp(),
+        }
+        session.save()
+        url = reverse("password_manager:login_step2")
+        body = json.dumps({"totp_code": "000000", "login_token": "token"})
+
+        # session, user, device lookup, device state, failure count
+        with self.assertNumQueries(5):
+            response = self.client.post(url, body, content_type="application/json")
+        self.assertEqual(response.status_code, 401)
+        # The device lookup is served from the cache
+        with self.assertNumQueries(4):
+            self.client.post(url, body, content_type="application/json")
+
+    def testVerifyTotpQueries(self):
+        session = self.client.session
+        session["registration_data"] = {
+            "uuid": str(self.user.pk),
+            "totp_device_id": self.device.pk,
+        }
+        session.save()
+        url = reverse("password_manager:verify_totp")
+        body = json.dumps({"totp_code": "000000"})
+
+        # session, device lookup, device state, failure count
+        with self.assertNumQueries(4):
+            response = self.client.post(url, body, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        with self.assertNumQueries(3):
+            self.client.post(url, body, content_type="application/json")
+
+    @override_settings(OTP_TOTP_THROTTLE_FACTOR=0)
+    def testCodeIsAcceptedOnce(self):
+        code = TOTP(self.device.bin_key).token()
+        # Two workers holding cached copies of the same device
+        first, second = get_totp_device(self.user.pk), get_totp_device(self.user.pk)
+        self.assertTrue(verify_totp_token(first, code))
+        self.assertFalse(verify_totp_token(second, code))
+
+        # Another request accepts the step between the state read and the update
+        late = get_totp_device(self.user.pk)
+        next_step = TOTP(self.device.bin_key, drift=1)
+        code = next_step.token()
+
+        def accepted_elsewhere(device):
+            TOTPDevice.objects.filter(pk=device.pk).update(last_t=next_step.t())
+            return True, None
+
+        with mock.patch.object(TOTPDevice, "verify_is_allowed", autospec=True,
+                               side_effect=accepted_elsewhere):
+            self.assertFalse(verify_totp_token(late, code))
+
+    def testStaleCopiesDontRollBackState(self):
+        stale = get_totp_device(self.user.pk)
+        self.assertFalse(verify_totp_token(get_totp_device(self.user.pk), "000000"))
+        stale.name = "renamed"
+        stale.save()
+        self.device.refresh_from_db()
+        self.assertEqual(self.device.throttling_failure_count, 1)
+        self.assertEqual(self.device.name, "renamed")
+
+
+@override_settings(
+    OTP_TOTP_THROTTLE_FACTOR=0,
+    LOGIN_TOKENS={"ENABLED": True, "LOGIN_TTL": 900, "ACCESS_TTL": 3600},
+)
+class LoginTokenTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        get_device_cache().clear()
+        self.addCleanup(get_device_cache().clear)
+        self.user = CustomUser.objects.create(
+            sha512hash=hashlib.sha512(b"tokens").digest(),
+            wrapped_key=b"wrapped", hmac_wrapped_key=b"hmac-wrapped", alg_unwrap_key="AES-KW",
+        )
+        get_hashing_service().set_password(self.user, "auth-hash")
+        self.user.save()
+        self.device = TOTPDevice.objects.create(user=self.user, name="default", key=random_hex(20))
+
+    def totp_code(self):
+        device = self.device
+        return str(TOTP(device.bin_key, device.step, device.t0, device.digits, device.drift).token()).zfill(device.digits)
+
+    def login(self):
+        response = self.client.post(
+            reverse("password_manager:login_step1"),
+            json.dumps({"uuid": str(self.user.pk), "auth_hash": "auth-hash"}),
+            content_type="application/json",
+        )
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        login_token = response.json()["login_token"]
+        body = json.dumps({"totp_code": self.totp_code(), "login_token": login_token})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse("password_manager:login_step2"), body, content_type="application/json"
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any("django_session" in q["sql"] for q in queries))
+        return login_token, response.json()["access_token"]
+
+    def testBearerTokenLogin(self):
+        login_token, access_token = self.login()
+        url = reverse("password_manager:user_data_list")
+        auth = {"HTTP_AUTHORIZATION": f"Bearer {access_token}"}
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url, **auth).status_code, 200)
+        self.assertFalse(any("django_session" in q["sql"] for q in queries))
+
+        # Tokens are not interchangeable, and login tokens are single use
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION=f"Bearer {login_token}").status_code, 401)
+        response = self.client.post(
+            reverse("password_manager:login_step2"),
+            json.dumps({"totp_code": self.totp_code(), "login_token": login_token}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 401)
+
+        self.assertEqual(self.client.post(reverse("password_manager:logout"), **auth).status_code, 200)
+        self.assertEqual(self.client.get(url, **auth).status_code, 401)
+
+    def testLogoutEverywhere(self):
+        # Logged in here and on another device
+        tokens = [self.login()[1], issue_token(self.user.id, ACCESS)]
+        url = reverse("password_manager:user_data_list")
+        response = self.client.post(
+            reverse("password_manager:logout"), json.dumps({"everywhere": True}),
+            content_type="application/json", HTTP_AUTHORIZATION=f"Bearer {tokens[0]}",
+        )
+        self.assertEqual(response.status_code, 200)
+        for token in tokens:
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION=f"Bearer {token}").status_code, 401)
+
+    def testTamperedTokenIsRejected(self):
+        _, access_token = self.login()
+        header, payload, signature = access_token.split(".")
+        forged = ".".join([header, payload, signature[::-1]])
+        response = self.client.get(
+            reverse("password_manager:user_data_list"), HTTP_AUTHORIZATION=f"Bearer {forged}"
+        )
+        self.assertEqual(response.status_code, 401)
+
+
+@skipUnless(redis, "redis is not installed")
+class CacheBackendIntegrationTests(TestCase):
+    """Cache, sessions and TOTP device lookups against an in-process RESP server"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = RESPServer().start()
+        cls.settings_override = override_settings(
+            CACHES={"default": {
+                "BACKEND": "django.core.cache.backends.redis.RedisCache",
+                "LOCATION": cls.server.url,
+            }},
+            SESSION_ENGINE="django.contrib.sessions.backends.cache",
+            TOTP_DEVICE_CACHE={"MAX_SIZE": 16, "TTL": 30, "SHARED_CACHE_ALIAS": "default"},
+        )
+        cls.settings_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.settings_override.disable()
+        cls.server.stop()
+
+    def setUp(self):
+        cache.clear()
+
+    def testCacheOperations(self):
+        cache.set("key", {"value": 1}, 30)
+        self.assertEqual(cache.get("key"), {"value": 1})
+        self.assertFalse(cache.add("key", "other"))
+        self.assertTrue(cache.add("counter", 1))
+        self.assertEqual(cache.incr("counter", 5), 6)
+        cache.set_many({"a": 1, "b": 2})
+        self.assertEqual(cache.get_many(["a", "b", "missing"]), {"a": 1, "b": 2})
+        cache.delete("a")
+        self.assertFalse(cache.has_key("a"))
+        cache.set("short", "lived", 1)
+        self.assertTrue(cache.touch("short", 0.001))
+        time.sleep(0.01)
+        self.assertIsNone(cache.get("short"))
+
+    def testSessionsLiveInTheCache(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("password_manager:initial_registration"))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any("django_session" in q["sql"] for q in queries))
+        self.assertIn("registration_data", self.client.session)
+        self.assertGreater(self.server.store.size(), 0)
+
+    def testTOTPDeviceLookupsAreShared(self):
+        user = CustomUser.objects.create(sha512hash=hashlib.sha512(b"shared").digest())
+        device = TOTPDevice.objects.create(user=user, name="default", key=random_hex(20))
+        get_totp_device(user.pk)
+        # Another worker's in-process state doesn't matter; the entry is in the server
+        get_device_cache()._local.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_totp_device(user.pk).pk, device.pk)
+
+
+class ThrottlingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.url = reverse("password_manager:login_step1")
+
+    def attempt(self, **extra):
+        body = json.dumps({"uuid": str(uuid.uuid4()), "auth_hash": "auth-hash"})
+        return self.client.post(self.url, body, content_type="application/json", **extra)
+
+    @override_settings(THROTTLING={"RULES": {"login_step1": {"ip": (3, 60)}}}, METRICS_ENABLED=True)
+    def testRejectsBeforeAnyDatabaseOrHasherWork(self):
+        for _ in range(3):
+            self.assertEqual(self.attempt().status_code, 401)
+        checks = HASH_LATENCY.count(algorithm="argon2", operation="check")
+        with self.assertNumQueries(0):
+            response = self.attempt()
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response["Retry-After"]), 1)
+        self.assertEqual(HASH_LATENCY.count(algorithm="argon2", operation="check"), checks)
+        # Other clients are unaffected
+        self.assertEqual(self.attempt(REMOTE_ADDR="10.0.0.2").status_code, 401)
+        self.assertIn('throttle_rejections_total{scope="login_step1",dimension="ip"}',
+                      self.client.get(reverse("password_manager:metrics")).content.decode())
+
+    @override_settings(THROTTLING={"RULES": {"login_step1": {"username": (2, 60)}}})
+    def testLimitsPerUsernameAcrossAddresses(self):
+        body = json.dumps({"username_hash": "dW5rbm93bg==", "auth_hash": "auth-hash"})
+        statuses = [
+            self.client.post(self.url, body, content_type="application/json",
+                             REMOTE_ADDR=f"10.0.0.{i}").status_code
+            for i in range(3)
+        ]
+        self.assertEqual(statuses, [401, 401, 429])
+
+    @override_settings(THROTTLING={"RULES": {"login_step1": {"user": (2, 60), "username": (2, 60)}}})
+    def testEquivalentSpellingsShareACounter(self):
+        user_id = uuid.uuid4()
+        spellings = [
+            {"uuid": str(user_id)}, {"uuid": str(user_id).upper()}, {"uuid": user_id.hex},
+            {"uuid": "{%s}" % user_id}, {"uuid": user_id.urn},
+            {"username_hash": "dW5rbm93bg=="}, {"username_hash": "dW5r!bm93bg=="},
+            {"username_hash": "dW5r\nbm93 bg=="}, {"username_hash": "*dW5rbm93bg=="},
+        ]
+        statuses = [
+            self.client.post(self.url, json.dumps({**spelling, "auth_hash": "auth-hash"}),
+                             content_type="application/json").status_code
+            for spelling in spellings
+        ]
+        self.assertEqual(statuses, [401, 401, 429, 429, 429, 401, 401, 429, 429])
+
+    def testSlidingWindowWeighsThePreviousWindow(self):
+        throttle = SlidingWindowThrottle({"scope": {"ip": (4, 10)}})
+        with mock.patch("password_manager.utils.throttling.time.time", return_value=1009.0):
+            for _ in range(4):
+                throttle.check("scope", ip="1.2.3.4")
+        # Halfway through the next window half of the previous 4 still count
+        with mock.patch("password_manager.utils.throttling.time.time", return_value=1015.0):
+            throttle.check("scope", ip="1.2.3.4")
+            throttle.check("scope", ip="1.2.3.4")
+            with self.assertRaises(Throttled):
+                throttle.check("scope", ip="1.2.3.4")
+
+    def testConcurrentRequestsStayWithinTheLimit(self):
+        throttle = SlidingWindowThrottle({"scope": {"user": (5, 60)}})
+        cache_class = type(throttle.cache)
+        get_many = cache_class.get_many
+
+        def slow_get_many(self, *args, **kwargs):
+            # A remote cache's round trip: the counts are stale on arrival
+            counts = get_many(self, *args, **kwargs)
+            time.sleep(0.05)
+            return counts
+
+        start = threading.Barrier(20)
+        allowed = []
+
+        def attempt():
+            start.wait()
+            try:
+                throttle.check("scope", user="victim")
+            except Throttled:
+                return
+            allowed.append(True)
+
+        with mock.patch.object(cache_class, "get_many", slow_get_many):
+            threads = [threading.Thread(target=attempt) for _ in range(20)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(allowed), 5)
+
+
+class VaultTestMixin:
+    def login(self, user):
+        session = self.client.session
+        session["login_data"] = {
+            "user_id": str(user.pk),
+            "login_token": "token",
+            "timestamp": datetime.now().timestamp(),
+        }
+        session.save()
+
+    def create_item(self, name="item", encrypted_data="Y2lwaGVydGV4dA=="):
+        response = self.client.post(
+            reverse("password_manager:user_data_create"),
+            json.dumps({"name": name, "encrypted_data": encrypted_data}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.json()["id"]
+
+
+class VaultStorageTests(VaultTestMixin, TestCase):
+
+    def setUp(self):
+        self.user = CustomUser.objects.create(sha512hash=hashlib.sha512(b"vault").digest())
+        self.login(self.user)
+
+    def testCrud(self):
+        item_id = self.create_item("first")
+        detail_url = reverse("password_manager:user_data_detail", args=[item_id])
+
+        response = self.client.get(reverse("password_manager:user_data_list"))
+        self.assertEqual([item["id"] for item in response.json()["items"]], [item_id])
+
+        response = self.client.get(detail_url)
+        self.assertEqual(response.json()["encrypted_data"], "Y2lwaGVydGV4dA==")
+
+        response = self.client.put(
+            detail_url,
+            json.dumps({"name": "renamed", "encrypted_data": "bmV3"}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(detail_url)
+        self.assertEqual(response.json()["name"], "renamed")
+        self.assertEqual(response.json()["encrypted_data"], "bmV3")
+
+        self.assertEqual(self.client.delete(detail_url).status_code, 200)
+        self.assertEqual(self.client.get(detail_url).status_code, 404)
+
+    def testPagination(self):
+        created = [self.create_item(f"item {i}") for i in range(5)]
+        url = reverse("password_manager:user_data_list")
+        seen = []
+        cursor = None
+        while True:
+            params = {"limit": 2}
+            if cursor:
+                params["cursor"] = cursor
+            data = self.client.get(url, params).json()
+            self.assertLessEqual(len(data["items"]), 2)
+            seen.extend(item["id"] for item in data["items"])
+            cursor = data["next_cursor"]
+            if not cursor:
+                break
+        # Every item exactly once across pages
+        self.assertCountEqual(seen, created)
+        self.assertEqual(self.client.get(url, {"cursor": "not-a-cursor"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"limit": "0"}).status_code, 400)
+
+    def testPagesSkipDeletedItems(self):
+        created = [self.create_item(f"item {i}") for i in range(7)]
+        # The newest items come first; delete them so the first reads find only tombstones
+        for item_id in created[4:]:
+            self.client.delete(reverse("password_manager:user_data_detail", args=[item_id]))
+        url = reverse("password_manager:user_data_list")
+        pages, cursor = [], None
+        while True:
+            data = self.client.get(url, {"limit": 2, **({"cursor": cursor} if cursor else {})}).json()
+            pages.append([item["id"] for item in data["items"]])
+            cursor = data["next_cursor"]
+            if not cursor:
+                break
+        self.assertEqual(pages[0], [created[3], created[2]])
+        self.assertEqual(sum(pages, []), created[3::-1])
+
+    def testBatchFetch(self):
+        first, second = self.create_item("first"), self.create_item("second")
+        missing = str(uuid.uuid4())
+        url = reverse("password_manager:user_data_batch")
+        body = json.dumps({"ids": [first, second, missing, first]})
+
+        data = self.client.post(url, body, content_type="application/json").json()
+        self.assertCountEqual([item["id"] for item in data["items"]], [first, second])
+        self.assertEqual(data["missing"], [missing])
+        self.assertEqual(data["items"][0]["encrypted_data"], "Y2lwaGVydGV4dA==")
+
+        response = self.client.post(url + "?format=ndjson", body, content_type="application/json")
+        lines = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertCountEqual([line["id"] for line in lines[:-1]], [first, second])
+        self.assertEqual(lines[-1], {"missing": [missing]})
+
+    @override_settings(VAULT_BATCH_MAX_ITEMS=2, VAULT_BATCH_STREAM_MAX_ITEMS=3)
+    def testBatchFetchSizeCap(self):
+        url = reverse("password_manager:user_data_batch")
+        body = json.dumps({"ids": [str(uuid.uuid4()) for _ in range(3)]})
+        response = self.client.post(url, body, content_type="application/json")
+        self.assertEqual(response.status_code, 413)
+        # Streaming has its own, larger cap
+        response = self.client.post(url + "?format=ndjson", body, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        body = json.dumps({"ids": [str(uuid.uuid4()) for _ in range(4)]})
+        response = self.client.post(url + "?format=ndjson", body, content_type="application/json")
+        self.assertEqual(response.status_code, 413)
+
+    def testBatchFetchStreamReportsFailures(self):
+        first, second = self.create_item("first"), self.create_item("second")
+        storage = get_vault_storage()
+        get_items = type(storage).get_items
+
+        def failing_get_items(self, user, item_ids):
+            yield next(iter(get_items(self, user, item_ids)))
+            raise RuntimeError("connection lost")
+
+        with mock.patch.object(type(storage), "get_items", failing_get_items):
+            response = self.client.post(
+                reverse("password_manager:user_data_batch") + "?format=ndjson",
+                json.dumps({"ids": [first, second]}), content_type="application/json",
+            )
+            lines = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual(len(lines), 2)
+        self.assertIn(lines[0]["id"], [first, second])
+        self.assertEqual(lines[-1], {"error": "connection lost"})
+
+    def testBatchWrite(self):
+        self.user.hmac_words_hash = hashlib.sha256(b"hmac words").digest()
+        self.user.save()
+        first, second = self.create_item("first"), self.create_item("second")
+        signature = base64.b64encode(
+            hmac.new(self.user.hmac_words_hash, b"c2lnbmVk", hashlib.sha256).digest()
+        ).decode()
+        operations = [
+            {"op": "create", "name": "imported", "encrypted_data": "c2lnbmVk", "hmac": signature},
+            {"op": "create", "name": "forged", "encrypted_data": "c2lnbmVk", "hmac": "Zm9yZ2Vk"},
+            {"op": "update", "id": first, "name": "renamed", "encrypted_data": "bmV3"},
+            {"op": "delete", "id": second},
+            {"op": "delete", "id": str(uuid.uuid4())},
+            {"op": "update", "id": second, "encrypted_data": "bmV3"},
+            {"op": "rename"},
+        ]
+        response = self.client.post(
+            reverse("password_manager:user_data_batch_write"),
+            json.dumps({"operations": operations}),
+            content_type="application/json",
+        )
+        results = response.json()["results"]
+        self.assertEqual([r["status"] for r in results], [201, 401, 200, 200, 404, 409, 400])
+
+        listed = self.client.get(reverse("password_manager:user_data_list")).json()["items"]
+        self.assertCountEqual(
+            [(item["id"], item["name"]) for item in listed],
+            [(results[0]["id"], "imported"), (first, "renamed")],
+        )
+        detail = self.client.get(reverse("password_manager:user_data_detail", args=[first]))
+        self.assertEqual(detail.json()["encrypted_data"], "bmV3")
+
+    def testBatchUpdates(self):
+        self.user.hmac_words_hash = hashlib.sha256(b"hmac words").digest()
+        self.user.save()
+        first, second = self.create_item("first"), self.create_item("second")
+        with tempfile.TemporaryDirectory() as location, override_settings(VAULT_BLOB_STORAGE={
+            "BACKEND": "django.core.files.storage.FileSystemStorage",
+            "OPTIONS": {"location": location},
+        }):
+            self.client.put(
+                reverse("password_manager:user_data_blob", args=[first]),
+                b"ciphertext", content_type="application/octet-stream",
+            )
+            operations = [
+                {"op": "update", "id": first, "encrypted_data": "bmV3", "hmac": "Zm9yZ2Vk"},
+                {"op": "update", "id": first, "encrypted_data": "bmV3"},
+                {"op": "update", "id": second, "encrypted_data": "bmV3"},
+            ]
+            storage = get_vault_storage()
+            get_items = type(storage).get_items
+
+            def get_items_then_delete(self, user, item_ids):
+                items = list(get_items(self, user, item_ids))
+                # Another device deletes an item after it was read
+                storage.delete_item(storage.get_item(user, second))
+                return items
+
+            with mock.patch.object(type(storage), "get_items", get_items_then_delete), \
+                    self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    reverse("password_manager:user_data_batch_write"),
+                    json.dumps({"operations": operations}),
+                    content_type="application/json",
+                )
+            # A rejected operation doesn't claim its item
+            self.assertEqual([r["status"] for r in response.json()["results"]], [401, 200, 409])
+            detail = self.client.get(reverse("password_manager:user_data_detail", args=[first])).json()
+            self.assertEqual(detail["encrypted_data"], "bmV3")
+            self.assertNotIn("blob", detail)
+            self.assertEqual([files for _, _, files in os.walk(location) if files], [])
+        # The update didn't bring the deleted item back
+        listed = self.client.get(reverse("password_manager:user_data_list")).json()["items"]
+        self.assertEqual([item["id"] for item in listed], [first])
+
+    @override_settings(VAULT_BATCH_WRITE_MAX_ITEMS=30)
+    def testBatchWriteImport(self):
+        # More than one BatchWriteItem chunk of 25
+        operations = [
+            {"op": "create", "name": f"item {i}", "encrypted_data": "Y2lwaGVydGV4dA=="}
+            for i in range(30)
+        ]
+        url = reverse("password_manager:user_data_batch_write")
+        response = self.client.post(url, json.dumps({"operations": operations}),
+                                    content_type="application/json")
+        self.assertEqual([r["status"] for r in response.json()["results"]], [201] * 30)
+        listed = self.client.get(reverse("password_manager:user_data_list")).json()["items"]
+        self.assertEqual(len(listed), 30)
+
+        response = self.client.post(url, json.dumps({"operations": operations + operations[:1]}),
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 413)
+
+    def testBlobUploadAndRangeDownload(self):
+        self.user.hmac_words_hash = hashlib.sha256(b"hmac words").digest()
+        self.user.save()
+        payload = os.urandom(200 * 1024)
+        signature = base64.b64encode(
+            hmac.new(self.user.hmac_words_hash, payload, hashlib.sha256).digest()
+        ).decode()
+        with tempfile.TemporaryDirectory() as location, override_settings(VAULT_BLOB_STORAGE={
+            "BACKEND": "django.core.files.storage.FileSystemStorage",
+            "OPTIONS": {"location": location},
+        }):
+            create_url = reverse("password_manager:user_data_create") + "?name=attachment"
+            response = self.client.post(create_url, payload, content_type="application/octet-stream",
+                                        HTTP_X_HMAC=base64.b64encode(b"forged").decode())
+            self.assertEqual(response.status_code, 401)
+            response = self.client.post(create_url, payload, content_type="application/octet-stream",
+                                        HTTP_X_HMAC=signature)
+            self.assertEqual(response.status_code, 201)
+            item_id = response.json()["id"]
+
+            detail = self.client.get(reverse("password_manager:user_data_detail", args=[item_id])).json()
+            self.assertEqual(detail["blob"]["size"], len(payload))
+            blob_url = detail["blob"]["url"]
+
+            response = self.client.get(blob_url)
+            self.assertEqual(b"".join(response.streaming_content), payload)
+            response = self.client.get(blob_url, HTTP_RANGE="bytes=100-199")
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(response["Content-Range"], f"bytes 100-199/{len(payload)}")
+            self.assertEqual(b"".join(response.streaming_content), payload[100:200])
+            response = self.client.get(blob_url, HTTP_RANGE="bytes=-10")
+            self.assertEqual(b"".join(response.streaming_content), payload[-10:])
+            self.assertEqual(self.client.get(blob_url, HTTP_RANGE=f"bytes={len(payload)}-").status_code, 416)
+
+            # Replacing the blob removes the old object
+            response = self.client.put(blob_url, b"smaller", content_type="application/octet-stream")
+            self.assertEqual(response.json()["size"], 7)
+            self.assertEqual(b"".join(self.client.get(blob_url).streaming_content), b"smaller")
+            stored = [files for _, _, files in os.walk(location) if files]
+            self.assertEqual(len(stored), 1)
+            self.assertEqual(len(stored[0]), 1)
+
+    def testBlobRemovedWhenUpdateFails(self):
+        item_id = self.create_item()
+        storage_class = type(get_vault_storage())
+        with tempfile.TemporaryDirectory() as location, override_settings(VAULT_BLOB_STORAGE={
+            "BACKEND": "django.core.files.storage.FileSystemStorage",
+            "OPTIONS": {"location": location},
+        }), mock.patch.object(storage_class, "update_item", side_effect=RuntimeError("down")):
+            response = self.client.put(
+                reverse("password_manager:user_data_blob", args=[item_id]),
+                b"ciphertext", content_type="application/octet-stream",
+            )
+            self.assertEqual(response.status_code, 500)
+            self.assertEqual([files for _, _, files in os.walk(location) if files], [])
+
+    def testInlineUpdateReplacesBlob(self):
+        item_id = self.create_item()
+        url = reverse("password_manager:user_data_detail", args=[item_id])
+        with tempfile.TemporaryDirectory() as location, override_settings(VAULT_BLOB_STORAGE={
+            "BACKEND": "django.core.files.storage.FileSystemStorage",
+            "OPTIONS": {"location": location},
+        }):
+            self.client.put(
+                reverse("password_manager:user_data_blob", args=[item_id]),
+                b"ciphertext", content_type="application/octet-stream",
+            )
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.put(
+                    url, json.dumps({"encrypted_data": "bmV3"}), content_type="application/json"
+                )
+            self.assertEqual(response.status_code, 200)
+            data = self.client.get(url).json()
+            self.assertEqual(data["encrypted_data"], "bmV3")
+            self.assertNotIn("blob", data)
+            self.assertEqual([files for _, _, files in os.walk(location) if files], [])
+
+    @override_settings(VAULT_BLOB_MAX_SIZE=10)
+    def testBlobSizeLimit(self):
+        item_id = self.create_item()
+        response = self.client.put(
+            reverse("password_manager:user_data_blob", args=[item_id]),
+            b"x" * 11, content_type="application/octet-stream",
+        )
+        self.assertEqual(response.status_code, 413)
+
+    def testConditionalGet(self):
+        url = reverse("password_manager:user_data_detail", args=[self.create_item()])
+        response = self.client.get(url)
+        etag = response["ETag"]
+        self.assertEqual(response.json()["version"], 1)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=f'W/{etag}')
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["ETag"], etag)
+
+        self.client.put(url, json.dumps({"encrypted_data": "bmV3"}), content_type="application/json")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.json()["encrypted_data"], "bmV3")
+
+    def testIfMatchUpdate(self):
+        url = reverse("password_manager:user_data_detail", args=[self.create_item()])
+        etag = self.client.get(url)["ETag"]
+
+        def put(data, if_match):
+            return self.client.put(
+                url, json.dumps({"encrypted_data": data}),
+                content_type="application/json", HTTP_IF_MATCH=if_match,
+            )
+
+        first = put("Zmlyc3Q=", etag)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.json()["version"], 2)
+        # A second device still holding the old ETag loses the race
+        self.assertEqual(put("c2Vjb25k", etag).status_code, 412)
+        self.assertEqual(put("c2Vjb25k", 'W/' + first["ETag"]).status_code, 412)
+        self.assertEqual(put("c2Vjb25k", f'"other", {first["ETag"]}').status_code, 200)
+        self.assertEqual(put("dGhpcmQ=", "*").status_code, 200)
+        self.assertEqual(self.client.get(url).json()["encrypted_data"], "dGhpcmQ=")
+
+    def testConditionalUpdateIsAtomic(self):
+        item = get_vault_storage().get_item(self.user, self.create_item())
+        stale = get_vault_storage().get_item(self.user, item.item_id)
+        get_vault_storage().update_item(item, expected_versions=[1])
+        with self.assertRaises(VersionConflict):
+            get_vault_storage().update_item(stale, expected_versions=[1])
+        self.assertEqual(get_vault_storage().get_version(self.user, item.item_id), 2)
+
+    def testListingETag(self):
+        url = reverse("password_manager:user_data_list")
+        self.create_item()
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.create_item("another")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["items"]), 2)
+
+    @override_settings(VAULT_SYNC={"MAX_ITEMS": 2, "OVERLAP_SECONDS": 0, "TOMBSTONE_RETENTION_DAYS": 90})
+    def testDeltaSync(self):
+        url = reverse("password_manager:user_data_sync")
+
+        def sync(token=None):
+            changed, deleted = {}, []
+            while True:
+                data = self.client.get(url, {"since": token} if token else {}).json()
+                changed.update((item["id"], item) for item in data["changed"])
+                deleted.extend(data["deleted"])
+                token = data["sync_token"]
+                if not data["has_more"]:
+                    return changed, deleted, token
+
+        first, second, third = (self.create_item(f"item {i}") for i in range(3))
+        changed, deleted, token = sync()
+        self.assertCountEqual(changed, [first, second, third])
+        self.assertEqual(deleted, [])
+        # Changed items carry the full payload, not just the listing fields
+        self.assertEqual(changed[first]["encrypted_data"], "Y2lwaGVydGV4dA==")
+        self.assertEqual(changed[first]["version"], 1)
+
+        changed, deleted, token = sync(token)
+        self.assertEqual((changed, deleted), ({}, []))
+
+        self.client.put(
+            reverse("password_manager:user_data_detail", args=[first]),
+            json.dumps({"name": "renamed", "encrypted_data": "bmV3"}),
+            content_type="application/json",
+        )
+        self.client.delete(reverse("password_manager:user_data_detail", args=[second]))
+        fourth = self.create_item("item 3")
+        changed, deleted, token = sync(token)
+        self.assertCountEqual(changed, [first, fourth])
+        self.assertEqual(deleted, [second])
+        self.assertEqual(changed[first]["name"], "renamed")
+        self.assertEqual(changed[first]["encrypted_data"], "bmV3")
+        self.assertEqual(changed[first]["version"], 2)
+
+        # Deleted items stay out of the listing and item reads
+        listed = [item["id"] for item in self.client.get(reverse("password_manager:user_data_list")).json()["items"]]
+        self.assertCountEqual(listed, [first, third, fourth])
+
+        self.assertEqual(self.client.get(url, {"since": "not-a-token"}).status_code, 400)
+        expired = encode_cursor({"t": "2000-01-01T00:00:00.000000+00:00"})
+        response = self.client.get(url, {"since": expired})
+        self.assertEqual(response.status_code, 410)
+        self.assertTrue(response.json()["resync"])
+
+    @override_settings(VAULT_SYNC={"MAX_ITEMS": 2, "OVERLAP_SECONDS": 0, "TOMBSTONE_RETENTION_DAYS": 90})
+    def testMultiPageSyncOfOldItems(self):
+        url = reverse("password_manager:user_data_sync")
+        with mock.patch("django.utils.timezone.now", return_value=timezone.now() - timedelta(days=200)):
+            created = [self.create_item(f"item {i}") for i in range(5)]
+
+        # Page boundaries on items older than the tombstone retention are fine
+        data = self.client.get(url).json()
+        changed, deleted = [item["id"] for item in data["changed"]], list(data["deleted"])
+        # An item already sent is deleted while the sync is still running
+        self.client.delete(reverse("password_manager:user_data_detail", args=[changed[0]]))
+        while data["has_more"]:
+            response = self.client.get(url, {"since": data["sync_token"]})
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            changed.extend(item["id"] for item in data["changed"])
+            deleted.extend(data["deleted"])
+        self.assertCountEqual(changed, created)
+
+        data = self.client.get(url, {"since": data["sync_token"]}).json()
+        self.assertEqual(data["changed"], [])
+        # Reported by this sync or the next one (re-sends are harmless)
+        self.assertEqual(set(deleted + data["deleted"]), {changed[0]})
+
+    def testItemsAreScopedToTheirOwner(self):
+        item_id = self.create_item()
+        other = CustomUser.objects.create(sha512hash=hashlib.sha512(b"other").digest())
+        self.login(other)
+        detail_url = reverse("password_manager:user_data_detail", args=[item_id])
+        self.assertEqual(self.client.get(detail_url).status_code, 404)
+        response = self.client.get(reverse("password_manager:user_data_list"))
+        self.assertEqual(response.json()["items"], [])
+
+
+class VaultPrincipalTests(VaultTestMixin, TestCase):
+    def setUp(self):
+        get_principal_cache().clear()
+        self.addCleanup(get_principal_cache().clear)
+        self.user = CustomUser.objects.create(sha512hash=hashlib.sha512(b"principal").digest())
+        self.login(self.user)
+
+    def testUserIsResolvedOncePerTtl(self):
+        url = reverse("password_manager:user_data_list")
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertEqual(sum("password_manager_customuser" in q["sql"] for q in queries), 1)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(sum("password_manager_customuser" in q["sql"] for q in queries), 0)
+
+    def testInvalidatedOnSave(self):
+        key = hashlib.sha256(b"hmac words").digest()
+        self.client.get(reverse("password_manager:user_data_list"))
+        self.user.hmac_words_hash = key
+        self.user.save()
+        # The new HMAC key is used straight away
+        signature = base64.b64encode(hmac.new(key, b"ZGF0YQ==", hashlib.sha256).digest()).decode()
+        response = self.client.post(
+            reverse("password_manager:user_data_create"),
+            json.dumps({"name": "signed", "encrypted_data": "ZGF0YQ=="}),
+            content_type="application/json",
+            HTTP_X_HMAC=signature,
+        )
+        self.assertEqual(response.status_code, 201)
+
+        self.user.delete()
+        self.assertEqual(self.client.get(reverse("password_manager:user_data_list")).status_code, 401)
+
+
+@override_settings(INSTRUMENTATION={"ENABLED": True, "SERVER_TIMING": True})
+class InstrumentationTests(VaultTestMixin, TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(sha512hash=hashlib.sha512(b"timed").digest())
+        self.login(self.user)
+
+    def timings(self, response):
+        return dict(
+            entry.split(";", 1) for entry in response["Server-Timing"].split(", ")
+        )
+
+    def testVaultListingSpans(self):
+        queries = VIEW_DB_QUERIES.value(view="password_manager:user_data_list")
+        response = self.client.get(reverse("password_manager:user_data_list"))
+        timings = self.timings(response)
+        self.assertIn("serialize", timings)
+        self.assertIn("total", timings)
+        self.assertRegex(timings["db"], r'^dur=[\d.]+;desc="\d+ queries"$')
+        self.assertGreater(
+            VIEW_DB_QUERIES.value(view="password_manager:user_data_list"), queries
+        )
+
+    def testHashingSpan(self):
+        response = self.client.post(
+            reverse("password_manager:login_step1"),
+            json.dumps({"uuid": str(uuid.uuid4()), "auth_hash": "wrong"}),
+            content_type="application/json",
+        )
+        self.assertIn("hash", self.timings(response))
+
+    @override_settings(INSTRUMENTATION={"ENABLED": False})
+    def testDisabled(self):
+        response = self.client.get(reverse("password_manager:user_data_list"))
+        self.assertFalse(response.has_header("Server-Timing"))
+
+    def testSpanOutsideRequestIsNoop(self):
+        self.assertIsNone(current_timings())
+        with span("hash"):
+            pass
+
+
+class VaultListingQueryTests(VaultTestMixin, TestCase):
+    def testListingNeverReadsEncryptedData(self):
+        user = CustomUser.objects.create(sha512hash=hashlib.sha512(b"listing").digest())
+        self.login(user)
+        self.create_item()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("password_manager:user_data_list"))
+        listing = [q["sql"] for q in queries if "password_manager_userdata" in q["sql"]]
+        self.assertEqual(len(listing), 1)
+        self.assertNotIn("encrypted_data", listing[0])
+
+
+class VaultEncodingTests(VaultTestMixin, TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create(sha512hash=hashlib.sha512(b"encoding").digest())
+        self.login(self.user)
+
+    def testNegotiation(self):
+        request = mock.Mock(headers={"Accept": "application/json;q=0.5, text/html"})
+        self.assertEqual(negotiate_media_type(request), "application/json")
+        request.headers = {"Accept": "*/*"}
+        self.assertEqual(negotiate_media_type(request), "application/json")
+        request.headers = {"Accept-Encoding": "gzip;q=0, identity"}
+        self.assertIsNone(negotiate_compression(request))
+        request.headers = {"Accept-Encoding": "gzip, deflate"}
+        self.assertEqual(negotiate_compression(request), "gzip")
+
+    @skipUnless(msgpack, "msgpack is not installed")
+    def testMsgpackCarriesRawCiphertext(self):
+        ciphertext = os.urandom(64)
+        response = self.client.post(
+            reverse("password_manager:user_data_create"),
+            msgpack.packb({"name": "binary", "encrypted_data": ciphertext}),
+            content_type="application/msgpack",
+        )
+        self.assertEqual(response.status_code, 201)
+        url = reverse("password_manager:user_data_detail", args=[response.json()["id"]])
+
+        response = self.client.get(url, HTTP_ACCEPT="application/msgpack")
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+        self.assertIn("Accept", response["Vary"])
+        self.assertEqual(msgpack.unpackb(response.content)["encrypted_data"], ciphertext)
+        # JSON clients still see base64
+        data = self.client.get(url).json()
+        self.assertEqual(base64.b64decode(data["encrypted_data"]), ciphertext)
+
+    def testListingCompression(self):
+        for index in range(20):
+            self.create_item(f"item {index}")
+        url = reverse("password_manager:user_data_list")
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertTrue(response["ETag"].startswith("W/"))
+        self.assertEqual(len(json.loads(gzip.decompress(response.content))["items"]), 20)
+
+        etag = response["ETag"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        self.assertIn("Accept, Accept-Encoding", response["Vary"])
+        # The uncompressed representation has its own validator
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    @skipUnless(msgpack, "msgpack is not installed")
+    def testETagsDifferPerRepresentation(self):
+        url = reverse("password_manager:user_data_detail", args=[self.create_item()])
+        json_etag = self.client.get(url)["ETag"]
+        response = self.client.get(url, HTTP_ACCEPT="application/msgpack")
+        msgpack_etag = response["ETag"]
+        self.assertNotEqual(msgpack_etag, json_etag)
+        self.assertFalse(msgpack_etag.startswith("W/"))
+
+        response = self.client.get(url, HTTP_ACCEPT="application/msgpack", HTTP_IF_NONE_MATCH=json_etag)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(url, HTTP_ACCEPT="application/msgpack", HTTP_IF_NONE_MATCH=msgpack_etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertIn("Accept", response["Vary"])
+
+        # Either representation's ETag is a precondition on the same version
+        response = self.client.put(
+            url, json.dumps({"name": "renamed", "encrypted_data": "bmV3"}),
+            content_type="application/json", HTTP_IF_MATCH=msgpack_etag,
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+class ReadReplicaRoutingTests(VaultTestMixin, TestCase):
+    def testListingReadsGoToReplica(self):
+        router = DatabaseRouter()
+        self.assertEqual(router.db_for_read(UserData, vault_listing=True), "default")
+        with override_settings(VAULT_READ_REPLICA="replica"):
+            self.assertEqual(router.db_for_read(UserData, vault_listing=True), "replica")
+            self.assertEqual(router.db_for_read(UserData), "default")
+            self.assertEqual(router.db_for_write(UserData, vault_listing=True), "default")
+
+    def testListingPassesHint(self):
+        user = CustomUser.objects.create(sha512hash=hashlib.sha512(b"replica").digest())
+        self.login(user)
+        with mock.patch.object(
+            DatabaseRouter, "db_for_read", autospec=True, return_value="default"
+        ) as db_for_read:
+            self.client.get(reverse("password_manager:user_data_list"))
+        hinted = [call for call in db_for_read.call_args_list if call.kwargs.get("vault_listing")]
+        self.assertEqual(hinted[0].args[1], UserData)
+
+
+@skipUnless(os.environ.get("POSTGRES_TEST_HOST"), "POSTGRES_TEST_HOST is not set")
+class PooledPostgresBackendTests(SimpleTestCase):
+    """Run against a local server, e.g. POSTGRES_TEST_HOST=localhost"""
+
+    def connection(self, health_checks=True):
+        from django.db.utils import ConnectionHandler
+        handler = ConnectionHandler({"default": {
+            "ENGINE": "password_manager.utils.postgresql_pool",
+            "NAME": os.environ.get("POSTGRES_TEST_NAME", "postgres"),
+            "USER": os.environ.get("POSTGRES_TEST_USER", "postgres"),
+            "PASSWORD": os.environ.get("POSTGRES_TEST_PASSWORD", ""),
+            "HOST": os.environ["POSTGRES_TEST_HOST"],
+            "PORT": os.environ.get("POSTGRES_TEST_PORT", "5432"),
+            "CONN_HEALTH_CHECKS": health_checks,
+            "OPTIONS": {"pool": {"min_size": 1, "max_size": 2, "timeout": 1}},
+        }})
+        return handler["default"]
+
+    def tearDown(self):
+        from password_manager.utils.postgresql_pool.base import close_pools
+        close_pools()
+
+    def backend_pid(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_backend_pid()")
+            return cursor.fetchone()[0]
+
+    def testConnectionIsReused(self):
+        connection = self.connection()
+        first = self.backend_pid(connection)
+        connection.close()
+        self.assertEqual(self.backend_pid(connection), first)
+        connection.close()
+
+    def testDeadConnectionIsReplaced(self):
+        connection = self.connection()
+        first = self.backend_pid(connection)
+        other = self.connection()
+        with other.cursor() as cursor:
+            cursor.execute("SELECT pg_terminate_backend(%s)", [first])
+        other.close()
+        connection.close()
+        self.assertNotEqual(self.backend_pid(connection), first)
+        connection.close()
+
+
+class DynamoDBTestMixin:
+    def setUp(self):
+        env = mock.patch.dict(os.environ, {
+            "AWS_ACCESS_KEY_ID": "testing",
+            "AWS_SECRET_ACCESS_KEY": "testing",
+            "AWS_DEFAULT_REGION": "us-east-1",
+        })
+        env.start()
+        self.addCleanup(env.stop)
+        dynamodb = mock_dynamodb()
+        dynamodb.start()
+        self.addCleanup(dynamodb.stop)
+        with redirect_stdout(io.StringIO()):
+            create_dynamodb_table()
+        super().setUp()
+
+
+@skipUnless(mock_dynamodb, "moto is not installed")
+@override_settings(VAULT_STORAGE={
+    "BACKEND": "password_manager.utils.vault_storage.DynamoDBVaultStorage",
+    "OPTIONS": {"TABLE_NAME": "UserVault", "REGION": "us-east-1"},
+})
+class DynamoDBVaultStorageTests(DynamoDBTestMixin, VaultStorageTests):
+    def testItemsLiveInDynamoDB(self):
+        item_id = self.create_item()
+        self.assertFalse(UserData.objects.exists())
+        storage = get_vault_storage()
+        self.assertEqual(str(storage.get_item(self.user, item_id).item_id), item_id)
+
+
+class ServerProfileTests(TestCase):
+    def testWorkerCount(self):
+        # CPU bound: 2n + 1 sync workers, one event loop per core
+        self.assertEqual(worker_count("sync", 4, 64 * 1024 * MiB, 128 * MiB), 9)
+        self.assertEqual(worker_count("uvicorn", 4, 64 * 1024 * MiB, 128 * MiB), 4)
+        # Memory bound, and never below one worker
+        self.assertEqual(worker_count("sync", 4, 1024 * MiB, 256 * MiB), 3)
+        self.assertEqual(worker_count("sync", 4, 256 * MiB, 256 * MiB), 1)
+
+    def testHashingMemory(self):
+        # WORKERS concurrent 12 MiB Argon2 jobs, capped by the budget
+        self.assertEqual(hashing_memory(), settings.PASSWORD_HASHING["WORKERS"] * 12 * MiB)
+        with override_settings(PASSWORD_HASHING={"WORKERS": 2, "MEMORY_BUDGET": 16 * MiB}):
+            self.assertEqual(hashing_memory(), 16 * MiB)
+
+    def testTokenDenylistMustBeShared(self):
+        with override_settings(LOGIN_TOKENS={"ENABLED": True}):
+            check_shared_state(1)
+            with self.assertRaises(RuntimeError):
+                check_shared_state(4)
+            with override_settings(CACHES={"default": {
+                "BACKEND": "django.core.cache.backends.redis.RedisCache",
+                "LOCATION": "redis://localhost:6379/0",
+            }}):
+                check_shared_state(4)
+        check_shared_state(4)
+
+    def testReadiness(self):
+        url = reverse("password_manager:readiness")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["checks"],
+                         {"database": "ok", "cache": "ok", "word_list": "ok"})
+        self.assertEqual(response["Cache-Control"], "no-store")
+
+        with mock.patch("password_manager.views.connection.cursor", side_effect=Exception("down")):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()["checks"]["database"], "unavailable")
+
+
+class ImportTimeTests(SimpleTestCase):
+    def testHeavyModulesLoadLazily(self):
+        # Timing is left to benchmarks/bench_imports.py --budget
+        self.assertEqual(loaded_lazy_modules(import_times(runs=1)), [])
+
+
+def reload_urlconf():
+    """Re-import the URLconfs so they pick up the current ASYNC_VIEWS"""
+    import password_manager.urls
+    import security_tools.urls
+
+    importlib.reload(password_manager.urls)
+    importlib.reload(security_tools.urls)
+    clear_url_caches()
+
+
+@override_settings(ASYNC_VIEWS=True)
+class AsyncViewTests(VaultTestMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Class cleanups run last-in first-out: registered before the
+        # ASYNC_VIEWS override's, this reload runs after it is undone
+        cls.addClassCleanup(reload_urlconf)
+        super().setUpClass()
+        reload_urlconf()
+
+    def setUp(self):
+        cache.clear()
+        get_device_cache().clear()
+        self.addCleanup(get_device_cache().clear)
+        self.user = CustomUser.objects.create(
+            sha512hash=hashlib.sha512(b"async").digest(),
+            wrapped_key=b"wrapped", hmac_wrapped_key=b"hmac-wrapped", alg_unwrap_key="AES-KW",
+        )
+        get_hashing_service().set_password(self.user, "auth-hash")
+        self.user.save()
+        self.device = TOTPDevice.objects.create(user=self.user, name="default", key=random_hex(20))
+
+    def testAsyncViewsAreRouted(self):
+        match = resolve(reverse("password_manager:user_data_list"))
+        self.assertTrue(asyncio.iscoroutinefunction(match.func))
+        self.assertEqual(self.client.get(reverse("password_manager:login_step1")).status_code, 405)
+
+    def testLogin(self):
+        url = reverse("password_manager:login_step1")
+        response = self.client.post(
+            url, json.dumps({"uuid": str(uuid.uuid4()), "auth_hash": "auth-hash"}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 401)
+        response = self.client.post(
+            url, json.dumps({"uuid": str(self.user.pk), "auth_hash": "auth-hash"}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+
+        device = self.device
+        code = str(TOTP(device.bin_key, device.step, device.t0, device.digits, device.drift).token()).zfill(device.digits)
+        response = self.client.post(
+            reverse("password_manager:login_step2"),
+            json.dumps({"totp_code": code, "login_token": response.json()["login_token"]}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["wrapped_key"], base64.b64encode(b"wrapped").decode())
+        self.assertEqual(self.client.get(reverse("password_manager:user_data_list")).status_code, 200)
+
+    def testCrud(self):
+        self.login(self.user)
+        item_id = self.create_item("first")
+        detail_url = reverse("password_manager:user_data_detail", args=[item_id])
+
+        response = self.client.get(reverse("password_manager:user_data_list"))
+        self.assertEqual([item["id"] for item in response.json()["items"]], [item_id])
+
+        response = self.client.get(detail_url)
+        etag = response["ETag"]
+        self.assertEqual(response.json()["encrypted_data"], "Y2lwaGVydGV4dA==")
+        self.assertEqual(self.client.get(detail_url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        body = json.dumps({"name": "renamed", "encrypted_data": "bmV3"})
+        response = self.client.put(detail_url, body, content_type="application/json", HTTP_IF_MATCH=etag)
+        self.assertEqual(response.json()["version"], 2)
+        response = self.client.put(detail_url, body, content_type="application/json", HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+
+        self.assertEqual(self.client.delete(detail_url).status_code, 200)
+        self.assertEqual(self.client.get(detail_url).status_code, 404)
+
+    @override_settings(LOGIN_TOKENS={"ENABLED": True, "LOGIN_TTL": 900, "ACCESS_TTL": 3600})
+    def testBearerTokenIsCheckedOffTheEventLoop(self):
+        on_event_loop = []
+
+        def checked_verify_token(*args):
+            try:
+                asyncio.get_running_loop()
+                on_event_loop.append(True)
+            except RuntimeError:
+                on_event_loop.append(False)
+            return verify_token(*args)
+
+        token = issue_token(str(self.user.pk), ACCESS)
+        with mock.patch("password_manager.utils.principal.verify_token", checked_verify_token):
+            response = self.client.get(reverse("password_manager:user_data_list"),
+                                       HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(on_event_loop, [False])
+
+
+@skipUnless(mock_dynamodb, "moto is not installed")
+@override_settings(VAULT_STORAGE={
+    "BACKEND": "password_manager.utils.vault_storage.DynamoDBVaultStorage",
+    "OPTIONS": {"TABLE_NAME": "UserVault", "REGION": "us-east-1"},
+})
+class DynamoDBAsyncViewTests(DynamoDBTestMixin, AsyncViewTests):
+    pass
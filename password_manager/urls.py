@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 from django.shortcuts import render
@@ -5,6 +6,20 @@ from django.shortcuts import render
 def login_page(request):
     return render(request, 'password_manager/login.html')
 
+# Native async views for ASGI workers; the sync views stay the default
+if getattr(settings, 'ASYNC_VIEWS', False):
+    login_step1 = views.login_step1_async
+    login_step2 = views.login_step2_async
+    user_data_list = views.user_data_list_async
+    user_data_create = views.user_data_create_async
+    user_data_detail = views.user_data_detail_async
+else:
+    login_step1 = views.login_step1
+    login_step2 = views.login_step2
+    user_data_list = views.user_data_list
+    user_data_create = views.user_data_create
+    user_data_detail = views.user_data_detail
+
 app_name = "password_manager"
 urlpatterns = [
     # Legacy registration endpoint
@@ -12,16 +27,26 @@ urlpatterns = [
     
     # Two-step registration process
     path("initial-registration/", views.initial_registration, name="initial_registration"),
+    path("registration-qr/", views.registration_qr, name="registration_qr"),
     path("verify-totp/", views.verify_totp, name="verify_totp"),
     path("complete-registration/", views.complete_registration, name="complete_registration"),
     
     # Two-step login process
     path("login/", login_page, name="login"),
-    path("login-step1/", views.login_step1, name="login_step1"),
-    path("login-step2/", views.login_step2, name="login_step2"),
+    path("login-step1/", login_step1, name="login_step1"),
+    path("login-step2/", login_step2, name="login_step2"),
+    path("logout/", views.logout, name="logout"),
     
     # Password vault operations
-    path("vault/items/", views.user_data_list, name="user_data_list"),
-    path("vault/items/create/", views.user_data_create, name="user_data_create"),
-    path("vault/items/<uuid:item_id>/", views.user_data_detail, name="user_data_detail"),
+    path("vault/items/", user_data_list, name="user_data_list"),
+    path("vault/items/create/", user_data_create, name="user_data_create"),
+    path("vault/items/batch/", views.user_data_batch, name="user_data_batch"),
+    path("vault/items/batch-write/", views.user_data_batch_write, name="user_data_batch_write"),
+    path("vault/sync/", views.user_data_sync, name="user_data_sync"),
+    path("vault/items/<uuid:item_id>/", user_data_detail, name="user_data_detail"),
+    path("vault/items/<uuid:item_id>/blob/", views.user_data_blob, name="user_data_blob"),
+
+    # Monitoring
+    path("metrics/", views.metrics, name="metrics"),
+    path("ready/", views.readiness, name="readiness"),
 ]
@@ -0,0 +1,124 @@
+import hashlib
+import hmac
+import re
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.functional import LazyObject, empty
+from django.utils.module_loading import import_string
+
+
+# Blobs are copied from the request in chunks of this size, and spooled to
+# disk once they outgrow SPOOL_MAX_MEMORY
+CHUNK_SIZE = 64 * 1024
+SPOOL_MAX_MEMORY = 1024 * 1024
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class BlobTooLarge(Exception):
+    """Raised when an upload exceeds VAULT_BLOB_MAX_SIZE"""
+
+
+class UnsatisfiableRange(Exception):
+    """Raised when a Range header lies outside the blob"""
+
+
+class VaultBlobStorage(LazyObject):
+    """
+    The Django storage that holds vault item blobs, built from
+    ``VAULT_BLOB_STORAGE`` on first use (FileSystemStorage locally,
+    e.g. ``storages.backends.s3boto3.S3Boto3Storage`` in production).
+    """
+
+    def _setup(self):
+        config = getattr(settings, 'VAULT_BLOB_STORAGE', {})
+        backend = import_string(
+            config.get('BACKEND', 'django.core.files.storage.FileSystemStorage')
+        )
+        self._wrapped = backend(**config.get('OPTIONS', {}))
+
+
+blob_storage = VaultBlobStorage()
+
+
+def get_blob_storage():
+    return blob_storage
+
+
+@receiver(setting_changed)
+def reset_blob_storage(setting, **kwargs):
+    if setting == 'VAULT_BLOB_STORAGE':
+        blob_storage._wrapped = empty
+
+
+def spool_upload(stream, hmac_key=None, max_size=None, chunk_size=CHUNK_SIZE):
+    """
+    Copy ``stream`` into a temporary file without holding it in memory.
+
+    The HMAC-SHA256 under ``hmac_key`` is updated chunk by chunk as the body
+    arrives. Returns ``(file, size, digest)``; ``digest`` is None without a
+    key. Raises ``BlobTooLarge`` as soon as ``max_size`` bytes are exceeded.
+    """
+    mac = hmac.new(bytes(hmac_key), digestmod=hashlib.sha256) if hmac_key else None
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    size = 0
+    try:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            if max_size is not None and size > max_size:
+                raise BlobTooLarge(f"Blob exceeds {max_size} bytes")
+            if mac is not None:
+                mac.update(chunk)
+            spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return File(spool), size, mac.digest() if mac is not None else None
+
+
+def parse_range(header, size):
+    """
+    Return ``(start, end)`` (inclusive) for a single ``bytes=`` Range header,
+    or None when the header is absent or not one we serve partially (the
+    whole blob is sent instead, as RFC 9110 allows).
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise UnsatisfiableRange()
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise UnsatisfiableRange()
+    return start, end
+
+
+def iter_range(fileobj, start, end, chunk_size=CHUNK_SIZE):
+    """Yield bytes ``start..end`` (inclusive) of ``fileobj``, then close it"""
+    try:
+        fileobj.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = fileobj.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        fileobj.close()
@@ -1,25 +1,26 @@
+from django.conf import settings
 
-from password_manager.models import UserData, RememberedDevice
 
 class DatabaseRouter:
     """
     A router to control all database operations on models in the
     password_manager application.
+
+    Every model, including UserData, lives in the default database. Vault
+    items can instead be kept in DynamoDB through the VAULT_STORAGE backend
+    (see password_manager.utils.vault_storage), which talks to DynamoDB with
+    boto3 rather than through a Django database alias.
+
+    Reads made with the ``vault_listing`` hint (vault list pages) go to the
+    VAULT_READ_REPLICA alias when one is configured.
     """
     def db_for_read(self, model, **hints):
-        """
-        Attempts to read UserData and RememberedDevice models go to dynamodb.
-        """
-        if model == UserData:
-            return 'dynamodb'
+        replica = getattr(settings, 'VAULT_READ_REPLICA', None)
+        if replica and hints.get('vault_listing'):
+            return replica
         return 'default'
 
     def db_for_write(self, model, **hints):
-        """
-        Attempts to write UserData and RememberedDevice models go to dynamodb.
-        """
-        if model == UserData:
-            return 'dynamodb'
         return 'default'
 
     def allow_relation(self, obj1, obj2, **hints):
@@ -29,10 +30,4 @@ class DatabaseRouter:
         return True
 
     def allow_migrate(self, db, app_label, model_name=None, **hints):
-        """
-        Make sure the UserData and RememberedDevice models only appear in the
-        'dynamodb' database.
-        """
-        if model_name == 'userdata' or model_name == 'remembereddevice':
-            return db == 'dynamodb'
         return db == 'default'
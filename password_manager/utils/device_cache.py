@@ -0,0 +1,215 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django_otp.oath import TOTP
+from django_otp.plugins.otp_totp.models import TOTPDevice
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache whose entries expire after ``ttl`` seconds"""
+
+    def __init__(self, max_size=1024, ttl=30):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        ttl = self.ttl if timeout is None else timeout
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# Fields that only change when the device is reconfigured; these are all
+# that is cached. last_t, drift and the throttling counters change on every
+# verification and are always read from the database.
+CACHED_FIELDS = ('id', 'user_id', 'name', 'confirmed', 'key', 'step', 't0', 'digits', 'tolerance')
+STATE_FIELDS = ('last_t', 'drift', 'throttling_failure_count', 'throttling_failure_timestamp')
+
+
+class TOTPDeviceCache:
+    """
+    Per-user TOTP device cache keyed by user id.
+
+    Holds only ``CACHED_FIELDS``, so a stale entry can't bring back an old
+    ``last_t`` or failure count; devices are rebuilt with the state fields
+    deferred. Uses an in-process LRU by default, or the Django cache named
+    by ``SHARED_CACHE_ALIAS`` so workers share warm entries. Entries are
+    dropped when a device is reconfigured or deleted.
+    """
+
+    key_prefix = "totp-device:"
+
+    def __init__(self, max_size=1024, ttl=30, shared_cache_alias=None):
+        self.ttl = ttl
+        self.shared_cache_alias = shared_cache_alias
+        self._local = LRUCache(max_size=max_size, ttl=ttl)
+
+    @property
+    def backend(self):
+        if self.shared_cache_alias:
+            return caches[self.shared_cache_alias]
+        return self._local
+
+    def _key(self, user_id):
+        return f"{self.key_prefix}{user_id}"
+
+    def get(self, user_id):
+        values = self.backend.get(self._key(user_id))
+        if values is None:
+            return None
+        # A fresh instance per call, so requests never share one
+        return TOTPDevice.from_db(None, CACHED_FIELDS, values)
+
+    def set(self, device):
+        values = tuple(getattr(device, field) for field in CACHED_FIELDS)
+        self.backend.set(self._key(device.user_id), values, self.ttl)
+
+    def delete(self, user_id):
+        self.backend.delete(self._key(user_id))
+
+    def clear(self):
+        self._local.clear()
+
+
+_device_cache = None
+_device_cache_config = None
+_device_cache_lock = threading.Lock()
+
+
+def get_device_cache():
+    """Return the per-process device cache configured by ``TOTP_DEVICE_CACHE``"""
+    global _device_cache, _device_cache_config
+    config = getattr(settings, 'TOTP_DEVICE_CACHE', {})
+    if _device_cache is None or _device_cache_config is not config:
+        with _device_cache_lock:
+            if _device_cache is None or _device_cache_config is not config:
+                _device_cache = TOTPDeviceCache(
+                    max_size=config.get('MAX_SIZE', 1024),
+                    ttl=config.get('TTL', 30),
+                    shared_cache_alias=config.get('SHARED_CACHE_ALIAS'),
+                )
+                _device_cache_config = config
+    return _device_cache
+
+
+def get_totp_device(user_id):
+    """
+    Return the user's TOTP device, or None if they don't have one.
+
+    A hit costs no queries; a miss costs one query on the indexed
+    ``user_id`` column (instead of one per installed device plugin). The
+    state fields are deferred either way: verify codes with
+    ``verify_totp_token``, not ``TOTPDevice.verify_token``.
+    """
+    cache = get_device_cache()
+    device = cache.get(user_id)
+    if device is None:
+        device = (
+            TOTPDevice.objects.filter(user_id=user_id).only(*CACHED_FIELDS)
+            .order_by('pk').first()
+        )
+        if device is not None:
+            cache.set(device)
+    return device
+
+
+def verify_totp_token(device, token):
+    """
+    ``TOTPDevice.verify_token`` that is safe with cached devices and
+    several workers.
+
+    The state fields are read fresh, a success is recorded by an UPDATE
+    that only applies while ``last_t`` is below the accepted step (so a
+    code can be used once even when two workers check it at the same time),
+    and failures are counted with an atomic increment. Neither writes the
+    rest of the row, so a stale copy can't roll back another request's state.
+    """
+    devices = TOTPDevice.objects.filter(pk=device.pk)
+    state = devices.values(*STATE_FIELDS).first()
+    if state is None:
+        return False
+    for field, value in state.items():
+        setattr(device, field, value)
+    if not device.verify_is_allowed()[0]:
+        return False
+
+    try:
+        token = int(token)
+    except (TypeError, ValueError):
+        verified = False
+    else:
+        totp = TOTP(device.bin_key, device.step, device.t0, device.digits, device.drift)
+        totp.time = time.time()
+        verified = totp.verify(token, device.tolerance, device.last_t + 1)
+        if verified:
+            updates = {
+                'last_t': totp.t(),
+                'throttling_failure_count': 0,
+                'throttling_failure_timestamp': None,
+            }
+            if getattr(settings, 'OTP_TOTP_SYNC', True):
+                updates['drift'] = totp.drift
+            # Zero rows: another request accepted this step first
+            verified = devices.filter(last_t__lt=updates['last_t']).update(**updates) == 1
+
+    if verified:
+        for field, value in updates.items():
+            setattr(device, field, value)
+    else:
+        devices.update(
+            throttling_failure_count=F('throttling_failure_count') + 1,
+            throttling_failure_timestamp=timezone.now(),
+        )
+    return verified
+
+
+@receiver(post_save, sender=TOTPDevice)
+def refresh_cached_device(sender, instance, update_fields=None, **kwargs):
+    # Saves of state fields alone leave the cached fields as they were
+    if update_fields is not None and set(update_fields) <= set(STATE_FIELDS):
+        return
+    # Write through when the cached device was saved in full so logins stay
+    # hits; otherwise just invalidate
+    cache = get_device_cache()
+    cached = cache.get(instance.user_id)
+    if cached is not None and cached.pk == instance.pk and \
+            not instance.get_deferred_fields() & set(CACHED_FIELDS):
+        cache.set(instance)
+    else:
+        cache.delete(instance.user_id)
+
+
+@receiver(post_delete, sender=TOTPDevice)
+def drop_cached_device(sender, instance, **kwargs):
+    get_device_cache().delete(instance.user_id)
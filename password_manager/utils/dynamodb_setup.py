@@ -37,6 +37,30 @@ def create_dynamodb_table():
                     'AttributeName': 'item_id',
                     'AttributeType': 'S'
                 },
+                {
+                    'AttributeName': 'updated_at',
+                    'AttributeType': 'S'
+                },
+            ],
+            # Newest-first vault listing without reading encrypted_data
+            LocalSecondaryIndexes=[
+                {
+                    'IndexName': 'updated_at-index',
+                    'KeySchema': [
+                        {
+                            'AttributeName': 'user_id',
+                            'KeyType': 'HASH'
+                        },
+                        {
+                            'AttributeName': 'updated_at',
+                            'KeyType': 'RANGE'
+                        }
+                    ],
+                    'Projection': {
+                        'ProjectionType': 'INCLUDE',
+                        'NonKeyAttributes': ['name', 'created_at', 'deleted']
+                    }
+                }
             ],
             ProvisionedThroughput={
                 'ReadCapacityUnits': 5,
@@ -49,6 +73,17 @@ def create_dynamodb_table():
             print(f"Table UserVault already exists")
         else:
             print(f"Error creating table: {e}")
+
+    # Deleted vault items are kept as tombstones for delta sync until
+    # their expires_at passes
+    try:
+        dynamodb.update_time_to_live(
+            TableName='UserVault',
+            TimeToLiveSpecification={'Enabled': True, 'AttributeName': 'expires_at'}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ValidationException':
+            print(f"Error enabling TTL: {e}")
     
     # Create UserDevices table for remembered devices
     try:
@@ -0,0 +1,237 @@
+"""
+Content negotiation for vault payloads.
+
+Responses are JSON by default. Clients may ask (Accept) for MessagePack or
+CBOR, in which ``encrypted_data`` travels as raw ciphertext bytes instead of
+base64 text, and may send request bodies the same way (Content-Type).
+Metadata listings are compressed with zstd, brotli or gzip per
+Accept-Encoding. Everything except JSON and gzip is optional: install
+msgpack, cbor2, brotli or zstandard to offer it; they are imported on first
+use. orjson, when installed, encodes JSON.
+"""
+import base64
+import binascii
+import gzip
+import json
+from importlib.util import find_spec
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _installed(name):
+    return find_spec(name) is not None
+
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+CBOR = 'application/cbor'
+
+# Also accepted on requests; answered with the canonical type
+MEDIA_TYPE_ALIASES = {
+    'application/x-msgpack': MSGPACK,
+    'application/vnd.msgpack': MSGPACK,
+}
+
+
+def dumps_json(data):
+    """Encode ``data`` as compact JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+
+def _dumps_msgpack(data):
+    import msgpack
+    return msgpack.packb(data, use_bin_type=True)
+
+
+def _loads_msgpack(body):
+    import msgpack
+    return msgpack.unpackb(body, raw=False)
+
+
+def _dumps_cbor(data):
+    import cbor2
+    return cbor2.dumps(data)
+
+
+def _loads_cbor(body):
+    import cbor2
+    return cbor2.loads(body)
+
+
+def _compress_brotli(body):
+    import brotli
+    return brotli.compress(body, quality=5)
+
+
+def _compress_zstd(body):
+    import zstandard
+    return zstandard.ZstdCompressor(level=3).compress(body)
+
+
+ENCODERS = {JSON: dumps_json}
+DECODERS = {JSON: json.loads}
+if _installed('msgpack'):
+    ENCODERS[MSGPACK] = _dumps_msgpack
+    DECODERS[MSGPACK] = _loads_msgpack
+if _installed('cbor2'):
+    ENCODERS[CBOR] = _dumps_cbor
+    DECODERS[CBOR] = _loads_cbor
+
+COMPRESSORS = {'gzip': lambda body: gzip.compress(body, compresslevel=6)}
+if _installed('brotli'):
+    COMPRESSORS['br'] = _compress_brotli
+if _installed('zstandard'):
+    COMPRESSORS['zstd'] = _compress_zstd
+# Preferred first when the client accepts several equally
+COMPRESSION_PREFERENCE = ('zstd', 'br', 'gzip')
+
+
+def parse_accept(header):
+    """Return ``[(value, q), ...]`` from an Accept or Accept-Encoding header"""
+    entries = []
+    for part in (header or '').split(','):
+        value, *params = [piece.strip() for piece in part.split(';')]
+        if not value:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, number = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(number)
+                except ValueError:
+                    q = 0.0
+        entries.append((value.lower(), q))
+    return entries
+
+
+def negotiate_media_type(request):
+    """The best supported response type for the request's Accept header; JSON if none"""
+    best, best_q = JSON, 0.0
+    for value, q in parse_accept(request.headers.get('Accept')):
+        value = MEDIA_TYPE_ALIASES.get(value, value)
+        if value in ENCODERS and q > best_q:
+            best, best_q = value, q
+    return best
+
+
+def negotiate_compression(request):
+    """The preferred available coding the client accepts, or None"""
+    accepted = {
+        value: q for value, q in parse_accept(request.headers.get('Accept-Encoding'))
+    }
+    for coding in COMPRESSION_PREFERENCE:
+        if coding in COMPRESSORS and accepted.get(coding, accepted.get('*', 0)) > 0:
+            return coding
+    return None
+
+
+def _raw_ciphertext(data):
+    """Swap base64 encrypted_data strings for their bytes, at any depth"""
+    if isinstance(data, list):
+        return [_raw_ciphertext(value) for value in data]
+    if not isinstance(data, dict):
+        return data
+    converted = {}
+    for key, value in data.items():
+        if key == 'encrypted_data' and isinstance(value, str):
+            try:
+                value = base64.b64decode(value, validate=True)
+            except (binascii.Error, ValueError):
+                pass
+        else:
+            value = _raw_ciphertext(value)
+        converted[key] = value
+    return converted
+
+
+def _base64_ciphertext(data):
+    """Inverse of _raw_ciphertext for request bodies"""
+    if isinstance(data, list):
+        return [_base64_ciphertext(value) for value in data]
+    if not isinstance(data, dict):
+        return data
+    return {
+        key: base64.b64encode(value).decode('ascii')
+        if key == 'encrypted_data' and isinstance(value, (bytes, bytearray))
+        else _base64_ciphertext(value)
+        for key, value in data.items()
+    }
+
+
+def load_body(request):
+    """
+    Decode a JSON, MessagePack or CBOR request body by its Content-Type.
+
+    Raw ciphertext bytes come back as base64 text, as stored (and as any
+    X-HMAC signature covers). Raises ValueError on an undecodable body.
+    """
+    content_type = MEDIA_TYPE_ALIASES.get(request.content_type, request.content_type)
+    decoder = DECODERS.get(content_type)
+    if decoder is None or content_type == JSON:
+        return json.loads(request.body)
+    try:
+        data = decoder(request.body)
+    except Exception as e:
+        raise ValueError(f"Invalid {content_type} body") from e
+    return _base64_ciphertext(data)
+
+
+def vary_headers(compress=False):
+    """The request headers a ``vault_response`` with ``compress`` depends on"""
+    if compress and getattr(settings, 'VAULT_COMPRESSION', {}).get('ENABLED', True):
+        return ['Accept', 'Accept-Encoding']
+    return ['Accept']
+
+
+def representation(request, compress=False):
+    """
+    Short name of the representation ``vault_response`` sends this request:
+    '' for JSON, otherwise the media subtype and/or the negotiated coding
+    (e.g. 'cbor', 'gzip', 'msgpack+br'). ETags include it so different
+    encodings of one resource never share a validator.
+    """
+    parts = []
+    media_type = negotiate_media_type(request)
+    if media_type != JSON:
+        parts.append(media_type.rsplit('/', 1)[1])
+    if 'Accept-Encoding' in vary_headers(compress):
+        coding = negotiate_compression(request)
+        if coding:
+            parts.append(coding)
+    return '+'.join(parts)
+
+
+def vault_response(request, data, status=200, compress=False):
+    """
+    Return ``data`` in the negotiated format.
+
+    With ``compress`` (metadata listings; ciphertext itself doesn't
+    compress) bodies of at least VAULT_COMPRESSION["MIN_SIZE"] bytes are
+    compressed per Accept-Encoding.
+    """
+    media_type = negotiate_media_type(request)
+    if media_type != JSON:
+        data = _raw_ciphertext(data)
+    body = ENCODERS[media_type](data)
+    response = HttpResponse(body, content_type=media_type, status=status)
+    vary = vary_headers(compress)
+
+    if 'Accept-Encoding' in vary:
+        coding = negotiate_compression(request)
+        min_size = getattr(settings, 'VAULT_COMPRESSION', {}).get('MIN_SIZE', 1024)
+        if coding and len(body) >= min_size:
+            response.content = COMPRESSORS[coding](body)
+            response['Content-Encoding'] = coding
+    response['Content-Length'] = str(len(response.content))
+    patch_vary_headers(response, vary)
+    return response
@@ -0,0 +1,293 @@
+import asyncio
+import hmac
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, get_hasher, identify_hasher
+
+from .instrumentation import span
+from .metrics import Counter, Gauge, Histogram
+
+
+MiB = 1024 * 1024
+
+HASH_QUEUE_DEPTH = Gauge(
+    "password_hash_queue_depth",
+    "Password hashing jobs waiting for memory budget admission",
+)
+HASH_IN_FLIGHT_BYTES = Gauge(
+    "password_hash_in_flight_bytes",
+    "Hasher memory reserved by running password hashing jobs",
+)
+HASH_LATENCY = Histogram(
+    "password_hash_seconds",
+    "Time spent running a password hasher",
+    labelnames=("algorithm", "operation"),
+)
+HASH_WAIT = Histogram(
+    "password_hash_queue_wait_seconds",
+    "Time a password hashing job waited for admission",
+)
+HASH_SHED = Counter(
+    "password_hash_shed_total",
+    "Password hashing jobs rejected because the service was saturated",
+)
+
+
+class HashingOverloaded(Exception):
+    """Raised when a hashing job cannot be admitted in time"""
+
+    def __init__(self, retry_after=1):
+        super().__init__("Password hashing service is saturated")
+        self.retry_after = retry_after
+
+
+def hasher_memory(hasher):
+    """Return the peak memory in bytes one run of ``hasher`` needs"""
+    if hasattr(hasher, 'memory_cost'):
+        # Argon2: memory_cost is KiB for the whole hash
+        return hasher.memory_cost * 1024
+    if hasattr(hasher, 'work_factor'):
+        # scrypt: 128 * N * r (the p lanes run one after another)
+        return 128 * hasher.work_factor * hasher.block_size
+    return 0
+
+
+class MemoryBudget:
+    """A weighted semaphore over bytes of hasher memory"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_use = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, amount, timeout=None):
+        # A single job larger than the whole budget may still run alone
+        amount = min(amount, self.limit)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self.in_use + amount > self.limit:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            self.in_use += amount
+            HASH_IN_FLIGHT_BYTES.set(self.in_use)
+            return True
+
+    def release(self, amount):
+        amount = min(amount, self.limit)
+        with self._condition:
+            self.in_use -= amount
+            HASH_IN_FLIGHT_BYTES.set(self.in_use)
+            self._condition.notify_all()
+
+
+class HashingService:
+    """
+    Runs password hashers on a dedicated, size-limited executor.
+
+    Each job reserves its hasher's memory from a shared budget before it is
+    submitted. Jobs wait up to ``queue_timeout`` seconds for admission and
+    at most ``max_queue`` may wait at once; anything beyond that raises
+    ``HashingOverloaded`` so the view can answer 503 + Retry-After instead of
+    letting a login burst push the worker into memory pressure.
+    """
+
+    def __init__(self, workers=2, memory_budget=512 * MiB, queue_timeout=2.0,
+                 max_queue=32, retry_after=1):
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='password-hasher'
+        )
+        self.budget = MemoryBudget(memory_budget)
+        self.queue_timeout = queue_timeout
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self._waiting = 0
+        self._waiting_lock = threading.Lock()
+        self._dummy_encoded = None
+        self._dummy_lock = threading.Lock()
+
+    def _admit(self, memory):
+        with self._waiting_lock:
+            if self._waiting >= self.max_queue:
+                HASH_SHED.inc()
+                raise HashingOverloaded(self.retry_after)
+            self._waiting += 1
+            HASH_QUEUE_DEPTH.set(self._waiting)
+        start = time.perf_counter()
+        try:
+            admitted = self.budget.acquire(memory, self.queue_timeout)
+        finally:
+            with self._waiting_lock:
+                self._waiting -= 1
+                HASH_QUEUE_DEPTH.set(self._waiting)
+        HASH_WAIT.observe(time.perf_counter() - start)
+        if not admitted:
+            HASH_SHED.inc()
+            raise HashingOverloaded(self.retry_after)
+
+    def run(self, hasher, operation, func, *args):
+        """Run ``func(*args)`` on the executor under ``hasher``'s memory cost"""
+        with span('hash'):
+            return self._run(hasher, operation, func, *args)
+
+    def _run(self, hasher, operation, func, *args):
+        memory = hasher_memory(hasher)
+        self._admit(memory)
+        try:
+            return self._submit(hasher, operation, func, *args).result()
+        finally:
+            self.budget.release(memory)
+
+    async def arun(self, hasher, operation, func, *args):
+        """
+        Like ``run``, awaiting admission and the result instead of blocking
+        the event loop.
+        """
+        with span('hash'):
+            memory = hasher_memory(hasher)
+            await sync_to_async(self._admit, thread_sensitive=False)(memory)
+            try:
+                return await asyncio.wrap_future(self._submit(hasher, operation, func, *args))
+            finally:
+                self.budget.release(memory)
+
+    def _submit(self, hasher, operation, func, *args):
+        def timed():
+            start = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                HASH_LATENCY.observe(
+                    time.perf_counter() - start,
+                    algorithm=hasher.algorithm, operation=operation,
+                )
+
+        return self._executor.submit(timed)
+
+    def _dummy_current(self, encoded, preferred):
+        return (
+            encoded is not None
+            and identify_hasher(encoded).algorithm == preferred.algorithm
+            and not preferred.must_update(encoded)
+        )
+
+    def dummy_encoded(self):
+        """
+        Return a hash of a random password made with the preferred hasher's
+        current parameters, recomputed only when those change.
+        """
+        preferred = get_hasher('default')
+        encoded = self._dummy_encoded
+        if not self._dummy_current(encoded, preferred):
+            with self._dummy_lock:
+                encoded = self._dummy_encoded
+                if not self._dummy_current(encoded, preferred):
+                    encoded = self.run(
+                        preferred, 'set', preferred.encode,
+                        secrets.token_urlsafe(32), preferred.salt()
+                    )
+                    self._dummy_encoded = encoded
+        return encoded
+
+    def check_dummy(self, raw_password):
+        """
+        Do the work of a failed ``check_password`` without a user.
+
+        Unknown users are verified against the dummy hash with the same
+        hasher, parameters and executor as a real account, so the response
+        time doesn't reveal whether the account exists. Always False.
+        """
+        encoded = self.dummy_encoded()
+        self.run(identify_hasher(encoded), 'check', check_password, raw_password or '', encoded)
+        return False
+
+    async def acheck_dummy(self, raw_password):
+        encoded = self._dummy_encoded
+        if not self._dummy_current(encoded, get_hasher('default')):
+            encoded = await sync_to_async(self.dummy_encoded, thread_sensitive=False)()
+        await self.arun(identify_hasher(encoded), 'check', check_password, raw_password or '', encoded)
+        return False
+
+    def set_password(self, user, raw_password):
+        """Hash ``raw_password`` with the default hasher and set it on ``user``"""
+        self.run(get_hasher('default'), 'set', user.set_password, raw_password)
+
+    def check_password(self, user, raw_password):
+        """
+        Verify ``raw_password`` against ``user``'s stored hash.
+
+        Accounts created before server-side hashing stored the client's
+        auth hash verbatim; those are compared in constant time and, on
+        success, re-hashed so the next login takes the normal path.
+        """
+        if raw_password is None:
+            return self.check_dummy(raw_password)
+        try:
+            hasher = identify_hasher(user.password)
+        except ValueError:
+            if not user.password or not hmac.compare_digest(
+                user.password.encode('utf-8'), raw_password.encode('utf-8')
+            ):
+                return self.check_dummy(raw_password)
+            self.set_password(user, raw_password)
+            user.save(update_fields=['password'])
+            return True
+        verified = self.run(hasher, 'check', check_password, raw_password, user.password)
+        # Re-hash on the request thread (DB connections are per thread) when
+        # the preferred hasher or its parameters changed since this hash was made
+        preferred = get_hasher('default')
+        if verified and (hasher.algorithm != preferred.algorithm
+                         or preferred.must_update(user.password)):
+            self.set_password(user, raw_password)
+            user.save(update_fields=['password'])
+        return verified
+
+    async def acheck_password(self, user, raw_password):
+        """Async ``check_password``; hashing never blocks the event loop"""
+        if raw_password is None:
+            return await self.acheck_dummy(raw_password)
+        try:
+            hasher = identify_hasher(user.password)
+        except ValueError:
+            # Pre-hashing accounts are rare and re-hashed on first login
+            return await sync_to_async(self.check_password)(user, raw_password)
+        verified = await self.arun(hasher, 'check', check_password, raw_password, user.password)
+        preferred = get_hasher('default')
+        if verified and (hasher.algorithm != preferred.algorithm
+                         or preferred.must_update(user.password)):
+            await self.arun(preferred, 'set', user.set_password, raw_password)
+            await sync_to_async(user.save)(update_fields=['password'])
+        return verified
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+_hashing_service = None
+_hashing_service_lock = threading.Lock()
+
+
+def get_hashing_service():
+    """Return the per-process hashing service configured by ``PASSWORD_HASHING``"""
+    global _hashing_service
+    if _hashing_service is None:
+        with _hashing_service_lock:
+            if _hashing_service is None:
+                config = getattr(settings, 'PASSWORD_HASHING', {})
+                _hashing_service = HashingService(
+                    workers=config.get('WORKERS', 2),
+                    memory_budget=config.get('MEMORY_BUDGET', 512 * MiB),
+                    queue_timeout=config.get('QUEUE_TIMEOUT', 2.0),
+                    max_queue=config.get('MAX_QUEUE', 32),
+                    retry_after=config.get('RETRY_AFTER', 1),
+                )
+                # Compute the unknown-user dummy hash up front so the first
+                # unknown login doesn't pay for it
+                _hashing_service.dummy_encoded()
+    return _hashing_service
@@ -0,0 +1,117 @@
+import contextvars
+import time
+from contextlib import contextmanager, nullcontext
+
+from .metrics import Counter, Histogram
+
+
+VIEW_DURATION = Histogram(
+    "view_duration_seconds",
+    "Time spent in each view, including the middleware below the instrumentation",
+    labelnames=("view",),
+)
+VIEW_SPAN_DURATION = Histogram(
+    "view_span_duration_seconds",
+    "Time spent in each instrumented span (db, hash, qr, serialize, ...) per view",
+    labelnames=("view", "span"),
+)
+VIEW_DB_QUERIES = Counter(
+    "view_db_queries_total",
+    "Database queries run by each view",
+    labelnames=("view",),
+)
+
+_current = contextvars.ContextVar('request_timings', default=None)
+_untimed = nullcontext()
+
+
+class RequestTimings:
+    """Accumulated span durations (and counts) for one request"""
+
+    def __init__(self):
+        self.spans = {}
+        self.counts = {}
+
+    def add(self, name, seconds, count=1):
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+        self.counts[name] = self.counts.get(name, 0) + count
+
+
+@contextmanager
+def _timed(timings, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - start)
+
+
+def span(name):
+    """
+    Time a block as part of the current request's ``name`` span.
+
+    Outside an instrumented request this is a shared no-op context manager,
+    so call sites can stay in place with instrumentation turned off.
+    """
+    timings = _current.get()
+    if timings is None:
+        return _untimed
+    return _timed(timings, name)
+
+
+def current_timings():
+    """The ``RequestTimings`` being recorded, or None"""
+    return _current.get()
+
+
+@contextmanager
+def recording():
+    """Record spans from this context (and tasks it starts) into a new RequestTimings"""
+    timings = RequestTimings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper adding each query to the current request's
+    ``db`` span. Installed on connections once; a no-op outside a recording.
+    """
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add('db', time.perf_counter() - start)
+
+
+def install_query_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def server_timing(timings, total):
+    """Format ``timings`` and the ``total`` seconds as a Server-Timing header value"""
+    entries = []
+    for name, seconds in timings.spans.items():
+        entry = f"{name};dur={seconds * 1000:.2f}"
+        if name == 'db':
+            entry += f';desc="{timings.counts[name]} queries"'
+        entries.append(entry)
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries)
+
+
+def observe(view, timings, total):
+    """Export one request's timings as Prometheus metrics"""
+    VIEW_DURATION.observe(total, view=view)
+    for name, seconds in timings.spans.items():
+        VIEW_SPAN_DURATION.observe(seconds, view=view, span=name)
+    queries = timings.counts.get('db', 0)
+    if queries:
+        VIEW_DB_QUERIES.inc(queries, view=view)
@@ -0,0 +1,142 @@
+"""
+PostgreSQL backend that takes connections from an in-process psycopg2 pool.
+
+    DATABASES["default"] = {
+        "ENGINE": "password_manager.utils.postgresql_pool",
+        ...,
+        "CONN_MAX_AGE": 0,
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {"pool": {"min_size": 2, "max_size": 10, "timeout": 5}},
+    }
+
+Django "closes" the connection at the end of each request, which here hands
+it back to the pool instead, so requests skip the TCP and auth handshake.
+At most ``max_size`` connections are open per process, ``min_size`` of them
+are kept idle, and a checkout waits up to ``timeout`` seconds for a free one.
+With CONN_HEALTH_CHECKS each checkout is pinged first and dead connections
+are replaced. Pools are per process, so they are safe with preforking.
+"""
+import os
+import threading
+
+import psycopg2
+import psycopg2.extras
+from psycopg2.pool import ThreadedConnectionPool
+
+from django.db.backends.postgresql import base
+from django.utils.asyncio import async_unsafe
+
+
+POOL_DEFAULTS = {"min_size": 1, "max_size": 4, "timeout": 5.0}
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """A ThreadedConnectionPool that waits for a free connection instead of failing"""
+
+    def __init__(self, conn_params, min_size, max_size, timeout):
+        self.timeout = timeout
+        self._pool = ThreadedConnectionPool(min_size, max_size, **conn_params)
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    def getconn(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise psycopg2.OperationalError(
+                f"No pooled connection became free within {self.timeout} seconds"
+            )
+        try:
+            return self._pool.getconn()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def putconn(self, connection, close=False):
+        try:
+            self._pool.putconn(connection, close=close)
+        finally:
+            self._slots.release()
+
+    def closeall(self):
+        self._pool.closeall()
+
+
+def get_pool(alias, conn_params, options):
+    """Return this process's pool for ``alias``, creating it on first use"""
+    key = (alias, os.getpid())
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = ConnectionPool(conn_params, **options)
+    return pool
+
+
+def close_pools():
+    """Close every pooled connection of this process"""
+    with _pools_lock:
+        for (alias, pid), pool in list(_pools.items()):
+            if pid == os.getpid():
+                pool.closeall()
+                del _pools[(alias, pid)]
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    @property
+    def pool_options(self):
+        options = self.settings_dict["OPTIONS"].get("pool") or {}
+        return {**POOL_DEFAULTS, **(options if isinstance(options, dict) else {})}
+
+    def get_connection_params(self):
+        conn_params = super().get_connection_params()
+        conn_params.pop("pool", None)
+        return conn_params
+
+    def checkout(self, conn_params):
+        pool = get_pool(self.alias, conn_params, self.pool_options)
+        # Each attempt may find a dead connection; bound the retries
+        for _ in range(self.pool_options["max_size"] + 1):
+            connection = pool.getconn()
+            if connection.closed:
+                pool.putconn(connection, close=True)
+                continue
+            if not self.settings_dict["CONN_HEALTH_CHECKS"]:
+                return connection
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                # A new connection isn't in autocommit yet, so the ping opened
+                # a transaction; end it or Django can't configure the session
+                if not connection.autocommit:
+                    connection.rollback()
+                return connection
+            except psycopg2.Error:
+                pool.putconn(connection, close=True)
+        return pool.getconn()
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        connection = self.checkout(conn_params)
+        # As in the stock backend: record (or apply) the isolation level
+        # before Django switches autocommit on
+        options = self.settings_dict["OPTIONS"]
+        try:
+            self.isolation_level = options["isolation_level"]
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        psycopg2.extras.register_default_jsonb(
+            conn_or_curs=connection, loads=lambda x: x
+        )
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                pool = get_pool(self.alias, self.get_connection_params(), self.pool_options)
+                # The pool rolls back an open transaction before reuse
+                return pool.putconn(self.connection, close=bool(self.connection.closed))
@@ -0,0 +1,133 @@
+import asyncio
+import copy
+import threading
+import uuid
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.http import JsonResponse
+
+from password_manager.models import CustomUser
+from .device_cache import LRUCache
+from .tokens import ACCESS, InvalidToken, bearer_token, tokens_enabled, verify_token
+
+
+# The only user fields the vault views read; everything else stays deferred
+PRINCIPAL_FIELDS = ('id', 'hmac_words_hash')
+
+_principal_cache = None
+_principal_cache_lock = threading.Lock()
+
+
+def get_principal_cache():
+    """Return the per-process principal cache configured by ``VAULT_PRINCIPAL_CACHE``"""
+    global _principal_cache
+    if _principal_cache is None:
+        with _principal_cache_lock:
+            if _principal_cache is None:
+                config = getattr(settings, 'VAULT_PRINCIPAL_CACHE', {})
+                _principal_cache = LRUCache(
+                    max_size=config.get('MAX_SIZE', 4096),
+                    ttl=config.get('TTL', 10),
+                )
+    return _principal_cache
+
+
+def get_vault_principal(user_id):
+    """
+    Return a ``CustomUser`` with only PRINCIPAL_FIELDS loaded, or None.
+
+    Hits cost no queries; entries live for a few seconds and are dropped
+    whenever the user is saved or deleted.
+    """
+    cache = get_principal_cache()
+    user = cache.get(user_id)
+    if user is None:
+        user = CustomUser.objects.only(*PRINCIPAL_FIELDS).filter(id=user_id).first()
+        if user is None:
+            return None
+        cache.set(user_id, user)
+    # Hand out a copy so a view can't mutate the shared instance
+    return copy.copy(user)
+
+
+async def aget_vault_principal(user_id):
+    """Async ``get_vault_principal``"""
+    cache = get_principal_cache()
+    user = cache.get(user_id)
+    if user is None:
+        user = await CustomUser.objects.only(*PRINCIPAL_FIELDS).filter(id=user_id).afirst()
+        if user is None:
+            return None
+        cache.set(user_id, user)
+    return copy.copy(user)
+
+
+def _principal_id(request, token):
+    """Return ``(user_id, error_response)`` from a bearer token or the session"""
+    if token:
+        try:
+            return verify_token(token, ACCESS)['sub'], None
+        except InvalidToken:
+            return None, JsonResponse({'success': False, 'error': 'Invalid token'}, status=401)
+    return request.session.get('login_data', {}).get('user_id'), None
+
+
+def _not_authenticated():
+    return JsonResponse({'success': False, 'error': 'Not authenticated'}, status=401)
+
+
+def vault_login_required(view):
+    """
+    Resolve the logged-in vault user once and pass it on as ``request.vault_user``.
+
+    The user comes from an ``Authorization: Bearer`` access token when
+    LOGIN_TOKENS is enabled and one is sent (no session read), otherwise
+    from the session. Answers 401 when neither identifies an existing user.
+    Works on ``async def`` views too.
+    """
+    if asyncio.iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            token = bearer_token(request) if tokens_enabled() else None
+            # Both the token denylist (a cache, possibly remote) and the
+            # session block; only session access needs the request's thread
+            user_id, error = await sync_to_async(
+                _principal_id, thread_sensitive=not token
+            )(request, token)
+            if error:
+                return error
+            try:
+                user = await aget_vault_principal(uuid.UUID(user_id)) if user_id else None
+            except ValueError:
+                user = None
+            if user is None:
+                return _not_authenticated()
+            request.vault_user = user
+            return await view(request, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token = bearer_token(request) if tokens_enabled() else None
+        user_id, error = _principal_id(request, token)
+        if error:
+            return error
+        try:
+            user = get_vault_principal(uuid.UUID(user_id)) if user_id else None
+        except ValueError:
+            user = None
+        if user is None:
+            return _not_authenticated()
+        request.vault_user = user
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def drop_cached_principal(sender, instance, **kwargs):
+    get_principal_cache().delete(instance.pk)
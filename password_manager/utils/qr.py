@@ -0,0 +1,134 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+
+from .instrumentation import span
+
+
+QR_FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+    'matrix': 'application/json',
+}
+
+
+class QRRenderQueueFull(Exception):
+    """Raised when the render pool already has its maximum of pending jobs"""
+
+
+def qr_matrix(data, border=4):
+    """Return the QR module matrix for ``data`` (no imaging library needed)"""
+    # Imported here: only registration renders QR codes
+    import qrcode
+
+    qr = qrcode.QRCode(border=border)
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr.get_matrix()
+
+
+def render_svg(matrix, scale=10):
+    """Render a module matrix as a single-path SVG document"""
+    size = len(matrix)
+    path = "".join(
+        f"M{x},{y}h1v1h-1z"
+        for y, row in enumerate(matrix)
+        for x, dark in enumerate(row)
+        if dark
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{size * scale}" '
+        f'height="{size * scale}" viewBox="0 0 {size} {size}" '
+        'shape-rendering="crispEdges">'
+        f'<rect width="{size}" height="{size}" fill="#fff"/>'
+        f'<path d="{path}" fill="#000"/></svg>'
+    ).encode('utf-8')
+
+
+def render_qr(data, output_format='png'):
+    """
+    Render ``data`` as a QR code and return the encoded bytes.
+
+    ``png`` goes through Pillow; ``svg`` and ``matrix`` are built directly
+    from the module matrix and never touch Pillow.
+    """
+    if output_format == 'png':
+        import qrcode
+
+        buffered = BytesIO()
+        qrcode.make(data).save(buffered, format="PNG")
+        return buffered.getvalue()
+    matrix = qr_matrix(data)
+    if output_format == 'svg':
+        return render_svg(matrix)
+    if output_format == 'matrix':
+        rows = ",".join(
+            '"' + "".join("1" if dark else "0" for dark in row) + '"'
+            for row in matrix
+        )
+        return f'{{"size":{len(matrix)},"modules":[{rows}]}}'.encode('utf-8')
+    raise ValueError(f"Unsupported QR format: {output_format}")
+
+
+class QRRenderPool:
+    """
+    Bounded executor for QR rendering.
+
+    At most ``workers`` renders run at once and at most ``max_pending``
+    more may wait; anything beyond that is rejected with
+    ``QRRenderQueueFull`` so callers can shed load instead of queueing
+    without bound.
+    """
+
+    def __init__(self, workers=2, max_pending=16, executor='thread'):
+        if executor == 'process':
+            # concurrent.futures.process pulls in multiprocessing; only load it here
+            from concurrent.futures import ProcessPoolExecutor
+            self._executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            self._executor = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix='qr-render'
+            )
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+
+    def submit(self, data, output_format='png'):
+        if not self._slots.acquire(blocking=False):
+            raise QRRenderQueueFull("QR render queue is full")
+        try:
+            future = self._executor.submit(render_qr, data, output_format)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    async def render(self, data, output_format='png'):
+        """Render on the pool without blocking the event loop"""
+        with span('qr'):
+            return await asyncio.wrap_future(self.submit(data, output_format))
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+
+def get_render_pool():
+    """Return the per-process QR render pool configured by ``QR_RENDER_POOL``"""
+    global _render_pool
+    if _render_pool is None:
+        with _render_pool_lock:
+            if _render_pool is None:
+                config = getattr(settings, 'QR_RENDER_POOL', {})
+                _render_pool = QRRenderPool(
+                    workers=config.get('WORKERS', 2),
+                    max_pending=config.get('MAX_PENDING', 16),
+                    executor=config.get('EXECUTOR', 'thread'),
+                )
+    return _render_pool
@@ -0,0 +1,276 @@
+import socketserver
+import threading
+import time
+
+
+class RESPError(Exception):
+    """Sent back to the client as a RESP error reply"""
+
+
+class KeyValueStore:
+    """Thread-safe dict of bytes values with optional per-key expiry"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key)
+            return entry[0] if entry else None
+
+    def set(self, key, value, ttl=None, nx=False, xx=False, keep_ttl=False):
+        with self._lock:
+            entry = self._live(key)
+            if (nx and entry) or (xx and not entry):
+                return False
+            expires = time.monotonic() + ttl if ttl is not None else None
+            if keep_ttl and entry:
+                expires = entry[1]
+            self._data[key] = (value, expires)
+            return True
+
+    def delete(self, *keys):
+        with self._lock:
+            removed = 0
+            for key in keys:
+                if self._live(key) is not None:
+                    del self._data[key]
+                    removed += 1
+            return removed
+
+    def exists(self, *keys):
+        with self._lock:
+            return sum(1 for key in keys if self._live(key))
+
+    def expire(self, key, ttl):
+        with self._lock:
+            entry = self._live(key)
+            if not entry:
+                return 0
+            if ttl <= 0:
+                del self._data[key]
+            else:
+                self._data[key] = (entry[0], time.monotonic() + ttl)
+            return 1
+
+    def persist(self, key):
+        with self._lock:
+            entry = self._live(key)
+            if not entry or entry[1] is None:
+                return 0
+            self._data[key] = (entry[0], None)
+            return 1
+
+    def ttl(self, key):
+        with self._lock:
+            entry = self._live(key)
+            if not entry:
+                return -2
+            if entry[1] is None:
+                return -1
+            return max(0, round(entry[1] - time.monotonic()))
+
+    def incrby(self, key, amount):
+        with self._lock:
+            entry = self._live(key)
+            try:
+                value = int(entry[0]) + amount if entry else amount
+            except ValueError:
+                raise RESPError("ERR value is not an integer or out of range")
+            self._data[key] = (str(value).encode(), entry[1] if entry else None)
+            return value
+
+    def flush(self):
+        with self._lock:
+            self._data.clear()
+
+    def size(self):
+        with self._lock:
+            return sum(1 for key in list(self._data) if self._live(key))
+
+
+def _int(value):
+    try:
+        return int(value)
+    except ValueError:
+        raise RESPError("ERR value is not an integer or out of range")
+
+
+def execute(store, args):
+    """Run one command against ``store`` and return its reply value"""
+    if not args:
+        raise RESPError("ERR empty command")
+    name = args[0].upper()
+    args = args[1:]
+    if name == b'PING':
+        return args[0] if args else ('simple', 'PONG')
+    if name in (b'SELECT', b'CLIENT'):
+        return ('simple', 'OK')
+    if name == b'GET':
+        return store.get(args[0])
+    if name == b'SET':
+        key, value, options = args[0], args[1], [o.upper() for o in args[2:]]
+        ttl, nx, xx, keep_ttl = None, False, False, False
+        i = 0
+        while i < len(options):
+            option = options[i]
+            if option in (b'EX', b'PX'):
+                ttl = _int(args[2 + i + 1]) / (1 if option == b'EX' else 1000)
+                i += 1
+            elif option == b'NX':
+                nx = True
+            elif option == b'XX':
+                xx = True
+            elif option == b'KEEPTTL':
+                keep_ttl = True
+            else:
+                raise RESPError("ERR syntax error")
+            i += 1
+        if store.set(key, value, ttl, nx, xx, keep_ttl):
+            return ('simple', 'OK')
+        return None
+    if name == b'MGET':
+        return [store.get(key) for key in args]
+    if name == b'MSET':
+        for key, value in zip(args[::2], args[1::2]):
+            store.set(key, value)
+        return ('simple', 'OK')
+    if name == b'DEL':
+        return store.delete(*args)
+    if name == b'EXISTS':
+        return store.exists(*args)
+    if name in (b'EXPIRE', b'PEXPIRE'):
+        ttl = _int(args[1]) / (1 if name == b'EXPIRE' else 1000)
+        return store.expire(args[0], ttl)
+    if name == b'PERSIST':
+        return store.persist(args[0])
+    if name == b'TTL':
+        return store.ttl(args[0])
+    if name in (b'INCR', b'DECR', b'INCRBY', b'DECRBY'):
+        amount = _int(args[1]) if name.endswith(b'BY') else 1
+        return store.incrby(args[0], -amount if name.startswith(b'DECR') else amount)
+    if name in (b'FLUSHDB', b'FLUSHALL'):
+        store.flush()
+        return ('simple', 'OK')
+    if name == b'DBSIZE':
+        return store.size()
+    raise RESPError(f"ERR unknown command '{name.decode(errors='replace')}'")
+
+
+def encode(reply):
+    if reply is None:
+        return b'$-1\r\n'
+    if isinstance(reply, tuple) and reply[0] == 'simple':
+        return f"+{reply[1]}\r\n".encode()
+    if isinstance(reply, RESPError):
+        return f"-{reply}\r\n".encode()
+    if isinstance(reply, bool) or isinstance(reply, int):
+        return f":{int(reply)}\r\n".encode()
+    if isinstance(reply, (bytes, bytearray)):
+        return b'$%d\r\n%s\r\n' % (len(reply), reply)
+    if isinstance(reply, list):
+        return b'*%d\r\n' % len(reply) + b''.join(encode(item) for item in reply)
+    raise TypeError(f"Can't encode {type(reply)!r}")
+
+
+class RESPHandler(socketserver.StreamRequestHandler):
+    """One client connection: read RESP arrays (or inline commands), reply"""
+
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b'*'):
+            return line.split()
+        args = []
+        for _ in range(int(line[1:])):
+            header = self.rfile.readline()
+            length = int(header[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def handle(self):
+        store = self.server.store
+        queued = None
+        while True:
+            try:
+                args = self.read_command()
+            except (ConnectionError, ValueError):
+                return
+            if args is None:
+                return
+            name = args[0].upper() if args else b''
+            if name == b'QUIT':
+                self.wfile.write(encode(('simple', 'OK')))
+                return
+            if name == b'MULTI':
+                queued = []
+                reply = ('simple', 'OK')
+            elif name == b'EXEC' and queued is not None:
+                replies = []
+                for command in queued:
+                    try:
+                        replies.append(execute(store, command))
+                    except RESPError as e:
+                        replies.append(e)
+                queued = None
+                reply = replies
+            elif name == b'DISCARD' and queued is not None:
+                queued = None
+                reply = ('simple', 'OK')
+            elif queued is not None:
+                queued.append(args)
+                reply = ('simple', 'QUEUED')
+            else:
+                try:
+                    reply = execute(store, args)
+                except (RESPError, IndexError) as e:
+                    reply = e if isinstance(e, RESPError) else RESPError(
+                        "ERR wrong number of arguments"
+                    )
+            self.wfile.write(encode(reply))
+
+
+class RESPServer(socketserver.ThreadingTCPServer):
+    """
+    A small in-process server speaking the subset of the Redis protocol the
+    Django Redis cache backend uses (strings, expiry, counters, MULTI/EXEC).
+
+    It stands in for Redis in tests and in local multi-worker development;
+    it keeps no data on disk and is not meant for production.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0):
+        super().__init__((host, port), RESPHandler)
+        self.store = KeyValueStore()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"redis://{host}:{port}/0"
+
+    def start(self):
+        """Serve from a daemon thread and return the server"""
+        self._thread = threading.Thread(
+            target=self.serve_forever, name='resp-server', daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
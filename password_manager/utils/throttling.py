@@ -0,0 +1,146 @@
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .metrics import Counter
+
+
+THROTTLE_CHECKS = Counter(
+    "throttle_checks_total",
+    "Throttle checks by scope and outcome",
+    labelnames=("scope", "outcome"),
+)
+THROTTLE_REJECTIONS = Counter(
+    "throttle_rejections_total",
+    "Requests rejected by a throttle rule, by the key that was over its limit",
+    labelnames=("scope", "dimension"),
+)
+
+DEFAULT_RULES = {
+    # dimension: (requests, window seconds)
+    "login_step1": {"ip": (30, 60), "user": (10, 60), "username": (10, 60)},
+    "login_step2": {"ip": (30, 60), "user": (5, 60)},
+    "verify_totp": {"ip": (30, 60), "user": (5, 60)},
+}
+
+
+class Throttled(Exception):
+    """Raised when a request is over one of its scope's limits"""
+
+    def __init__(self, scope, dimension, retry_after):
+        super().__init__(f"Too many {scope} requests")
+        self.scope = scope
+        self.dimension = dimension
+        self.retry_after = retry_after
+
+
+class SlidingWindowThrottle:
+    """
+    Sliding-window rate limits kept in a Django cache.
+
+    Each key counts hits in fixed windows; the current estimate is this
+    window's count plus the previous window's count weighted by how much of
+    it still overlaps the sliding window. That needs two counters per key and
+    only cache get_many/add/incr, so it works with the in-process LocMemCache
+    on one node and with a shared cache (CACHE_URL) on many. LocMemCache
+    counters are per process: with several workers each keeps its own.
+    """
+
+    def __init__(self, rules=None, cache_alias='default', enabled=True):
+        self.rules = DEFAULT_RULES if rules is None else rules
+        self.cache_alias = cache_alias
+        self.enabled = enabled
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def _key(self, scope, dimension, value, index):
+        value = value if isinstance(value, bytes) else str(value).encode('utf-8')
+        digest = hashlib.sha256(value).hexdigest()[:32]
+        return f"throttle:{scope}:{dimension}:{digest}:{index}"
+
+    def _incr(self, key, window):
+        """Count a hit on ``key`` and return its new count"""
+        if self.cache.add(key, 1, 2 * window):
+            return 1
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            # Expired between add and incr
+            self.cache.set(key, 1, 2 * window)
+            return 1
+
+    def check(self, scope, **values):
+        """
+        Count one request against every rule of ``scope`` for which a value
+        is given (e.g. ``ip=..., user=...``), and raise ``Throttled`` if that
+        takes any of them over its limit.
+
+        The counters are incremented first and the counts they return are
+        compared with the limits, so concurrent requests can't all pass a
+        check made before any of them was counted. Rejected requests count
+        too.
+        """
+        rules = self.rules.get(scope)
+        if not self.enabled or not rules:
+            return
+        now = time.time()
+        checks = []
+        for dimension, value in values.items():
+            if value in (None, '') or dimension not in rules:
+                continue
+            limit, window = rules[dimension]
+            index = int(now // window)
+            current = self._incr(self._key(scope, dimension, value, index), window)
+            previous = self._key(scope, dimension, value, index - 1)
+            checks.append((dimension, limit, window, index, current, previous))
+        if not checks:
+            return
+
+        # The previous windows are closed, so reading them afterwards is safe
+        counts = self.cache.get_many([check[5] for check in checks])
+        for dimension, limit, window, index, current, previous in checks:
+            elapsed = now / window - index
+            estimate = counts.get(previous, 0) * (1 - elapsed) + current
+            if estimate > limit:
+                THROTTLE_CHECKS.inc(scope=scope, outcome='rejected')
+                THROTTLE_REJECTIONS.inc(scope=scope, dimension=dimension)
+                raise Throttled(scope, dimension, max(1, math.ceil((1 - elapsed) * window)))
+        THROTTLE_CHECKS.inc(scope=scope, outcome='allowed')
+
+
+def client_ip(request):
+    """
+    The client address, from ``THROTTLING["IP_HEADER"]`` (e.g.
+    HTTP_X_FORWARDED_FOR behind a trusted proxy) or REMOTE_ADDR.
+    """
+    header = getattr(settings, 'THROTTLING', {}).get('IP_HEADER')
+    if header and request.META.get(header):
+        return request.META[header].split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR')
+
+
+_throttle = None
+_throttle_config = None
+_throttle_lock = threading.Lock()
+
+
+def get_throttle():
+    """Return the throttle configured by ``THROTTLING``"""
+    global _throttle, _throttle_config
+    config = getattr(settings, 'THROTTLING', {})
+    if _throttle is None or _throttle_config is not config:
+        with _throttle_lock:
+            if _throttle is None or _throttle_config is not config:
+                _throttle = SlidingWindowThrottle(
+                    rules=config.get('RULES'),
+                    cache_alias=config.get('CACHE_ALIAS', 'default'),
+                    enabled=config.get('ENABLED', True),
+                )
+                _throttle_config = config
+    return _throttle
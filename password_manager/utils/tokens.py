@@ -0,0 +1,109 @@
+import secrets
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+# Token types: "login" bridges login_step1 -> login_step2, "access" is the
+# bearer token vault endpoints accept once TOTP has been verified
+LOGIN = 'login'
+ACCESS = 'access'
+
+
+class InvalidToken(Exception):
+    """Raised when a token is malformed, expired, of the wrong type or revoked"""
+
+
+def token_settings():
+    config = getattr(settings, 'LOGIN_TOKENS', {})
+    return {
+        'enabled': config.get('ENABLED', False),
+        'secret_key': config.get('SECRET_KEY') or settings.SECRET_KEY,
+        'algorithm': config.get('ALGORITHM', 'HS256'),
+        'login_ttl': config.get('LOGIN_TTL', 900),
+        'access_ttl': config.get('ACCESS_TTL', 3600),
+        'denylist_cache_alias': config.get('DENYLIST_CACHE_ALIAS', 'default'),
+    }
+
+
+def tokens_enabled():
+    return token_settings()['enabled']
+
+
+def _jose():
+    """
+    python-jose, imported on first use: loading its cryptography backend
+    takes longer than the rest of the app's imports together, and most
+    deployments run with tokens off.
+    """
+    from jose import JWTError, jwt
+    return JWTError, jwt
+
+
+def _denylist():
+    return caches[token_settings()['denylist_cache_alias']]
+
+
+def issue_token(user_id, token_type):
+    """Return a signed token for ``user_id`` of ``token_type`` (LOGIN or ACCESS)"""
+    config = token_settings()
+    now = int(time.time())
+    ttl = config['login_ttl'] if token_type == LOGIN else config['access_ttl']
+    claims = {
+        'sub': str(user_id),
+        'typ': token_type,
+        'step': 1 if token_type == LOGIN else 2,
+        'iat': now,
+        'exp': now + ttl,
+        'jti': secrets.token_urlsafe(16),
+    }
+    _, jwt = _jose()
+    return jwt.encode(claims, config['secret_key'], algorithm=config['algorithm'])
+
+
+def verify_token(token, token_type):
+    """
+    Return the claims of a valid, unrevoked ``token_type`` token.
+
+    Verification is a signature check plus at most two cache lookups for
+    the denylist; it never touches the database.
+    """
+    config = token_settings()
+    JWTError, jwt = _jose()
+    try:
+        claims = jwt.decode(token, config['secret_key'], algorithms=[config['algorithm']])
+    except JWTError as e:
+        raise InvalidToken(str(e)) from e
+    if claims.get('typ') != token_type or not claims.get('sub') or not claims.get('jti'):
+        raise InvalidToken("Wrong token type")
+    denylist = _denylist()
+    revoked = denylist.get_many([f"token-denied:{claims['jti']}", f"token-revoked:{claims['sub']}"])
+    if f"token-denied:{claims['jti']}" in revoked:
+        raise InvalidToken("Token revoked")
+    if claims.get('iat', 0) <= revoked.get(f"token-revoked:{claims['sub']}", -1):
+        raise InvalidToken("Token revoked")
+    return claims
+
+
+def deny_token(claims):
+    """Revoke one token (logout); the entry lives until the token would expire"""
+    ttl = max(1, int(claims['exp'] - time.time()))
+    _denylist().set(f"token-denied:{claims['jti']}", True, ttl)
+
+
+def revoke_user_tokens(user_id):
+    """Revoke every token issued to ``user_id`` up to now"""
+    config = token_settings()
+    _denylist().set(
+        f"token-revoked:{user_id}", int(time.time()),
+        max(config['login_ttl'], config['access_ttl'])
+    )
+
+
+def bearer_token(request):
+    """Return the token from an ``Authorization: Bearer`` header, if any"""
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() == 'bearer' and token:
+        return token.strip()
+    return None
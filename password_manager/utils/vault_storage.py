@@ -0,0 +1,940 @@
+import asyncio
+import base64
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from password_manager.models import UserData, VaultTombstone
+from .blob_storage import blob_storage
+
+
+# Listing fields; encrypted_data is never read when paging through a vault
+LIST_FIELDS = ('item_id', 'name', 'created_at', 'updated_at')
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor can't be decoded"""
+
+
+def encode_cursor(data):
+    return base64.urlsafe_b64encode(
+        json.dumps(data, separators=(',', ':')).encode('utf-8')
+    ).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor("Invalid cursor") from e
+    if not isinstance(data, dict):
+        raise InvalidCursor("Invalid cursor")
+    return data
+
+
+def format_timestamp(value):
+    """Fixed-width ISO 8601 so stored timestamps sort lexicographically"""
+    return value.isoformat(timespec='microseconds')
+
+
+def discard_blob_names(names):
+    """Delete stored blobs once the current transaction commits"""
+    names = [name for name in names if name]
+    if names:
+        transaction.on_commit(lambda: [blob_storage.delete(name) for name in names])
+
+
+def discard_blobs(items):
+    """Delete the stored blobs of deleted items once the delete commits"""
+    discard_blob_names([item.encrypted_blob.name for item in items if item.encrypted_blob])
+
+
+def detach_replaced_blob(item):
+    """
+    Take the blob off an item whose inline ``encrypted_data`` replaces it,
+    so the two are never stored together. Returns the old blob's name, to
+    pass to ``discard_blob_names`` once the write succeeds, or None.
+    """
+    if not (item.encrypted_data and item.encrypted_blob):
+        return None
+    name = item.encrypted_blob.name
+    item.encrypted_blob = ''
+    item.blob_size = None
+    return name
+
+
+class VersionConflict(Exception):
+    """Raised when a conditional update finds the item at another version"""
+
+
+class SyncTokenExpired(Exception):
+    """Raised when a sync token predates the tombstone retention window"""
+
+
+def sync_settings():
+    config = getattr(settings, 'VAULT_SYNC', {})
+    return {
+        'max_items': config.get('MAX_ITEMS', 500),
+        'overlap': timedelta(seconds=config.get('OVERLAP_SECONDS', 2)),
+        'retention': timedelta(days=config.get('TOMBSTONE_RETENTION_DAYS', 90)),
+    }
+
+
+def _sync_time(data, key):
+    if key not in data:
+        return None
+    try:
+        value = datetime.fromisoformat(data[key])
+    except (TypeError, ValueError) as e:
+        raise InvalidCursor("Invalid sync token") from e
+    if value.tzinfo is None:
+        raise InvalidCursor("Invalid sync token")
+    return value
+
+
+def decode_sync_token(token):
+    """
+    Return ``(since, started, position)`` for a sync token.
+
+    ``since`` is the watermark the client is up to date with (None during a
+    full sync), ``started`` the start of the multi-page sync the token
+    continues (None on its first page) and ``position`` backend-specific
+    paging state. Only the watermark is checked against the tombstone
+    retention: one older than that can't be trusted to report every
+    deletion, so it raises ``SyncTokenExpired``.
+    """
+    data = decode_cursor(token)
+    since, started = _sync_time(data, 't'), _sync_time(data, 's')
+    if since is not None and since < timezone.now() - sync_settings()['retention']:
+        raise SyncTokenExpired("Sync token expired")
+    return since, started, data
+
+
+def next_sync_token(since, started, **position):
+    """Token for the next page of a sync that began at ``started``"""
+    data = {'s': format_timestamp(started), **position}
+    if since is not None:
+        data['t'] = format_timestamp(since)
+    return encode_cursor(data)
+
+
+def final_sync_token(started):
+    # Step back a little so rows committed by slower concurrent writes with
+    # an earlier updated_at are picked up next time (re-sends are harmless).
+    # Deletions made while a multi-page sync ran are after its start, so the
+    # next sync reports them.
+    return encode_cursor({'t': format_timestamp(started - sync_settings()['overlap'])})
+
+
+class AsyncVaultStorage:
+    """
+    Async counterparts of the storage methods used by the async views.
+
+    These defaults run the sync method in a worker thread; backends
+    override them with native async implementations where they have one.
+    """
+
+    async def alist_page(self, user, limit, cursor=None):
+        return await sync_to_async(self.list_page)(user, limit, cursor)
+
+    async def aget_item(self, user, item_id):
+        return await sync_to_async(self.get_item)(user, item_id)
+
+    async def aget_version(self, user, item_id):
+        return await sync_to_async(self.get_version)(user, item_id)
+
+    async def acreate_item(self, user, name, encrypted_data):
+        return await sync_to_async(self.create_item)(user, name, encrypted_data)
+
+    async def aupdate_item(self, item, expected_versions=None):
+        return await sync_to_async(self.update_item)(item, expected_versions)
+
+    async def adelete_item(self, item):
+        return await sync_to_async(self.delete_item)(item)
+
+
+class ORMVaultStorage(AsyncVaultStorage):
+    """
+    Vault items stored as ``UserData`` rows in the default database.
+
+    The async methods use Django's async queryset API; deletes, which need
+    a transaction, still run in a thread.
+    """
+
+    def __init__(self, **options):
+        pass
+
+    def _page_queryset(self, user, limit, cursor):
+        queryset = (
+            UserData.objects.db_manager(hints={'vault_listing': True})
+            .filter(user=user)
+            .only(*LIST_FIELDS)
+            .order_by('-updated_at', '-item_id')
+        )
+        if cursor:
+            position = decode_cursor(cursor)
+            try:
+                updated_at = datetime.fromisoformat(position['u'])
+                item_id = uuid.UUID(position['i'])
+            except (KeyError, TypeError, ValueError) as e:
+                raise InvalidCursor("Invalid cursor") from e
+            queryset = queryset.filter(
+                Q(updated_at__lt=updated_at)
+                | Q(updated_at=updated_at, item_id__lt=item_id)
+            )
+        return queryset[:limit + 1]
+
+    def _page(self, items, limit):
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            last = items[-1]
+            next_cursor = encode_cursor({
+                'u': format_timestamp(last.updated_at), 'i': str(last.item_id)
+            })
+        return items, next_cursor
+
+    def list_page(self, user, limit, cursor=None):
+        """
+        Return ``(items, next_cursor)`` for one page of the user's vault.
+
+        Keyset pagination on (updated_at, item_id), newest first, backed by
+        the (user, -updated_at, -item_id) index, so every page costs the same
+        regardless of vault size. ``encrypted_data`` is deferred. Served from
+        the read replica when one is configured.
+        """
+        return self._page(list(self._page_queryset(user, limit, cursor)), limit)
+
+    async def alist_page(self, user, limit, cursor=None):
+        return self._page([item async for item in self._page_queryset(user, limit, cursor)], limit)
+
+    def get_item(self, user, item_id):
+        return UserData.objects.get(item_id=item_id, user=user)
+
+    async def aget_item(self, user, item_id):
+        return await UserData.objects.aget(item_id=item_id, user=user)
+
+    def _version_queryset(self, user, item_id):
+        return UserData.objects.filter(item_id=item_id, user=user).values_list('version', flat=True)
+
+    def get_version(self, user, item_id):
+        """Return the item's version without reading its payload"""
+        version = self._version_queryset(user, item_id).first()
+        if version is None:
+            raise UserData.DoesNotExist("Item not found")
+        return version
+
+    async def aget_version(self, user, item_id):
+        version = await self._version_queryset(user, item_id).afirst()
+        if version is None:
+            raise UserData.DoesNotExist("Item not found")
+        return version
+
+    def get_items(self, user, item_ids):
+        """Yield the user's items among ``item_ids`` from a single IN query"""
+        return (
+            UserData.objects.filter(user=user, item_id__in=item_ids)
+            .iterator(chunk_size=100)
+        )
+
+    def create_item(self, user, name, encrypted_data):
+        return UserData.objects.create(
+            user=user, name=name, encrypted_data=encrypted_data
+        )
+
+    async def acreate_item(self, user, name, encrypted_data):
+        return await UserData.objects.acreate(
+            user=user, name=name, encrypted_data=encrypted_data
+        )
+
+    def _update(self, item, expected_versions):
+        """
+        Return ``(queryset, values, replaced_blob)`` for a conditional update
+        of ``item``
+        """
+        replaced_blob = detach_replaced_blob(item)
+        item.updated_at = timezone.now()
+        queryset = UserData.objects.filter(item_id=item.item_id, user_id=item.user_id)
+        if expected_versions is not None:
+            queryset = queryset.filter(version__in=expected_versions)
+        return queryset, {
+            'name': item.name,
+            'encrypted_data': item.encrypted_data,
+            'encrypted_blob': item.encrypted_blob.name or '',
+            'blob_size': item.blob_size,
+            'updated_at': item.updated_at,
+            'version': F('version') + 1,
+        }, replaced_blob
+
+    def _updated(self, item, expected_versions, updated):
+        if not updated:
+            if expected_versions is not None:
+                raise VersionConflict("Item was modified")
+            raise UserData.DoesNotExist("Item not found")
+        item.version += 1
+        return item
+
+    def update_item(self, item, expected_versions=None):
+        """
+        Write the item and bump its version in one UPDATE.
+
+        With ``expected_versions`` the row is only written while its version
+        is still one of them; otherwise ``VersionConflict`` is raised. Writing
+        ``encrypted_data`` to a blob item drops its blob.
+        """
+        queryset, values, replaced_blob = self._update(item, expected_versions)
+        item = self._updated(item, expected_versions, queryset.update(**values))
+        discard_blob_names([replaced_blob])
+        return item
+
+    async def aupdate_item(self, item, expected_versions=None):
+        queryset, values, replaced_blob = self._update(item, expected_versions)
+        item = self._updated(item, expected_versions, await queryset.aupdate(**values))
+        await sync_to_async(discard_blob_names)([replaced_blob])
+        return item
+
+    def delete_item(self, item):
+        # Leave a tombstone so other devices learn about the delete on sync,
+        # and drop this user's tombstones that no valid token can ask for
+        user_id, item_id = item.user_id, item.item_id
+        with transaction.atomic():
+            item.delete()
+            self._record_deletions(user_id, [item_id], timezone.now())
+            discard_blobs([item])
+
+    def _record_deletions(self, user_id, item_ids, now):
+        VaultTombstone.objects.bulk_create([
+            VaultTombstone(user_id=user_id, item_id=item_id, deleted_at=now)
+            for item_id in item_ids
+        ])
+        VaultTombstone.objects.filter(
+            user_id=user_id,
+            deleted_at__lt=now - sync_settings()['retention'],
+        ).delete()
+
+    def apply_batch(self, user, creates, updates, deletes):
+        """
+        Apply a batch of writes in one transaction.
+
+        ``creates`` are unsaved UserData instances, ``updates`` and
+        ``deletes`` items previously read with ``get_items``. Each kind costs
+        one statement per 500 items instead of one per item. Updates are
+        only written to rows still at the version that was read (they are
+        locked first); the others are returned as conflicts.
+        """
+        now = timezone.now()
+        conflicts = []
+        with transaction.atomic():
+            if updates:
+                current = dict(
+                    UserData.objects.select_for_update()
+                    .filter(user=user, item_id__in=[item.item_id for item in updates])
+                    .values_list('item_id', 'version')
+                )
+                conflicts = [item for item in updates if current.get(item.item_id) != item.version]
+                updates = [item for item in updates if current.get(item.item_id) == item.version]
+            replaced_blobs = [detach_replaced_blob(item) for item in updates]
+            for item in updates:
+                item.updated_at = now
+                item.version += 1
+            UserData.objects.bulk_create(creates, batch_size=500)
+            UserData.objects.bulk_update(
+                updates,
+                ['name', 'encrypted_data', 'encrypted_blob', 'blob_size', 'updated_at', 'version'],
+                batch_size=500,
+            )
+            discard_blob_names(replaced_blobs)
+            if deletes:
+                item_ids = [item.item_id for item in deletes]
+                UserData.objects.filter(user=user, item_id__in=item_ids).delete()
+                self._record_deletions(user.id, item_ids, now)
+                discard_blobs(deletes)
+        return conflicts
+
+    def changes_since(self, user, token=None, limit=500):
+        """
+        Return ``(changed_items, deleted_ids, next_token, has_more)``.
+
+        Without a token this is a full snapshot. Changed items are paged in
+        (updated_at, item_id) order; deletions come from VaultTombstone and
+        are sent with the first page only.
+        """
+        since, started, position = decode_sync_token(token) if token else (None, None, {})
+        first_page = started is None
+        started = started or timezone.now()
+        queryset = UserData.objects.filter(user=user).order_by('updated_at', 'item_id')
+        if since is not None:
+            queryset = queryset.filter(updated_at__gt=since)
+        if 'u' in position:
+            try:
+                updated_at = datetime.fromisoformat(position['u'])
+                item_id = uuid.UUID(position['i'])
+            except (KeyError, TypeError, ValueError) as e:
+                raise InvalidCursor("Invalid sync token") from e
+            queryset = queryset.filter(
+                Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, item_id__gt=item_id)
+            )
+        deleted = []
+        if since is not None and first_page:
+            deleted = list(
+                VaultTombstone.objects.filter(user=user, deleted_at__gt=since)
+                .values_list('item_id', flat=True)
+            )
+        items = list(queryset[:limit + 1])
+        if len(items) > limit:
+            items = items[:limit]
+            last = items[-1]
+            next_token = next_sync_token(
+                since, started, u=format_timestamp(last.updated_at), i=str(last.item_id)
+            )
+            return items, deleted, next_token, True
+        return items, deleted, final_sync_token(started), False
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_dynamodb_client(region=None, endpoint_url=None, max_pool_connections=10):
+    """
+    Return this worker's pooled DynamoDB client.
+
+    boto3 clients are thread-safe and keep an HTTP connection pool, so one
+    client per process is shared by every request thread. Clients are keyed
+    by PID so a forked worker never reuses its parent's sockets.
+    """
+    key = (os.getpid(), region, endpoint_url, max_pool_connections)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                import boto3
+                from botocore.config import Config
+
+                client = boto3.client(
+                    'dynamodb',
+                    region_name=region,
+                    endpoint_url=endpoint_url,
+                    config=Config(
+                        max_pool_connections=max_pool_connections,
+                        retries={'mode': 'standard'},
+                    ),
+                )
+                _clients[key] = client
+    return client
+
+
+class ThreadedAsyncClient:
+    """Awaitable calls on a boto3 client, each run in a worker thread"""
+
+    def __init__(self, client):
+        self._client = client
+        self.exceptions = client.exceptions
+
+    def __getattr__(self, name):
+        return sync_to_async(getattr(self._client, name), thread_sensitive=False)
+
+
+_async_clients = {}
+
+
+async def get_async_dynamodb_client(region=None, endpoint_url=None, max_pool_connections=10):
+    """
+    Return an async DynamoDB client for the running event loop.
+
+    With aiobotocore installed this is a native aiohttp-based client, kept
+    open for the life of the worker's loop. Otherwise the pooled boto3
+    client's calls are run in threads outside the event loop.
+    """
+    try:
+        from aiobotocore.session import get_session
+    except ImportError:
+        return ThreadedAsyncClient(
+            get_dynamodb_client(region, endpoint_url, max_pool_connections)
+        )
+
+    key = (os.getpid(), id(asyncio.get_running_loop()), region, endpoint_url, max_pool_connections)
+    entry = _async_clients.get(key)
+    if entry is None:
+        from botocore.config import Config
+
+        context = get_session().create_client(
+            'dynamodb',
+            region_name=region,
+            endpoint_url=endpoint_url,
+            config=Config(
+                max_pool_connections=max_pool_connections,
+                retries={'mode': 'standard'},
+            ),
+        )
+        client = await context.__aenter__()
+        entry = _async_clients.setdefault(key, (context, client))
+        if entry[1] is not client:
+            await context.__aexit__(None, None, None)
+    return entry[1]
+
+
+class DynamoDBVaultStorage(AsyncVaultStorage):
+    """
+    Vault items stored in the ``UserVault`` table from utils/dynamodb_setup.py.
+
+    ``user_id`` is the hash key and ``item_id`` the range key, so listing a
+    vault is a single-partition Query and item access is a keyed
+    Get/Put/Update/DeleteItem. Items are returned as unsaved ``UserData``
+    instances so views work the same with either backend.
+
+    Pages are read newest first from the ``updated_at_index`` local secondary
+    index; set ``updated_at_index`` to None for tables created without it,
+    in which case pages follow item_id order.
+
+    The async methods send the same requests through
+    ``get_async_dynamodb_client``.
+    """
+
+    def __init__(self, table_name='UserVault', region=None, endpoint_url=None,
+                 max_pool_connections=10, updated_at_index='updated_at-index',
+                 **options):
+        self.table_name = table_name
+        self.updated_at_index = updated_at_index
+        self.region = region
+        self.endpoint_url = endpoint_url
+        self.max_pool_connections = max_pool_connections
+
+    @property
+    def client(self):
+        return get_dynamodb_client(
+            self.region, self.endpoint_url, self.max_pool_connections
+        )
+
+    async def aclient(self):
+        return await get_async_dynamodb_client(
+            self.region, self.endpoint_url, self.max_pool_connections
+        )
+
+    def _key(self, user_id, item_id):
+        return {
+            'user_id': {'S': str(user_id)},
+            'item_id': {'S': str(item_id)},
+        }
+
+    def _to_item(self, user, record):
+        item = UserData(
+            user=user,
+            item_id=uuid.UUID(record['item_id']['S']),
+            name=record.get('name', {}).get('S', ''),
+            encrypted_data=record.get('encrypted_data', {}).get('S', ''),
+            created_at=datetime.fromisoformat(record['created_at']['S']),
+            updated_at=datetime.fromisoformat(record['updated_at']['S']),
+            encrypted_blob=record.get('blob_name', {}).get('S', ''),
+            blob_size=int(record['blob_size']['N']) if 'blob_size' in record else None,
+            version=int(record['version']['N']) if 'version' in record else 1,
+        )
+        item._state.adding = False
+        return item
+
+    def _list_request(self, user, limit, cursor):
+        kwargs = {
+            'TableName': self.table_name,
+            'KeyConditionExpression': 'user_id = :user_id',
+            'ExpressionAttributeValues': {':user_id': {'S': str(user.id)}},
+            'ProjectionExpression': 'user_id, item_id, #name, created_at, updated_at',
+            'ExpressionAttributeNames': {'#name': 'name'},
+            'Limit': limit,
+        }
+        if self.updated_at_index:
+            kwargs['IndexName'] = self.updated_at_index
+            kwargs['ScanIndexForward'] = False
+        # Deleted items stay behind as tombstones for delta sync
+        kwargs['FilterExpression'] = 'attribute_not_exists(deleted)'
+        if cursor:
+            start_key = decode_cursor(cursor)
+            if start_key.get('user_id', {}).get('S') != str(user.id):
+                raise InvalidCursor("Invalid cursor")
+            kwargs['ExclusiveStartKey'] = start_key
+        return kwargs
+
+    def _list_next(self, request, response, records, limit):
+        """
+        Add ``response``'s items to ``records`` and return the next Query, or
+        None once the page is full or the vault is exhausted. Limit applies
+        before the tombstone filter, so one Query can come back short.
+        """
+        records.extend(response.get('Items', []))
+        if len(records) >= limit or 'LastEvaluatedKey' not in response:
+            return None
+        return {**request, 'ExclusiveStartKey': response['LastEvaluatedKey']}
+
+    def _list_result(self, user, records, response, limit):
+        next_cursor = None
+        if len(records) > limit:
+            # Resume after the last item kept, not where the Query stopped
+            records = records[:limit]
+            key_names = ('user_id', 'item_id') + (('updated_at',) if self.updated_at_index else ())
+            next_cursor = encode_cursor({name: records[-1][name] for name in key_names})
+        elif 'LastEvaluatedKey' in response:
+            next_cursor = encode_cursor(response['LastEvaluatedKey'])
+        return [self._to_item(user, record) for record in records], next_cursor
+
+    def list_page(self, user, limit, cursor=None):
+        """
+        Return ``(items, next_cursor)``; Queries that skip encrypted_data,
+        repeated until the page is full
+        """
+        request, records = self._list_request(user, limit, cursor), []
+        while request:
+            response = self.client.query(**request)
+            request = self._list_next(request, response, records, limit)
+        return self._list_result(user, records, response, limit)
+
+    async def alist_page(self, user, limit, cursor=None):
+        client = await self.aclient()
+        request, records = self._list_request(user, limit, cursor), []
+        while request:
+            response = await client.query(**request)
+            request = self._list_next(request, response, records, limit)
+        return self._list_result(user, records, response, limit)
+
+    def _get_request(self, user, item_id):
+        return {
+            'TableName': self.table_name,
+            'Key': self._key(user.id, item_id),
+            'ConsistentRead': True,
+        }
+
+    def _get_result(self, response):
+        if 'Item' not in response or 'deleted' in response['Item']:
+            raise UserData.DoesNotExist("Item not found")
+        return response['Item']
+
+    def get_item(self, user, item_id):
+        response = self.client.get_item(**self._get_request(user, item_id))
+        return self._to_item(user, self._get_result(response))
+
+    async def aget_item(self, user, item_id):
+        client = await self.aclient()
+        response = await client.get_item(**self._get_request(user, item_id))
+        return self._to_item(user, self._get_result(response))
+
+    def _version_request(self, user, item_id):
+        return {
+            **self._get_request(user, item_id),
+            'ProjectionExpression': '#version, deleted',
+            'ExpressionAttributeNames': {'#version': 'version'},
+        }
+
+    def get_version(self, user, item_id):
+        """Return the item's version; reads only the version attribute"""
+        response = self.client.get_item(**self._version_request(user, item_id))
+        return int(self._get_result(response).get('version', {}).get('N', 1))
+
+    async def aget_version(self, user, item_id):
+        client = await self.aclient()
+        response = await client.get_item(**self._version_request(user, item_id))
+        return int(self._get_result(response).get('version', {}).get('N', 1))
+
+    def get_items(self, user, item_ids, max_attempts=5):
+        """
+        Yield the user's items among ``item_ids`` via BatchGetItem.
+
+        Keys go out 100 per request (the BatchGetItem limit) and
+        UnprocessedKeys are retried with exponential backoff.
+        """
+        item_ids = list(item_ids)
+        for start in range(0, len(item_ids), 100):
+            request = {
+                self.table_name: {
+                    'Keys': [self._key(user.id, item_id) for item_id in item_ids[start:start + 100]],
+                    'ConsistentRead': True,
+                }
+            }
+            attempt = 0
+            while request:
+                response = self.client.batch_get_item(RequestItems=request)
+                for record in response.get('Responses', {}).get(self.table_name, []):
+                    if 'deleted' not in record:
+                        yield self._to_item(user, record)
+                request = response.get('UnprocessedKeys') or None
+                if request:
+                    attempt += 1
+                    if attempt >= max_attempts:
+                        raise RuntimeError("DynamoDB left keys unprocessed after retries")
+                    time.sleep(min(0.05 * 2 ** attempt, 1.0))
+
+    def _to_record(self, item):
+        record = self._key(item.user_id, item.item_id)
+        record.update({
+            'name': {'S': item.name},
+            'encrypted_data': {'S': item.encrypted_data},
+            'created_at': {'S': format_timestamp(item.created_at)},
+            'updated_at': {'S': format_timestamp(item.updated_at)},
+            'version': {'N': str(item.version)},
+        })
+        if item.encrypted_blob:
+            record['blob_name'] = {'S': item.encrypted_blob.name}
+            record['blob_size'] = {'N': str(item.blob_size or 0)}
+        return record
+
+    def _tombstone_record(self, user_id, item_id, now):
+        record = self._key(user_id, item_id)
+        record.update({
+            'deleted': {'BOOL': True},
+            'updated_at': {'S': format_timestamp(now)},
+            'expires_at': {'N': str(int((now + sync_settings()['retention']).timestamp()))},
+        })
+        return record
+
+    def _create_request(self, user, name, encrypted_data):
+        """Return ``(item, put_item kwargs)`` for a new item"""
+        now = timezone.now()
+        item = UserData(
+            user=user, name=name, encrypted_data=encrypted_data,
+            created_at=now, updated_at=now,
+        )
+        return item, {
+            'TableName': self.table_name,
+            'Item': self._to_record(item),
+            'ConditionExpression': 'attribute_not_exists(item_id)',
+        }
+
+    def create_item(self, user, name, encrypted_data):
+        item, kwargs = self._create_request(user, name, encrypted_data)
+        self.client.put_item(**kwargs)
+        item._state.adding = False
+        return item
+
+    async def acreate_item(self, user, name, encrypted_data):
+        item, kwargs = self._create_request(user, name, encrypted_data)
+        client = await self.aclient()
+        await client.put_item(**kwargs)
+        item._state.adding = False
+        return item
+
+    def _update_request(self, item, expected_versions):
+        """Return ``(update_item kwargs, replaced_blob)`` for ``item``"""
+        replaced_blob = detach_replaced_blob(item)
+        item.updated_at = timezone.now()
+        update = (
+            'SET #name = :name, encrypted_data = :data, updated_at = :updated_at, '
+            '#version = if_not_exists(#version, :one) + :one'
+        )
+        condition = 'attribute_exists(item_id) AND attribute_not_exists(deleted)'
+        values = {
+            ':name': {'S': item.name},
+            ':data': {'S': item.encrypted_data},
+            ':updated_at': {'S': format_timestamp(item.updated_at)},
+            ':one': {'N': '1'},
+        }
+        if expected_versions is not None:
+            expected = list(expected_versions)
+            if not expected:
+                raise VersionConflict("Item was modified")
+            placeholders = [f':expected{i}' for i in range(len(expected))]
+            values.update({p: {'N': str(v)} for p, v in zip(placeholders, expected)})
+            matches = f"#version IN ({', '.join(placeholders)})"
+            if 1 in expected:
+                # Items written before versioning have no attribute; they are at 1
+                matches = f'({matches} OR attribute_not_exists(#version))'
+            condition += f' AND {matches}'
+        if item.encrypted_blob:
+            update += ', blob_name = :blob_name, blob_size = :blob_size'
+            values[':blob_name'] = {'S': item.encrypted_blob.name}
+            values[':blob_size'] = {'N': str(item.blob_size or 0)}
+        else:
+            update += ' REMOVE blob_name, blob_size'
+        return {
+            'TableName': self.table_name,
+            'Key': self._key(item.user_id, item.item_id),
+            'UpdateExpression': update,
+            'ConditionExpression': condition,
+            'ExpressionAttributeNames': {'#name': 'name', '#version': 'version'},
+            'ExpressionAttributeValues': values,
+            'ReturnValues': 'UPDATED_NEW',
+        }, replaced_blob
+
+    def update_item(self, item, expected_versions=None):
+        """
+        Write the item and bump its version in one conditional UpdateItem.
+
+        With ``expected_versions`` the write only happens while the stored
+        version is still one of them; otherwise ``VersionConflict`` is raised.
+        Writing ``encrypted_data`` to a blob item drops its blob.
+        """
+        kwargs, replaced_blob = self._update_request(item, expected_versions)
+        try:
+            response = self.client.update_item(**kwargs)
+        except self.client.exceptions.ConditionalCheckFailedException:
+            if expected_versions is not None:
+                raise VersionConflict("Item was modified")
+            raise
+        item.version = int(response['Attributes']['version']['N'])
+        discard_blob_names([replaced_blob])
+        return item
+
+    async def aupdate_item(self, item, expected_versions=None):
+        kwargs, replaced_blob = self._update_request(item, expected_versions)
+        client = await self.aclient()
+        try:
+            response = await client.update_item(**kwargs)
+        except client.exceptions.ConditionalCheckFailedException:
+            if expected_versions is not None:
+                raise VersionConflict("Item was modified")
+            raise
+        item.version = int(response['Attributes']['version']['N'])
+        await sync_to_async(discard_blob_names)([replaced_blob])
+        return item
+
+    def delete_item(self, item):
+        # Soft delete: keep key and updated_at as a tombstone for delta sync.
+        # expires_at lets a DynamoDB TTL on that attribute reap it later.
+        now = timezone.now()
+        tombstone = self._tombstone_record(item.user_id, item.item_id, now)
+        self.client.update_item(
+            TableName=self.table_name,
+            Key=self._key(item.user_id, item.item_id),
+            UpdateExpression=(
+                'SET deleted = :deleted, updated_at = :updated_at, expires_at = :expires_at '
+                'REMOVE encrypted_data, #name, blob_name, blob_size'
+            ),
+            ConditionExpression='attribute_exists(item_id)',
+            ExpressionAttributeNames={'#name': 'name'},
+            ExpressionAttributeValues={
+                ':deleted': {'BOOL': True},
+                ':updated_at': tombstone['updated_at'],
+                ':expires_at': tombstone['expires_at'],
+            },
+        )
+        discard_blobs([item])
+
+    def changes_since(self, user, token=None, limit=500):
+        """
+        Return ``(changed_items, deleted_ids, next_token, has_more)``.
+
+        One Query on the updated_at index (``updated_at > since`` as a key
+        condition) per call, then a BatchGetItem for the changed items'
+        payloads; soft-deleted items are reported as deletions once they are
+        newer than the watermark (during a full sync, than its start).
+        """
+        since, started, position = decode_sync_token(token) if token else (None, None, {})
+        started = started or timezone.now()
+        # Tombstones are stored with fixed-width timestamps, so compare strings
+        cutoff = format_timestamp(since if since is not None else started)
+        kwargs = {
+            'TableName': self.table_name,
+            'KeyConditionExpression': 'user_id = :user_id',
+            'ExpressionAttributeValues': {':user_id': {'S': str(user.id)}},
+            'Limit': limit,
+        }
+        if since is not None:
+            kwargs['ExpressionAttributeValues'][':since'] = {'S': format_timestamp(since)}
+            if self.updated_at_index:
+                kwargs['KeyConditionExpression'] += ' AND updated_at > :since'
+            else:
+                kwargs['FilterExpression'] = 'updated_at > :since'
+        if self.updated_at_index:
+            kwargs['IndexName'] = self.updated_at_index
+        if position.get('k'):
+            start_key = position['k']
+            if not isinstance(start_key, dict) or \
+                    start_key.get('user_id', {}).get('S') != str(user.id):
+                raise InvalidCursor("Invalid sync token")
+            kwargs['ExclusiveStartKey'] = start_key
+
+        response = self.client.query(**kwargs)
+        items, deleted, changed_ids = [], [], []
+        for record in response.get('Items', []):
+            if 'deleted' in record:
+                if record['updated_at']['S'] > cutoff:
+                    deleted.append(uuid.UUID(record['item_id']['S']))
+            elif self.updated_at_index:
+                changed_ids.append(record['item_id']['S'])
+            else:
+                items.append(self._to_item(user, record))
+        if changed_ids:
+            # The index projects only the listing fields; read the full items
+            # (encrypted_data, blob, version) from the table. One deleted in
+            # between is reported as a deletion by the next sync.
+            items = list(self.get_items(user, changed_ids))
+
+        if 'LastEvaluatedKey' in response:
+            next_token = next_sync_token(since, started, k=response['LastEvaluatedKey'])
+            return items, deleted, next_token, True
+        return items, deleted, final_sync_token(started), False
+
+    def apply_batch(self, user, creates, updates, deletes, max_attempts=5):
+        """
+        Apply a batch of writes.
+
+        Creates and deletes go out with BatchWriteItem, deletes as tombstone
+        puts, 25 at a time (the BatchWriteItem limit), and UnprocessedItems
+        are retried with exponential backoff. BatchWriteItem can't carry
+        conditions, so each update is a conditional UpdateItem on the
+        version that was read: an item changed or deleted meanwhile is
+        returned as a conflict rather than overwritten or re-created. Unlike
+        the ORM backend this is not atomic: a failure part-way leaves
+        earlier writes applied.
+        """
+        now = timezone.now()
+        for item in creates:
+            item.created_at = item.updated_at = now
+            item._state.adding = False
+        requests = [
+            {'PutRequest': {'Item': self._to_record(item)}} for item in creates
+        ] + [
+            {'PutRequest': {'Item': self._tombstone_record(user.id, item.item_id, now)}}
+            for item in deletes
+        ]
+        for start in range(0, len(requests), 25):
+            request = {self.table_name: requests[start:start + 25]}
+            attempt = 0
+            while request:
+                response = self.client.batch_write_item(RequestItems=request)
+                request = response.get('UnprocessedItems') or None
+                if request:
+                    attempt += 1
+                    if attempt >= max_attempts:
+                        raise RuntimeError("DynamoDB left items unprocessed after retries")
+                    time.sleep(min(0.05 * 2 ** attempt, 1.0))
+        discard_blobs(deletes)
+
+        conflicts = []
+        for item in updates:
+            try:
+                self.update_item(item, expected_versions=[item.version])
+            except VersionConflict:
+                conflicts.append(item)
+        return conflicts
+
+
+_storage = None
+_storage_config = None
+_storage_lock = threading.Lock()
+
+
+def get_vault_storage():
+    """Return the vault storage backend configured by ``VAULT_STORAGE``"""
+    global _storage, _storage_config
+    config = getattr(settings, 'VAULT_STORAGE', {})
+    if _storage is None or _storage_config is not config:
+        with _storage_lock:
+            backend = import_string(
+                config.get('BACKEND', 'password_manager.utils.vault_storage.ORMVaultStorage')
+            )
+            options = {
+                name.lower(): value
+                for name, value in config.get('OPTIONS', {}).items()
+            }
+            _storage = backend(**options)
+            _storage_config = config
+    return _storage
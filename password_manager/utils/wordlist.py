@@ -0,0 +1,166 @@
+import json
+import os
+import secrets
+import threading
+from array import array
+
+from django.conf import settings
+
+
+# Used when the word list file is missing (e.g. a bare checkout)
+FALLBACK_WORDS = (
+    "apple", "banana", "orange", "grape", "melon", "car", "house",
+    "tree", "phone", "book", "computer", "table", "chair", "window",
+    "door", "mountain", "river", "ocean", "forest", "cloud", "sun",
+    "moon", "star", "planet", "galaxy", "music", "song", "dance",
+    "paint", "color", "light", "dark", "happy", "sad", "angry"
+)
+
+
+def _file_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except (OSError, TypeError):
+        return None
+
+
+def load_dirty_words(path):
+    """Return the set of lowercased words from a DirtyWords.json file"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            records = json.load(f).get('RECORDS', [])
+    except (OSError, TypeError, ValueError):
+        return frozenset()
+    return frozenset(
+        record['word'].strip().lower()
+        for record in records
+        if record.get('word')
+    )
+
+
+class WordList:
+    """
+    Memory-resident word list.
+
+    All words live in one contiguous bytes buffer; an array of offsets marks
+    where each word starts, so word ``i`` is ``buffer[offsets[i]:offsets[i + 1]]``.
+    This keeps ~47k words in a few hundred KiB and lets us draw words without
+    re-reading the file or building a list of str objects per request.
+    """
+
+    def __init__(self, path, dirty_words_path=None):
+        self.path = path
+        self.dirty_words_path = dirty_words_path
+        self._lock = threading.Lock()
+        # (buffer, offsets, mtimes) is swapped as a single tuple so readers
+        # never observe a half-reloaded index.
+        self._index = (b"", array("I", [0]), (None, None))
+        self.load()
+
+    def load(self):
+        """(Re)build the index from the word list and dirty words files"""
+        mtimes = (_file_mtime(self.path), _file_mtime(self.dirty_words_path))
+        dirty_words = load_dirty_words(self.dirty_words_path)
+
+        try:
+            with open(self.path, 'rb') as f:
+                raw_words = f.read().splitlines()
+        except (OSError, TypeError):
+            raw_words = [word.encode('utf-8') for word in FALLBACK_WORDS]
+
+        seen = set()
+        words = []
+        for raw_word in raw_words:
+            word = raw_word.strip()
+            if not word or word in seen:
+                continue
+            if word.decode('utf-8', 'replace').lower() in dirty_words:
+                continue
+            seen.add(word)
+            words.append(word)
+
+        offsets = array("I", [0])
+        position = 0
+        for word in words:
+            position += len(word)
+            offsets.append(position)
+
+        with self._lock:
+            self._index = (b"".join(words), offsets, mtimes)
+
+    def reload_if_changed(self):
+        """Reload the index if either source file changed on disk"""
+        mtimes = (_file_mtime(self.path), _file_mtime(self.dirty_words_path))
+        if mtimes != self._index[2]:
+            self.load()
+            return True
+        return False
+
+    def __len__(self):
+        return len(self._index[1]) - 1
+
+    def __getitem__(self, index):
+        buffer, offsets, _ = self._index
+        if not 0 <= index < len(offsets) - 1:
+            raise IndexError("word index out of range")
+        return buffer[offsets[index]:offsets[index + 1]].decode('utf-8')
+
+    def sample(self, num_words):
+        """
+        Draw ``num_words`` words using the ``secrets`` CSPRNG.
+
+        Words are unique unless the list is smaller than ``num_words``.
+        """
+        buffer, offsets, _ = self._index
+        size = len(offsets) - 1
+        if size == 0:
+            raise ValueError("Word list is empty")
+
+        if size < num_words:
+            picks = [secrets.randbelow(size) for _ in range(num_words)]
+        else:
+            picks = []
+            chosen = set()
+            while len(picks) < num_words:
+                index = secrets.randbelow(size)
+                if index not in chosen:
+                    chosen.add(index)
+                    picks.append(index)
+
+        return [
+            buffer[offsets[i]:offsets[i + 1]].decode('utf-8') for i in picks
+        ]
+
+
+_word_list = None
+_word_list_lock = threading.Lock()
+
+
+def load_word_list():
+    """Build the per-process word list from settings and cache it"""
+    global _word_list
+    word_list = WordList(
+        getattr(settings, 'WORD_LIST_PATH',
+                os.path.join(settings.BASE_DIR, 'cli', 'my_list1.txt')),
+        getattr(settings, 'DIRTY_WORDS_PATH',
+                os.path.join(settings.BASE_DIR, 'cli', 'DirtyWords.json')),
+    )
+    with _word_list_lock:
+        _word_list = word_list
+    return word_list
+
+
+def get_word_list():
+    """
+    Return the per-process word list, loading it on first use.
+
+    Normally the list is already loaded by ``PasswordManagerConfig.ready``.
+    With ``WORD_LIST_RELOAD_ON_CHANGE`` enabled the source files are stat'ed
+    on each call and the index is rebuilt when they change.
+    """
+    word_list = _word_list
+    if word_list is None:
+        return load_word_list()
+    if getattr(settings, 'WORD_LIST_RELOAD_ON_CHANGE', False):
+        word_list.reload_if_changed()
+    return word_list
@@ -4,19 +4,43 @@ import base64
 import hashlib
 import uuid
 from django.shortcuts import render
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth import login, authenticate
 from django.views.decorators.http import require_http_methods
 from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.urls import reverse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+from asgiref.sync import sync_to_async
 
 from .forms import CustomUserCreationForm
-from .models import CustomUser
+from .models import CustomUser, UserData
+from .utils.blob_storage import (
+    BlobTooLarge, UnsatisfiableRange, blob_storage, iter_range, parse_range, spool_upload
+)
+from .utils.device_cache import get_totp_device, verify_totp_token
+from .utils.encoding import (
+    load_body, negotiate_compression, representation, vary_headers, vault_response
+)
+from .utils.hashing import HashingOverloaded, get_hashing_service
+from .utils.instrumentation import span
+from .utils.metrics import render_prometheus
+from .utils.principal import vault_login_required
+from .utils.qr import QR_FORMATS, QRRenderQueueFull, get_render_pool
+from .utils.throttling import Throttled, client_ip, get_throttle
+from .utils.tokens import (
+    ACCESS, LOGIN, InvalidToken, bearer_token, deny_token, issue_token, revoke_user_tokens,
+    token_settings, tokens_enabled, verify_token
+)
+from .utils.vault_storage import (
+    InvalidCursor, SyncTokenExpired, VersionConflict, get_vault_storage, sync_settings
+)
+from .utils.wordlist import get_word_list
 from django_otp.plugins.otp_totp.models import TOTPDevice
 from django_otp.util import random_hex
-from django_otp import devices_for_user
-import qrcode
-from io import BytesIO
 import base64
 from datetime import datetime
 
@@ -24,20 +48,13 @@ from datetime import datetime
 import hmac
 import hashlib
 
-# For secure random word generation
-import random
-import os
-
 
 def get_or_create_totp_device(user, confirmed=False):
     """Get or create a TOTP device for a user"""
-    # Get devices for user using django-otp function
-    devices = devices_for_user(user, confirmed=None)
-    
-    # Check if a TOTP device already exists
-    for device in devices:
-        if isinstance(device, TOTPDevice):
-            return device
+    # Check the per-user device cache (one indexed query on a miss)
+    device = get_totp_device(user.pk)
+    if device is not None:
+        return device
 
     # Create a new device with a random key
     device = TOTPDevice(user=user, name="default")
@@ -47,17 +64,27 @@ def get_or_create_totp_device(user, confirmed=False):
     return device
 
 
-def generate_qr_code(device, username):
-    """Generate a QR code for TOTP setup"""
-    # Generate the URI for the device
-    config_url = device.config_url
+def hashing_overloaded_response(exc):
+    """503 telling the client when to retry a shed hashing request"""
+    response = JsonResponse({'success': False, 'error': 'Server busy, please retry'}, status=503)
+    response['Retry-After'] = str(exc.retry_after)
+    return response
+
+
+def precondition_failed(item):
+    """412 for a conditional write against an item that has since changed"""
+    return JsonResponse({
+        'success': False,
+        'error': 'Item was modified',
+        'id': str(item.item_id),
+    }, status=412)
 
-    # Generate QR code
-    img = qrcode.make(config_url)
-    buffered = BytesIO()
-    img.save(buffered, format="PNG")
-    img_str = base64.b64encode(buffered.getvalue()).decode()
-    return f"data:image/png;base64,{img_str}"
+
+def throttled_response(exc):
+    """429 telling the client when the throttle window frees up"""
+    response = JsonResponse({'success': False, 'error': 'Too many attempts, please retry later'}, status=429)
+    response['Retry-After'] = str(exc.retry_after)
+    return response
 
 
 @csrf_exempt
@@ -74,7 +101,8 @@ def initial_registration(request):
             user_uuid = str(uuid.uuid4())
 
             # Generate 10 random words
-            words = generate_random_words(10)
+            with span('words'):
+                words = generate_random_words(10)
             auth_words = words[:5]
             hmac_words = words[5:]
 
@@ -86,12 +114,14 @@ def initial_registration(request):
             # Using digest() to get binary data for BinaryField
             unique_hash = hashlib.sha512(str(uuid.uuid4()).encode()).digest()
             user.sha512hash = unique_hash
+            user.registration_pending = True
 
             # Add any other required fields for your CustomUser model
             user.save()
 
             # Create TOTP device for this user
-            totp_device = get_or_create_totp_device(user)
+            with span('totp'):
+                totp_device = get_or_create_totp_device(user)
             
             if not totp_device or not hasattr(totp_device, 'id') or not hasattr(totp_device, 'key'):
                 raise ValueError("Failed to create valid TOTP device")
@@ -106,14 +136,17 @@ def initial_registration(request):
                 'timestamp': datetime.now().timestamp()
             }
 
-            # Generate QR code for TOTP
-            qr_code = generate_qr_code(totp_device, user_uuid)
+            # The QR code is rendered off the request path; the page only
+            # links to it so it can be returned before the image is ready
+            qr_code = reverse("password_manager:registration_qr")
 
             # Create response data
             response_data = {
                 'uuid': user_uuid,
                 'words': words,
                 'totp_device': totp_device.key,
+                # Base32, as authenticator apps expect for manual entry
+                'totp_secret': base64.b32encode(totp_device.bin_key).decode('utf-8'),
                 'qr_code': qr_code
             }
 
@@ -126,11 +159,54 @@ def initial_registration(request):
         return HttpResponse("Method not allowed", status=405)
 
 
+async def registration_qr(request):
+    """
+    Serve the TOTP QR code for the registration in progress.
+
+    Rendering runs on the bounded QR pool so it never blocks the event loop
+    (or, under WSGI, holds the request thread any longer than the render).
+    ``?format=`` selects png, svg or matrix; the default is QR_CODE_FORMAT.
+    """
+    # Django's view decorators are sync-only before 4.2, so check by hand
+    if request.method != "GET":
+        return HttpResponse("Method not allowed", status=405)
+
+    output_format = request.GET.get('format', getattr(settings, 'QR_CODE_FORMAT', 'png'))
+    if output_format not in QR_FORMATS:
+        return HttpResponse("Unsupported QR format", status=400)
+
+    registration_data = await sync_to_async(request.session.get)('registration_data')
+    if not registration_data or not registration_data.get('totp_device_id'):
+        return HttpResponse("Registration session expired", status=400)
+
+    try:
+        totp_device = await TOTPDevice.objects.select_related('user').aget(
+            id=registration_data['totp_device_id']
+        )
+    except TOTPDevice.DoesNotExist:
+        return HttpResponse("TOTP device not found", status=404)
+
+    try:
+        image = await get_render_pool().render(totp_device.config_url, output_format)
+    except QRRenderQueueFull:
+        response = HttpResponse("QR renderer busy, please retry", status=503)
+        response['Retry-After'] = '1'
+        return response
+
+    response = HttpResponse(image, content_type=QR_FORMATS[output_format])
+    # The image encodes the TOTP secret
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def verify_totp(request):
     """Verify the TOTP code entered by user"""
     try:
+        # Per-IP limit before the session is even read
+        get_throttle().check('verify_totp', ip=client_ip(request))
+
         data = json.loads(request.body)
         totp_code = data.get('totp_code')
         
@@ -145,13 +221,17 @@ def verify_totp(request):
         totp_device_id = registration_data.get('totp_device_id')
         if not totp_device_id:
             return JsonResponse({'success': False, 'error': 'TOTP device ID not found in session'}, status=400)
+
+        get_throttle().check('verify_totp', user=registration_data.get('uuid'))
             
-        # Get the actual device from the database using the ID
+        # Get the device through the per-user cache
         try:
-            totp_device = TOTPDevice.objects.get(id=totp_device_id)
-            
+            totp_device = get_totp_device(registration_data.get('uuid'))
+            if totp_device is None or totp_device.id != totp_device_id:
+                raise TOTPDevice.DoesNotExist
+
             # Verify the TOTP code
-            if totp_device.verify(totp_code):
+            if verify_totp_token(totp_device, totp_code):
                 # Mark TOTP as verified in session
                 registration_data['totp_verified'] = True
                 request.session['registration_data'] = registration_data
@@ -160,6 +240,8 @@ def verify_totp(request):
                 return JsonResponse({'success': False, 'error': 'Invalid TOTP code. Please make sure your authenticator app is in sync.'}, status=400)
         except TOTPDevice.DoesNotExist:
             return JsonResponse({'success': False, 'error': 'TOTP device not found. Please restart registration.'}, status=400)
+    except Throttled as e:
+        return throttled_response(e)
     except json.JSONDecodeError:
         return JsonResponse({'success': False, 'error': 'Invalid JSON data'}, status=400)
     except Exception as e:
@@ -205,19 +287,25 @@ def complete_registration(request):
         hmac_words = registration_data.get('hmac_words')
         
         # Get TOTP device from database using ID
+        # Past the TTL the placeholder may already have been purged
+        ttl = getattr(settings, 'PENDING_REGISTRATION_TTL', 3600)
+        if datetime.now().timestamp() - registration_data.get('timestamp', 0) > ttl:
+            del request.session['registration_data']
+            return JsonResponse({'success': False, 'error': 'Registration session expired'}, status=400)
+
         totp_device_id = registration_data.get('totp_device_id')
-        try:
-            totp_device = TOTPDevice.objects.get(id=totp_device_id)
-        except TOTPDevice.DoesNotExist:
+        totp_device = get_totp_device(user_uuid)
+        if totp_device is None or totp_device.id != totp_device_id:
             return JsonResponse({'success': False, 'error': 'TOTP device not found'}, status=400)
 
         # Verify HMAC of wrapped key
-        client_hmac_key = " ".join(hmac_words).encode('utf-8')
-        computed_hmac = hmac.new(
-            client_hmac_key, 
-            base64.b64decode(wrapped_key), 
-            hashlib.sha256
-        ).digest()
+        with span('hmac'):
+            client_hmac_key = " ".join(hmac_words).encode('utf-8')
+            computed_hmac = hmac.new(
+                client_hmac_key,
+                base64.b64decode(wrapped_key),
+                hashlib.sha256
+            ).digest()
 
         # Convert received HMAC from base64
         received_hmac = base64.b64decode(hmac_wrapped_key)
@@ -226,9 +314,11 @@ def complete_registration(request):
         if not hmac.compare_digest(computed_hmac, received_hmac):
             return JsonResponse({'success': False, 'error': 'HMAC verification failed'}, status=400)
 
-        # Create user object
-        user = CustomUser()
-        user.id = uuid.UUID(user_uuid)
+        # Fill in the placeholder user created by initial_registration
+        user = CustomUser.objects.filter(id=user_uuid, registration_pending=True).first()
+        if user is None:
+            return JsonResponse({'success': False, 'error': 'Registration session expired'}, status=400)
+        user.registration_pending = False
         user.sha512hash = base64.b64decode(username_hash)
         user.wrapped_key = base64.b64decode(wrapped_key)
         user.hmac_wrapped_key = received_hmac
@@ -245,8 +335,9 @@ def complete_registration(request):
         if email:
             user.email = email
 
-        # Set password directly as the auth_hash is already processed client-side
-        user.password = auth_hash
+        # The client sends an Argon2id auth_hash; hash it again server-side
+        # on the hashing pool so a leaked database can't be replayed
+        get_hashing_service().set_password(user, auth_hash)
 
         # Save user
         user.save()
@@ -256,6 +347,8 @@ def complete_registration(request):
 
         return JsonResponse({'success': True, 'uuid': str(user.id)})
 
+    except HashingOverloaded as e:
+        return hashing_overloaded_response(e)
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
@@ -281,6 +374,24 @@ def register(request):
             return render(request, "password_manager/register.html", {"form": form})
 
 
+def login_identifiers(user_uuid, username_hash):
+    """
+    Return ``(user_id, username)``: the UUID, or else the decoded username
+    hash, login_step1 was given, None where missing or malformed. The
+    throttle keys on these rather than the raw strings, since uuid.UUID and
+    b64decode accept many spellings of one value (case, braces, urn:uuid:,
+    stray characters) that would each get a fresh counter.
+    """
+    try:
+        if user_uuid:
+            return uuid.UUID(user_uuid), None
+        if username_hash:
+            return None, base64.b64decode(username_hash)
+    except (AttributeError, TypeError, ValueError):
+        pass
+    return None, None
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def login_step1(request):
@@ -297,22 +408,97 @@ def login_step1(request):
         auth_hash = data.get('auth_hash')
         user_uuid = data.get('uuid')
 
+        user_id, username = login_identifiers(user_uuid, username_hash)
+
+        # Reject over-limit attempts before any user lookup or hashing
+        get_throttle().check(
+            'login_step1', ip=client_ip(request), user=user_id, username=username
+        )
+
         # Find user by UUID or username hash
         try:
-            if user_uuid:
-                user = CustomUser.objects.get(id=uuid.UUID(user_uuid))
+            if user_id is not None:
+                user = CustomUser.objects.get(id=user_id)
+            elif username is not None:
+                user = CustomUser.objects.get(sha512hash=username)
+            else:
+                raise CustomUser.DoesNotExist
+        except CustomUser.DoesNotExist:
+            # Verify against a dummy hash on the same executor so unknown
+            # users take as long as a wrong password for a real one
+            get_hashing_service().check_dummy(auth_hash)
+            return JsonResponse({'success': False, 'error': 'Invalid credentials'}, status=401)
+
+        # Compare password hash (auth_hash) on the hashing pool
+        if not get_hashing_service().check_password(user, auth_hash):
+            return JsonResponse({'success': False, 'error': 'Invalid credentials'}, status=401)
+
+        return start_login(request, user)
+
+    except Throttled as e:
+        return throttled_response(e)
+    except HashingOverloaded as e:
+        return hashing_overloaded_response(e)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+async def login_step1_async(request):
+    """
+    ``login_step1`` for ASGI workers: the user lookup and password check
+    are awaited, so the worker's event loop keeps serving while they run.
+    """
+    # Django's view decorators are sync-only before 4.2, so check by hand
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+    try:
+        data = json.loads(request.body)
+        username_hash = data.get('username_hash')
+        auth_hash = data.get('auth_hash')
+        user_uuid = data.get('uuid')
+
+        user_id, username = login_identifiers(user_uuid, username_hash)
+
+        # The throttle's cache may be remote
+        await sync_to_async(get_throttle().check, thread_sensitive=False)(
+            'login_step1', ip=client_ip(request), user=user_id, username=username
+        )
+
+        try:
+            if user_id is not None:
+                user = await CustomUser.objects.aget(id=user_id)
+            elif username is not None:
+                user = await CustomUser.objects.aget(sha512hash=username)
             else:
-                user = CustomUser.objects.get(sha512hash=base64.b64decode(username_hash))
+                raise CustomUser.DoesNotExist
         except CustomUser.DoesNotExist:
-            # Use a constant time response to prevent timing attacks
-            # that could reveal whether a username exists
-            secrets.compare_digest('a', 'b')  # Dummy operation for timing
+            await get_hashing_service().acheck_dummy(auth_hash)
+            return JsonResponse({'success': False, 'error': 'Invalid credentials'}, status=401)
+
+        if not await get_hashing_service().acheck_password(user, auth_hash):
             return JsonResponse({'success': False, 'error': 'Invalid credentials'}, status=401)
 
-        # Compare password hash (auth_hash)
-        # In a real implementation, this would use Django's check_password
-        # But since we're using a custom auth scheme, we need to do this manually
+        if tokens_enabled():
+            return start_login(request, user)
+        return await sync_to_async(start_login)(request, user)
+
+    except Throttled as e:
+        return throttled_response(e)
+    except HashingOverloaded as e:
+        return hashing_overloaded_response(e)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+login_step1_async.csrf_exempt = True
 
+
+def start_login(request, user):
+    """Answer a verified step 1 with the token step 2 must present"""
+    if tokens_enabled():
+        # Stateless mode: a signed token carries the user id and step
+        login_token = issue_token(user.id, LOGIN)
+    else:
         # Create a session token for step 2
         login_token = secrets.token_hex(32)
         request.session['login_data'] = {
@@ -321,14 +507,11 @@ def login_step1(request):
             'timestamp': datetime.now().timestamp()
         }
 
-        return JsonResponse({
-            'success': True, 
-            'login_token': login_token,
-            'totp_required': True  # Always require TOTP for this implementation
-        })
-
-    except Exception as e:
-        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+    return JsonResponse({
+        'success': True, 
+        'login_token': login_token,
+        'totp_required': True  # Always require TOTP for this implementation
+    })
 
 
 @csrf_exempt
@@ -340,255 +523,1020 @@ def login_step2(request):
     - Login token from step 1
     """
     try:
+        # Per-IP limit before the session or token is looked at
+        get_throttle().check('login_step2', ip=client_ip(request))
+
         data = json.loads(request.body)
         totp_code = data.get('totp_code')
         login_token = data.get('login_token')
 
-        # Get login data from session
-        login_data = request.session.get('login_data')
-        if not login_data or login_data.get('login_token') != login_token:
-            return JsonResponse({'success': False, 'error': 'Invalid login session'}, status=401)
+        claims, user_id, error = login_claims(request, login_token)
+        if error:
+            return error
 
-        # Check if login attempt has expired (15 minute window)
-        timestamp = login_data.get('timestamp', 0)
-        if datetime.now().timestamp() - timestamp > 900:  # 15 minutes
-            del request.session['login_data']
-            return JsonResponse({'success': False, 'error': 'Login session expired'}, status=401)
+        # Per-user limit before the user, device or TOTP check
+        get_throttle().check('login_step2', user=user_id)
 
         # Find the user
         try:
-            user = CustomUser.objects.get(id=uuid.UUID(login_data.get('user_id')))
+            user = CustomUser.objects.get(id=uuid.UUID(user_id))
         except CustomUser.DoesNotExist:
             return JsonResponse({'success': False, 'error': 'User not found'}, status=401)
 
         # Verify TOTP - Needs update for django-otp
         try:
-            device = get_or_create_totp_device(user)
-            if not device.verify(totp_code):
+            if not verify_totp_code(user, totp_code):
                 return JsonResponse({'success': False, 'error': 'Invalid TOTP code'}, status=401)
         except Exception as e:
             return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
+        return finish_login(user, claims)
 
-        # TOTP verified, complete login
-        # Return the wrapped key and other necessary data
+    except Throttled as e:
+        return throttled_response(e)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
-        return JsonResponse({
-            'success': True,
-            'wrapped_key': base64.b64encode(user.wrapped_key).decode('utf-8'),
-            'hmac_wrapped_key': base64.b64encode(user.hmac_wrapped_key).decode('utf-8'),
-            'algorithm': user.alg_unwrap_key
-        })
 
+async def login_step2_async(request):
+    """``login_step2`` for ASGI workers"""
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+    try:
+        check = sync_to_async(get_throttle().check, thread_sensitive=False)
+        await check('login_step2', ip=client_ip(request))
+
+        data = json.loads(request.body)
+        totp_code = data.get('totp_code')
+        login_token = data.get('login_token')
+
+        # Session reads and writes go through the request's sync thread
+        claims, user_id, error = await sync_to_async(
+            login_claims, thread_sensitive=not tokens_enabled()
+        )(request, login_token)
+        if error:
+            return error
+
+        await check('login_step2', user=user_id)
+
+        try:
+            user = await CustomUser.objects.aget(id=uuid.UUID(user_id))
+        except CustomUser.DoesNotExist:
+            return JsonResponse({'success': False, 'error': 'User not found'}, status=401)
+
+        try:
+            # Verification saves the device's last used step
+            verified = await sync_to_async(verify_totp_code)(user, totp_code)
+        except Exception as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=500)
+        if not verified:
+            return JsonResponse({'success': False, 'error': 'Invalid TOTP code'}, status=401)
+
+        if claims is None:
+            return finish_login(user, claims)
+        # Denying the login token writes to the cache
+        return await sync_to_async(finish_login, thread_sensitive=False)(user, claims)
+
+    except Throttled as e:
+        return throttled_response(e)
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
 
+login_step2_async.csrf_exempt = True
+
+
+def verify_totp_code(user, totp_code):
+    return verify_totp_token(get_or_create_totp_device(user), totp_code)
+
+
+def login_claims(request, login_token):
+    """
+    Resolve the step 1 login token to ``(claims, user_id, error_response)``.
+    ``claims`` is only set in stateless token mode.
+    """
+    if tokens_enabled():
+        # Stateless mode: the signed token replaces the session lookup
+        try:
+            claims = verify_token(login_token or '', LOGIN)
+        except InvalidToken:
+            return None, None, JsonResponse({'success': False, 'error': 'Invalid login session'}, status=401)
+        return claims, claims['sub'], None
+
+    # Get login data from session
+    login_data = request.session.get('login_data')
+    if not login_data or login_data.get('login_token') != login_token:
+        return None, None, JsonResponse({'success': False, 'error': 'Invalid login session'}, status=401)
+
+    # Check if login attempt has expired (15 minute window)
+    timestamp = login_data.get('timestamp', 0)
+    if datetime.now().timestamp() - timestamp > 900:  # 15 minutes
+        del request.session['login_data']
+        return None, None, JsonResponse({'success': False, 'error': 'Login session expired'}, status=401)
+    return None, login_data.get('user_id'), None
+
+
+def finish_login(user, claims):
+    """TOTP verified, complete login"""
+    # Return the wrapped key and other necessary data
+    response_data = {
+        'success': True,
+        'wrapped_key': base64.b64encode(user.wrapped_key).decode('utf-8'),
+        'hmac_wrapped_key': base64.b64encode(user.hmac_wrapped_key).decode('utf-8'),
+        'algorithm': user.alg_unwrap_key
+    }
+    if claims is not None:
+        # The login token is single use; vault calls use the access token
+        deny_token(claims)
+        response_data.update({
+            'access_token': issue_token(user.id, ACCESS),
+            'token_type': 'Bearer',
+            'expires_in': token_settings()['access_ttl'],
+        })
+
+    return JsonResponse(response_data)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def logout(request):
+    """
+    End the login: revoke the bearer token if one is sent, else drop the session.
+    With {"everywhere": true} every token issued to the user so far is revoked.
+    """
+    token = bearer_token(request)
+    if token:
+        try:
+            claims = verify_token(token, ACCESS)
+        except InvalidToken:
+            return JsonResponse({'success': False, 'error': 'Invalid token'}, status=401)
+        try:
+            everywhere = request.content_type == 'application/json' and \
+                json.loads(request.body).get('everywhere') is True
+        except (json.JSONDecodeError, AttributeError):
+            return JsonResponse({'success': False, 'error': 'Invalid JSON data'}, status=400)
+        if everywhere:
+            revoke_user_tokens(claims['sub'])
+        else:
+            deny_token(claims)
+    else:
+        request.session.flush()
+    return JsonResponse({'success': True})
+
+
+@require_http_methods(["GET"])
+def metrics(request):
+    """
+    Expose this worker's metrics in the Prometheus text format
+
+    Off unless METRICS_ENABLED, and then only served to METRICS_ALLOWED_IPS
+    (the connecting address, not a forwarded one) or with
+    "Authorization: Bearer <METRICS_TOKEN>".
+    """
+    if not getattr(settings, 'METRICS_ENABLED', False):
+        return HttpResponse(status=404)
+    allowed_ips = getattr(settings, 'METRICS_ALLOWED_IPS', ('127.0.0.1', '::1'))
+    metrics_token = getattr(settings, 'METRICS_TOKEN', None)
+    token = bearer_token(request)
+    if request.META.get('REMOTE_ADDR') not in allowed_ips and not (
+        metrics_token and token and hmac.compare_digest(token.encode(), metrics_token.encode())
+    ):
+        return HttpResponse(status=403)
+    return HttpResponse(
+        render_prometheus(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
+
+
+@require_http_methods(["GET", "HEAD"])
+def readiness(request):
+    """
+    Readiness probe: 200 once this worker can serve requests, else 503.
+
+    One round trip each to the default database and cache, and the word
+    list loaded. Only ok/unavailable per check is reported.
+    """
+    checks = {}
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        checks['database'] = 'ok'
+    except Exception:
+        checks['database'] = 'unavailable'
+    try:
+        caches['default'].get('readiness-probe')
+        checks['cache'] = 'ok'
+    except Exception:
+        checks['cache'] = 'unavailable'
+    try:
+        get_word_list()
+        checks['word_list'] = 'ok'
+    except Exception:
+        checks['word_list'] = 'unavailable'
+
+    ready = all(status == 'ok' for status in checks.values())
+    response = JsonResponse({'ready': ready, 'checks': checks}, status=200 if ready else 503)
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
 # Add views for data manipulation here
 @csrf_exempt
 @require_http_methods(["GET"])
+@vault_login_required
 def user_data_list(request):
-    """View to list all vault items for the authenticated user"""
-    # Check for user authentication via session
-    user_id = request.session.get('login_data', {}).get('user_id')
-    if not user_id:
-        return JsonResponse({'success': False, 'error': 'Not authenticated'}, status=401)
+    """
+    View to list vault items for the authenticated user, one page at a time
+
+    Query parameters:
+    - limit: page size (default VAULT_PAGE_SIZE, at most VAULT_MAX_PAGE_SIZE)
+    - cursor: the next_cursor returned with the previous page
+    """
+    limit = page_limit(request)
+    if limit is None:
+        return JsonResponse({'success': False, 'error': 'Invalid limit'}, status=400)
+
+    try:
+        user = request.vault_user
+        # Get one page of vault items for this user
+        items, next_cursor = get_vault_storage().list_page(
+            user, limit, request.GET.get('cursor')
+        )
+        return listing_response(request, items, next_cursor)
+
+    except InvalidCursor:
+        return JsonResponse({'success': False, 'error': 'Invalid cursor'}, status=400)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+@vault_login_required
+async def user_data_list_async(request):
+    """``user_data_list`` for ASGI workers"""
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    limit = page_limit(request)
+    if limit is None:
+        return JsonResponse({'success': False, 'error': 'Invalid limit'}, status=400)
 
     try:
-        user = CustomUser.objects.get(id=uuid.UUID(user_id))
-        # Get all vault items for this user
-        items = UserData.objects.filter(user=user)
+        items, next_cursor = await get_vault_storage().alist_page(
+            request.vault_user, limit, request.GET.get('cursor')
+        )
+        return listing_response(request, items, next_cursor)
+
+    except InvalidCursor:
+        return JsonResponse({'success': False, 'error': 'Invalid cursor'}, status=400)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+user_data_list_async.csrf_exempt = True
+
 
-        # Return metadata only (not the encrypted content)
+def page_limit(request):
+    """The requested page size, capped at VAULT_MAX_PAGE_SIZE; None if invalid"""
+    max_page_size = getattr(settings, 'VAULT_MAX_PAGE_SIZE', 200)
+    try:
+        limit = int(request.GET.get('limit', getattr(settings, 'VAULT_PAGE_SIZE', 50)))
+    except ValueError:
+        return None
+    if limit < 1:
+        return None
+    return min(limit, max_page_size)
+
+
+def listing_response(request, items, next_cursor):
+    # The page's ETag covers what the client would render from it
+    vary = vary_headers(compress=True)
+    etag = listing_etag(items, next_cursor, representation(request, compress=True))
+    if 'Accept-Encoding' in vary and negotiate_compression(request):
+        # As GZipMiddleware does: compressed bytes depend on the compressor,
+        # so the validator is weak, on the 304 as on the 200 (whether or not
+        # this body was big enough to be compressed)
+        etag = 'W/' + etag
+    if etag_matches(request.headers.get('If-None-Match'), etag, weak=True):
+        return not_modified(etag, vary)
+
+    # Return metadata only (not the encrypted content)
+    with span('serialize'):
         items_data = [{
             'id': str(item.item_id),
             'name': item.name,
             'created_at': item.created_at.isoformat(),
             'updated_at': item.updated_at.isoformat()
         } for item in items]
+        response = vault_response(
+            request,
+            {'success': True, 'items': items_data, 'next_cursor': next_cursor},
+            compress=True,
+        )
+    return with_etag(response, etag)
 
-        return JsonResponse({'success': True, 'items': items_data})
+def item_etag(item_id, version, variant=''):
+    """
+    Strong ETag of one version of a vault item, in the representation named
+    by ``variant`` (see encoding.representation; '' for JSON)
+    """
+    etag = f"{uuid.UUID(str(item_id)).hex}-{version}"
+    return quote_etag(f"{etag}.{variant}" if variant else etag)
+
+
+def listing_etag(items, next_cursor, variant=''):
+    """
+    ETag of a listing page: its items' ids and update times, the cursor and
+    the representation
+    """
+    digest = hashlib.sha256()
+    for item in items:
+        digest.update(f"{item.item_id}:{item.updated_at.isoformat()}\n".encode())
+    digest.update((next_cursor or '').encode())
+    digest.update(variant.encode())
+    return quote_etag(digest.hexdigest()[:32])
+
+
+def etag_matches(header, etag, weak=False):
+    """
+    Whether an If-None-Match (``weak``) or If-Match header lists ``etag``.
+    A missing header matches nothing, "*" everything.
+    """
+    if not header:
+        return False
+    etags = parse_etags(header)
+    if etags == ['*']:
+        return True
+    if weak:
+        return etag.removeprefix('W/') in {tag.removeprefix('W/') for tag in etags}
+    return etag in etags
+
+
+def if_match_versions(header, item_id):
+    """
+    The versions of ``item_id`` an If-Match header accepts: None for "*",
+    otherwise a (possibly empty) list. Weak tags never match.
+    """
+    etags = parse_etags(header)
+    if etags == ['*']:
+        return None
+    prefix = f'"{uuid.UUID(str(item_id)).hex}-'
+    versions = [tag[len(prefix):-1].split('.', 1)[0] for tag in etags if tag.startswith(prefix)]
+    return [int(version) for version in versions if version.isdigit()]
+
+
+def with_etag(response, etag):
+    response['ETag'] = etag
+    # Ciphertext only, but per user: let the client revalidate, not proxies
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def not_modified(etag, vary):
+    # Same Vary as the 200 it stands for, so caches keep representations apart
+    response = HttpResponse(status=304)
+    patch_vary_headers(response, vary)
+    return with_etag(response, etag)
+
+
+def vault_item_data(item):
+    """Serialize a vault item including its encrypted payload"""
+    data = {
+        'id': str(item.item_id),
+        'name': item.name,
+        'encrypted_data': item.encrypted_data,
+        'created_at': item.created_at.isoformat(),
+        'updated_at': item.updated_at.isoformat(),
+        'version': item.version,
+    }
+    if item.encrypted_blob:
+        # Binary items are fetched separately from their blob URL
+        data['blob'] = {
+            'size': item.blob_size,
+            'url': reverse("password_manager:user_data_blob", args=[item.item_id]),
+        }
+    return data
+
+
+def receive_blob(request, user):
+    """
+    Stream a raw application/octet-stream body into a temporary file.
+
+    The X-HMAC header, when sent, is checked against an HMAC computed
+    chunk by chunk as the body arrives. Returns ``(file, size, None)`` or
+    ``(None, None, error_response)``.
+    """
+    max_size = getattr(settings, 'VAULT_BLOB_MAX_SIZE', 100 * 1024 * 1024)
+    try:
+        if int(request.headers.get('Content-Length') or 0) > max_size:
+            raise BlobTooLarge()
+    except ValueError:
+        return None, None, JsonResponse({'success': False, 'error': 'Invalid Content-Length'}, status=400)
+    except BlobTooLarge:
+        return None, None, JsonResponse({
+            'success': False, 'error': f'Blobs are limited to {max_size} bytes'
+        }, status=413)
+
+    hmac_signature = request.headers.get('X-HMAC')
+    if hmac_signature and not user.hmac_words_hash:
+        return None, None, JsonResponse({
+            'success': False,
+            'error': 'HMAC key not configured for user'
+        }, status=400)
+
+    try:
+        upload, size, digest = spool_upload(
+            request, user.hmac_words_hash if hmac_signature else None, max_size
+        )
+    except BlobTooLarge:
+        return None, None, JsonResponse({
+            'success': False, 'error': f'Blobs are limited to {max_size} bytes'
+        }, status=413)
+
+    if hmac_signature:
+        try:
+            provided = base64.b64decode(hmac_signature)
+        except ValueError:
+            provided = b''
+        if not hmac.compare_digest(provided, digest):
+            upload.close()
+            return None, None, JsonResponse({
+                'success': False,
+                'error': 'HMAC verification failed'
+            }, status=401)
+    return upload, size, None
+
+
+def attach_blob(item, upload, size):
+    """Store ``upload`` as ``item``'s blob, replacing any previous one"""
+    previous = item.encrypted_blob.name if item.encrypted_blob else None
+    try:
+        item.encrypted_blob.save('blob', upload, save=False)
+    finally:
+        upload.close()
+    item.blob_size = size
+    item.encrypted_data = ''
+    try:
+        get_vault_storage().update_item(item)
+    except Exception:
+        # The item still points at the previous blob (or none)
+        blob_storage.delete(item.encrypted_blob.name)
+        raise
+    if previous:
+        blob_storage.delete(previous)
 
-    except Exception as e:
-        return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
 @csrf_exempt
-@require_http_methods(["GET", "PUT", "DELETE"])
-def user_data_detail(request, item_id):
-    """View to retrieve, update or delete a specific vault item"""
-    # Check for user authentication via session
-    user_id = request.session.get('login_data', {}).get('user_id')
-    if not user_id:
-        return JsonResponse({'success': False, 'error': 'Not authenticated'}, status=401)
+@require_http_methods(["GET", "HEAD", "PUT"])
+@vault_login_required
+def user_data_blob(request, item_id):
+    """
+    View to upload or download a vault item's ciphertext as raw bytes
 
+    PUT takes an application/octet-stream body (optionally signed with
+    X-HMAC over the raw bytes) and switches the item to blob mode. GET
+    serves the bytes back, honouring a single "Range: bytes=..." header.
+    """
     try:
-        user = CustomUser.objects.get(id=uuid.UUID(user_id))
+        user = request.vault_user
 
-        # Get the specific item, ensuring it belongs to this user
         try:
-            item = UserData.objects.get(item_id=item_id, user=user)
+            item = get_vault_storage().get_item(user, item_id)
         except UserData.DoesNotExist:
             return JsonResponse({'success': False, 'error': 'Item not found'}, status=404)
 
-        if request.method == "GET":
-            # Return the encrypted data for client-side decryption
+        if request.method == "PUT":
+            upload, size, error = receive_blob(request, user)
+            if error:
+                return error
+            attach_blob(item, upload, size)
             return JsonResponse({
                 'success': True,
                 'id': str(item.item_id),
-                'name': item.name,
-                'encrypted_data': item.encrypted_data,
-                'created_at': item.created_at.isoformat(),
+                'size': size,
                 'updated_at': item.updated_at.isoformat()
             })
 
-        elif request.method == "PUT":
-            # Update the item
-            data = json.loads(request.body)
-
-            # The client sends the already encrypted data
-            encrypted_data = data.get('encrypted_data')
-            name = data.get('name')
-
-            # Verify HMAC if provided (optional validation step)
-            hmac_signature = request.headers.get('X-HMAC')
-
-                # Implement HMAC verification logic here
-            if hmac_signature:
-                # Get user's HMAC words hash
-                hmac_words_hash = user.hmac_words_hash
-                if not hmac_words_hash:
-                    return JsonResponse({
-                        'success': False, 
-                        'error': 'HMAC key not configured for user'
-                    }, status=400)
-
-                # Compute HMAC of the encrypted data
-                computed_hmac = hmac.new(
-                    hmac_words_hash,
-                    encrypted_data.encode('utf-8'),
-                    hashlib.sha256
-                ).digest()
-
-                # Compare with provided HMAC (constant time comparison)
-                if not hmac.compare_digest(
-                    base64.b64decode(hmac_signature),
-                    computed_hmac
-                ):
-                    return JsonResponse({
-                        'success': False, 
-                        'error': 'HMAC verification failed'
-                    }, status=401)
-
-            # Update the item
-            item.encrypted_data = encrypted_data
-            if name:
-                item.name = name
-            item.save()
+        if not item.encrypted_blob:
+            return JsonResponse({'success': False, 'error': 'Item has no blob'}, status=404)
 
-            return JsonResponse({
+        size = item.blob_size
+        try:
+            byte_range = parse_range(request.headers.get('Range'), size)
+        except UnsatisfiableRange:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+        start, end = byte_range or (0, size - 1)
+        if request.method == "HEAD" or size == 0:
+            response = HttpResponse(content_type='application/octet-stream')
+        else:
+            response = StreamingHttpResponse(
+                iter_range(blob_storage.open(item.encrypted_blob.name, 'rb'), start, end),
+                content_type='application/octet-stream'
+            )
+        if byte_range:
+            response.status_code = 206
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1 if size else 0)
+        response['Accept-Ranges'] = 'bytes'
+        response['Cache-Control'] = 'no-store'
+        return response
+
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+@vault_login_required
+def user_data_batch(request):
+    """
+    View to fetch several vault items in one request
+
+    Body: {"ids": [item ids]}, at most VAULT_BATCH_MAX_ITEMS of them.
+    Returns {"items": [...], "missing": [ids not found]}, or with
+    ?format=ndjson (or Accept: application/x-ndjson) streams one item per
+    line, for up to VAULT_BATCH_STREAM_MAX_ITEMS ids. A complete stream ends
+    with a {"missing": [...]} line; one that failed part-way ends with an
+    {"error": ...} line instead.
+    """
+    try:
+        data = load_body(request)
+        item_ids = list(dict.fromkeys(uuid.UUID(str(item_id)) for item_id in data.get('ids', [])))
+    except (json.JSONDecodeError, AttributeError, TypeError, ValueError):
+        return JsonResponse({'success': False, 'error': 'ids must be a list of item ids'}, status=400)
+
+    stream = (request.GET.get('format') == 'ndjson'
+              or 'application/x-ndjson' in request.headers.get('Accept', ''))
+    if stream:
+        max_items = getattr(settings, 'VAULT_BATCH_STREAM_MAX_ITEMS', 5000)
+    else:
+        max_items = getattr(settings, 'VAULT_BATCH_MAX_ITEMS', 100)
+    if len(item_ids) > max_items:
+        return JsonResponse({
+            'success': False,
+            'error': f'At most {max_items} items per batch'
+        }, status=413)
+
+    try:
+        user = request.vault_user
+        items = get_vault_storage().get_items(user, item_ids)
+
+        if stream:
+            def lines():
+                # Runs after the view has returned (status 200 already sent),
+                # so a failure can only be reported in the body
+                missing = {str(item_id) for item_id in item_ids}
+                try:
+                    for item in items:
+                        missing.discard(str(item.item_id))
+                        yield json.dumps(vault_item_data(item)) + '\n'
+                except Exception as e:
+                    yield json.dumps({'error': str(e)}) + '\n'
+                    return
+                yield json.dumps({'missing': sorted(missing)}) + '\n'
+
+            return StreamingHttpResponse(lines(), content_type='application/x-ndjson')
+
+        with span('serialize'):
+            items_data = [vault_item_data(item) for item in items]
+            found = {item['id'] for item in items_data}
+            missing = [str(item_id) for item_id in item_ids if str(item_id) not in found]
+            return vault_response(request, {'success': True, 'items': items_data, 'missing': missing})
+
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+def verify_item_hmac(user, encrypted_data, signature):
+    """Check a base64 HMAC-SHA256 of ``encrypted_data`` under the user's HMAC key"""
+    computed_hmac = hmac.new(
+        bytes(user.hmac_words_hash),
+        encrypted_data.encode('utf-8'),
+        hashlib.sha256
+    ).digest()
+    try:
+        provided = base64.b64decode(signature)
+    except (TypeError, ValueError):
+        return False
+    return hmac.compare_digest(provided, computed_hmac)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+@vault_login_required
+def user_data_batch_write(request):
+    """
+    View to create, update and delete many vault items in one request
+
+    Body: {"operations": [...]}, at most VAULT_BATCH_WRITE_MAX_ITEMS of them:
+    - {"op": "create", "name": ..., "encrypted_data": ..., "hmac": ...}
+    - {"op": "update", "id": ..., "name": ..., "encrypted_data": ..., "hmac": ...}
+    - {"op": "delete", "id": ...}
+    "hmac" is optional and checked like the X-HMAC header. Every valid
+    operation is applied together; invalid ones are skipped. Returns one
+    result per operation, in order, with an HTTP-style status.
+    """
+    try:
+        operations = load_body(request).get('operations')
+        if not isinstance(operations, list):
+            raise ValueError
+    except (json.JSONDecodeError, AttributeError, ValueError):
+        return JsonResponse({'success': False, 'error': 'operations must be a list'}, status=400)
+
+    max_items = getattr(settings, 'VAULT_BATCH_WRITE_MAX_ITEMS', 500)
+    if len(operations) > max_items:
+        return JsonResponse({
+            'success': False,
+            'error': f'At most {max_items} operations per batch'
+        }, status=413)
+
+    try:
+        user = request.vault_user
+        storage = get_vault_storage()
+        results = [None] * len(operations)
+
+        def reject(index, op, item_id, status, error):
+            results[index] = {'index': index, 'op': op, 'id': item_id,
+                              'status': status, 'error': error}
+
+        # Validate every operation (and its HMAC) before touching storage
+        pending = []
+        targets = {}
+        for index, operation in enumerate(operations):
+            if not isinstance(operation, dict):
+                reject(index, None, None, 400, 'Operation must be an object')
+                continue
+            op = operation.get('op')
+            if op not in ('create', 'update', 'delete'):
+                reject(index, op, None, 400, 'op must be create, update or delete')
+                continue
+            item_id = None
+            if op != 'create':
+                try:
+                    item_id = uuid.UUID(str(operation.get('id')))
+                except ValueError:
+                    reject(index, op, operation.get('id'), 400, 'Invalid item id')
+                    continue
+            if op != 'delete':
+                encrypted_data = operation.get('encrypted_data')
+                if not isinstance(encrypted_data, str) or not encrypted_data:
+                    reject(index, op, item_id and str(item_id), 400, 'encrypted_data is required')
+                    continue
+                signature = operation.get('hmac')
+                if signature:
+                    if not user.hmac_words_hash:
+                        reject(index, op, item_id and str(item_id), 400,
+                               'HMAC key not configured for user')
+                        continue
+                    if not verify_item_hmac(user, encrypted_data, signature):
+                        reject(index, op, item_id and str(item_id), 401, 'HMAC verification failed')
+                        continue
+            if item_id is not None:
+                # Only operations that passed validation claim their item
+                if item_id in targets:
+                    reject(index, op, str(item_id), 409, 'Item appears more than once in batch')
+                    continue
+                targets[item_id] = index
+            pending.append((index, op, item_id, operation))
+
+        # One read for every item being changed
+        existing = {
+            item.item_id: item
+            for item in storage.get_items(user, [item_id for item_id in targets])
+        } if targets else {}
+
+        creates, updates, deletes = [], [], []
+        applied = []
+        for index, op, item_id, operation in pending:
+            if op == 'create':
+                item = UserData(
+                    user=user,
+                    name=operation.get('name') or 'Unnamed Item',
+                    encrypted_data=operation['encrypted_data'],
+                )
+                creates.append(item)
+            else:
+                item = existing.get(item_id)
+                if item is None:
+                    reject(index, op, str(item_id), 404, 'Item not found')
+                    continue
+                if op == 'update':
+                    item.encrypted_data = operation['encrypted_data']
+                    if operation.get('name'):
+                        item.name = operation['name']
+                    updates.append(item)
+                else:
+                    deletes.append(item)
+            applied.append((index, op, item))
+
+        # Updates of items changed or deleted since they were read are skipped
+        conflicts = {item.item_id for item in storage.apply_batch(user, creates, updates, deletes)}
+
+        for index, op, item in applied:
+            if op == 'update' and item.item_id in conflicts:
+                reject(index, op, str(item.item_id), 409, 'Item was modified or deleted')
+                continue
+            result = {'index': index, 'op': op, 'id': str(item.item_id),
+                      'status': 201 if op == 'create' else 200}
+            if op != 'delete':
+                result['updated_at'] = item.updated_at.isoformat()
+            results[index] = result
+
+        return JsonResponse({'success': True, 'results': results})
+
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["GET"])
+@vault_login_required
+def user_data_sync(request):
+    """
+    View to fetch only what changed in the vault since the client's last sync
+
+    Query parameters:
+    - since: the sync_token from the previous response (omit for a full sync)
+
+    Returns {"changed": [...], "deleted": [ids], "sync_token": ..., "has_more": bool}.
+    Keep calling with the new sync_token while has_more is true. A token older
+    than the tombstone retention gets 410 and the client must sync from scratch.
+    """
+    try:
+        user = request.vault_user
+        changed, deleted, sync_token, has_more = get_vault_storage().changes_since(
+            user, request.GET.get('since'), sync_settings()['max_items']
+        )
+        with span('serialize'):
+            return vault_response(request, {
                 'success': True,
-                'id': str(item.item_id),
-                'updated_at': item.updated_at.isoformat()
+                'changed': [vault_item_data(item) for item in changed],
+                'deleted': [str(item_id) for item_id in deleted],
+                'sync_token': sync_token,
+                'has_more': has_more,
             })
 
+    except SyncTokenExpired:
+        return JsonResponse({'success': False, 'error': 'Sync token expired', 'resync': True}, status=410)
+    except InvalidCursor:
+        return JsonResponse({'success': False, 'error': 'Invalid sync token'}, status=400)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["GET", "PUT", "DELETE"])
+@vault_login_required
+def user_data_detail(request, item_id):
+    """View to retrieve, update or delete a specific vault item"""
+    try:
+        user = request.vault_user
+
+        storage = get_vault_storage()
+
+        try:
+            if request.method == "GET" and request.headers.get('If-None-Match'):
+                # Revalidation: compare versions before reading the payload
+                etag = item_etag(item_id, storage.get_version(user, item_id), representation(request))
+                if etag_matches(request.headers['If-None-Match'], etag, weak=True):
+                    return not_modified(etag, vary_headers())
+
+            # Get the specific item, ensuring it belongs to this user
+            item = storage.get_item(user, item_id)
+        except UserData.DoesNotExist:
+            return JsonResponse({'success': False, 'error': 'Item not found'}, status=404)
+
+        if request.method == "GET":
+            return item_response(request, item)
+
+        elif request.method == "PUT":
+            expected_versions, error = prepare_item_update(request, user, item)
+            if error:
+                return error
+            try:
+                storage.update_item(item, expected_versions)
+            except VersionConflict:
+                return precondition_failed(item)
+            return updated_response(item)
+
         elif request.method == "DELETE":
             # Delete the item
-            item.delete()
+            storage.delete_item(item)
+            return JsonResponse({'success': True, 'message': 'Item deleted'})
+
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+@vault_login_required
+async def user_data_detail_async(request, item_id):
+    """``user_data_detail`` for ASGI workers"""
+    if request.method not in ("GET", "PUT", "DELETE"):
+        return HttpResponseNotAllowed(["GET", "PUT", "DELETE"])
+    try:
+        user = request.vault_user
+        storage = get_vault_storage()
+
+        try:
+            if request.method == "GET" and request.headers.get('If-None-Match'):
+                etag = item_etag(
+                    item_id, await storage.aget_version(user, item_id), representation(request)
+                )
+                if etag_matches(request.headers['If-None-Match'], etag, weak=True):
+                    return not_modified(etag, vary_headers())
+            item = await storage.aget_item(user, item_id)
+        except UserData.DoesNotExist:
+            return JsonResponse({'success': False, 'error': 'Item not found'}, status=404)
+
+        if request.method == "GET":
+            return item_response(request, item)
+
+        elif request.method == "PUT":
+            expected_versions, error = prepare_item_update(request, user, item)
+            if error:
+                return error
+            try:
+                await storage.aupdate_item(item, expected_versions)
+            except VersionConflict:
+                return precondition_failed(item)
+            return updated_response(item)
+
+        else:
+            await storage.adelete_item(item)
             return JsonResponse({'success': True, 'message': 'Item deleted'})
 
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
+
+user_data_detail_async.csrf_exempt = True
+
+
+def item_response(request, item):
+    # Return the encrypted data for client-side decryption
+    with span('serialize'):
+        response = vault_response(request, {'success': True, **vault_item_data(item)})
+    return with_etag(response, item_etag(item.item_id, item.version, representation(request)))
+
+
+def hmac_error(request, user, encrypted_data):
+    """
+    Verify the optional X-HMAC header over ``encrypted_data``; return an
+    error response when it is sent and doesn't check out, else None.
+    """
+    hmac_signature = request.headers.get('X-HMAC')
+    if not hmac_signature:
+        return None
+    if not user.hmac_words_hash:
+        return JsonResponse({
+            'success': False, 
+            'error': 'HMAC key not configured for user'
+        }, status=400)
+    if not verify_item_hmac(user, encrypted_data, hmac_signature):
+        return JsonResponse({
+            'success': False, 
+            'error': 'HMAC verification failed'
+        }, status=401)
+    return None
+
+
+def prepare_item_update(request, user, item):
+    """
+    Apply a PUT body to ``item``. Returns ``(expected_versions, None)``
+    or ``(None, error_response)``.
+    """
+    # Optimistic concurrency: with If-Match the write only goes
+    # through while the item is still at a version the client saw
+    expected_versions = None
+    if request.headers.get('If-Match'):
+        expected_versions = if_match_versions(request.headers['If-Match'], item.item_id)
+        if expected_versions is not None and item.version not in expected_versions:
+            return None, precondition_failed(item)
+
+    data = load_body(request)
+
+    # The client sends the already encrypted data
+    encrypted_data = data.get('encrypted_data')
+    name = data.get('name')
+
+    error = hmac_error(request, user, encrypted_data)
+    if error:
+        return None, error
+
+    item.encrypted_data = encrypted_data
+    if name:
+        item.name = name
+    return expected_versions, None
+
+
+def updated_response(item):
+    response = JsonResponse({
+        'success': True,
+        'id': str(item.item_id),
+        'updated_at': item.updated_at.isoformat(),
+        'version': item.version,
+    })
+    return with_etag(response, item_etag(item.item_id, item.version))
+
 @csrf_exempt
 @require_http_methods(["POST"])
+@vault_login_required
 def user_data_create(request):
     """View to create a new vault item"""
-    # Check for user authentication via session
-    user_id = request.session.get('login_data', {}).get('user_id')
-    if not user_id:
-        return JsonResponse({'success': False, 'error': 'Not authenticated'}, status=401)
-
     try:
-        user = CustomUser.objects.get(id=uuid.UUID(user_id))
+        user = request.vault_user
+
+        if request.content_type == 'application/octet-stream':
+            return create_blob_item(request, user)
 
         # Process the data from the request
-        data = json.loads(request.body)
+        data = load_body(request)
 
         # The client sends the already encrypted data
         encrypted_data = data.get('encrypted_data')
         name = data.get('name', 'Unnamed Item')
 
         # Verify HMAC if provided (optional validation step)
-        hmac_signature = request.headers.get('X-HMAC')
-
-        if hmac_signature:
-    # Get user's HMAC words hash
-            hmac_words_hash = user.hmac_words_hash
-            if not hmac_words_hash:
-                return JsonResponse({
-                    'success': False, 
-                    'error': 'HMAC key not configured for user'
-                }, status=400)
-
-            # Compute HMAC of the encrypted data
-            computed_hmac = hmac.new(
-                hmac_words_hash,
-                encrypted_data.encode('utf-8'),
-                hashlib.sha256
-            ).digest()
-
-            # Compare with provided HMAC
-            if not hmac.compare_digest(
-                base64.b64decode(hmac_signature),
-                computed_hmac
-            ):
-                return JsonResponse({
-                    'success': False, 
-                    'error': 'HMAC verification failed'
-                }, status=401)
-
+        error = hmac_error(request, user, encrypted_data)
+        if error:
+            return error
 
         # Create the new item
-        new_item = UserData.objects.create(
-            user=user,
-            encrypted_data=encrypted_data,
-            name=name
+        new_item = get_vault_storage().create_item(
+            user,
+            name=name,
+            encrypted_data=encrypted_data
         )
+        return created_response(new_item)
 
-        return JsonResponse({
-            'success': True,
-            'id': str(new_item.item_id),
-            'name': new_item.name,
-            'created_at': new_item.created_at.isoformat()
-        }, status=201)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+@vault_login_required
+async def user_data_create_async(request):
+    """
+    ``user_data_create`` for ASGI workers. Binary uploads are spooled to
+    disk by the sync path in a thread.
+    """
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+    try:
+        user = request.vault_user
+
+        if request.content_type == 'application/octet-stream':
+            return await sync_to_async(create_blob_item)(request, user)
+
+        data = load_body(request)
+        encrypted_data = data.get('encrypted_data')
+        name = data.get('name', 'Unnamed Item')
+
+        error = hmac_error(request, user, encrypted_data)
+        if error:
+            return error
+
+        new_item = await get_vault_storage().acreate_item(
+            user,
+            name=name,
+            encrypted_data=encrypted_data
+        )
+        return created_response(new_item)
 
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
+
+user_data_create_async.csrf_exempt = True
+
+
+def create_blob_item(request, user):
+    # Binary mode: the body is the raw ciphertext, the name a query parameter
+    upload, size, error = receive_blob(request, user)
+    if error:
+        return error
+    new_item = get_vault_storage().create_item(
+        user,
+        name=request.GET.get('name', 'Unnamed Item'),
+        encrypted_data=''
+    )
+    attach_blob(new_item, upload, size)
+    return created_response(new_item, size=size)
+
+
+def created_response(item, **extra):
+    response = JsonResponse({
+        'success': True,
+        'id': str(item.item_id),
+        'name': item.name,
+        **extra,
+        'created_at': item.created_at.isoformat(),
+        'version': item.version,
+    }, status=201)
+    return with_etag(response, item_etag(item.item_id, item.version))
+
 def generate_random_words(num_words=10):
     """Generate random words for authentication and HMAC"""
-    # Load word list - in production, this should be a larger wordlist
-    # Use a file from your CLI directory
-    word_list_path = os.path.join(settings.BASE_DIR, 'cli', 'my_list1.txt')
-    try:
-        with open(word_list_path, 'r') as f:
-            word_list = f.read().splitlines()
-    except FileNotFoundError:
-        # Fallback to a smaller list if file not found
-        word_list = [
-            "apple", "banana", "orange", "grape", "melon", "car", "house", 
-            "tree", "phone", "book", "computer", "table", "chair", "window", 
-            "door", "mountain", "river", "ocean", "forest", "cloud", "sun", 
-            "moon", "star", "planet", "galaxy", "music", "song", "dance", 
-            "paint", "color", "light", "dark", "happy", "sad", "angry"
-        ]
-
-    # Filter out inappropriate words if needed
-
-    # Select random words
-    if len(word_list) < num_words:
-        # If word list is too small, allow duplicates
-        return [random.choice(word_list) for _ in range(num_words)]
-    else:
-        # No duplicates if enough words
-        return random.sample(word_list, num_words)
\ No newline at end of file
+    # The word list is loaded (and filtered against cli/DirtyWords.json)
+    # once per worker by PasswordManagerConfig.ready
+    return get_word_list().sample(num_words)
@@ -3,6 +3,10 @@ ASGI config for security_tools project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it with an ASGI server (e.g. ``uvicorn security_tools.asgi:application``)
+so async views such as ``password_manager.views.registration_qr`` run on the
+event loop instead of a per-request thread.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
 """
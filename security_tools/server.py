@@ -0,0 +1,92 @@
+"""
+Worker sizing for the production server profiles in gunicorn.conf.py.
+
+The worker count is the smaller of a CPU bound (2 * cores + 1 sync
+workers, or one event loop per core under uvicorn) and a memory bound:
+each worker needs its baseline RSS plus the most its password hashing pool
+can reserve at once (PASSWORD_HASHING), and together they must fit in the
+container's memory limit minus a reserve for the master and the OS.
+Settings that only work in one process are refused with several workers.
+"""
+import os
+
+MiB = 1024 * 1024
+
+
+def cpu_count():
+    """Cores this process may use, honouring affinity and a cgroup v2 CPU quota"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def memory_limit():
+    """Bytes of memory available to this container: its cgroup limit, else RAM"""
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        # cgroup v1 reports "no limit" as a huge number
+        if value != "max" and int(value) < 1 << 60:
+            return int(value)
+    return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+
+
+def hashing_memory():
+    """
+    The most memory one worker's hashing pool can hold: WORKERS jobs of the
+    preferred hasher, capped by MEMORY_BUDGET. Needs Django settings.
+    """
+    from django.conf import settings
+    from django.contrib.auth.hashers import get_hasher
+    from password_manager.utils.hashing import hasher_memory
+
+    config = getattr(settings, "PASSWORD_HASHING", {})
+    peak = config.get("WORKERS", 2) * hasher_memory(get_hasher("default"))
+    return min(peak, config.get("MEMORY_BUDGET", 512 * MiB))
+
+
+def worker_count(profile, cpus, memory, per_worker, reserve=256 * MiB):
+    """Workers for ``profile`` ("sync" or "uvicorn") on ``cpus`` cores and ``memory`` bytes"""
+    by_cpu = cpus if profile == "uvicorn" else 2 * cpus + 1
+    by_memory = (memory - reserve) // per_worker
+    return max(1, min(by_cpu, by_memory))
+
+
+# Cache backends whose entries stay in the process that wrote them
+PROCESS_LOCAL_CACHES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def check_shared_state(workers):
+    """
+    Raise RuntimeError if ``workers`` processes can't share state the
+    settings need shared: with login tokens on, a logout or revocation is
+    recorded in the denylist cache, and a per-process cache would only tell
+    the worker that handled it. Needs Django settings.
+    """
+    from django.conf import settings
+    from password_manager.utils.tokens import token_settings
+
+    config = token_settings()
+    if workers < 2 or not config["enabled"]:
+        return
+    alias = config["denylist_cache_alias"]
+    if settings.CACHES[alias]["BACKEND"] in PROCESS_LOCAL_CACHES:
+        raise RuntimeError(
+            f"LOGIN_TOKENS needs a shared DENYLIST_CACHE_ALIAS with {workers} workers; "
+            f"the {alias!r} cache is per process (set CACHE_URL)"
+        )
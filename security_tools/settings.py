@@ -46,6 +46,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "password_manager.middleware.InstrumentationMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -90,20 +91,120 @@ DATABASES = {
         "PASSWORD": os.environ.get("DB_PASSWORD", ""),
         "HOST": os.environ.get("DB_HOST", "localhost"),
         "PORT": os.environ.get("DB_PORT", "5432"),
+        # Keep connections open between requests (seconds) and check them
+        # before reuse, so a request doesn't pay for a new TCP + auth handshake
+        "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", "60")),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {"connect_timeout": 5},
     },
-    "dynamodb": {
-        "ENGINE": "django_dynamodb",  # This is a placeholder - you'll use boto3 directly
-        "REGION": os.environ.get("AWS_REGION", "us-east-1"),
-        "ENDPOINT_URL": os.environ.get("DYNAMODB_ENDPOINT_URL", None),
-    }
 }
 
-# To enable AWS RDS PostgreSQL as the default database, uncomment the following:
-# DATABASES["default"] = DATABASES["postgres"]
+# In-process connection pool (password_manager.utils.postgresql_pool): set
+# DB_POOL_MAX_SIZE to hand connections back to a per-worker pool at the end
+# of each request instead of keeping one per thread. Use it with threaded
+# workers; sync workers are served as well by CONN_MAX_AGE.
+if os.environ.get("DB_POOL_MAX_SIZE"):
+    DATABASES["postgres"].update({
+        "ENGINE": "password_manager.utils.postgresql_pool",
+        "CONN_MAX_AGE": 0,
+    })
+    DATABASES["postgres"]["OPTIONS"]["pool"] = {
+        "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", "1")),
+        "max_size": int(os.environ.get("DB_POOL_MAX_SIZE")),
+        "timeout": float(os.environ.get("DB_POOL_TIMEOUT", "5")),
+    }
+
+# Read replica: with DB_REPLICA_HOST set, vault listings are read from the
+# "replica" alias (see DatabaseRouter). Writes and everything else stay on
+# default. Replication lag means a listing may briefly miss a new item.
+if os.environ.get("DB_REPLICA_HOST"):
+    DATABASES["replica"] = {
+        **DATABASES["postgres"],
+        "HOST": os.environ["DB_REPLICA_HOST"],
+        "PORT": os.environ.get("DB_REPLICA_PORT", DATABASES["postgres"]["PORT"]),
+        "OPTIONS": dict(DATABASES["postgres"]["OPTIONS"]),
+        "TEST": {"MIRROR": "default"},
+    }
+VAULT_READ_REPLICA = "replica" if "replica" in DATABASES else None
+
+# To enable AWS RDS PostgreSQL as the default database, set DB_DEFAULT=postgres
+if os.environ.get("DB_DEFAULT") == "postgres":
+    DATABASES["default"] = DATABASES["postgres"]
 
 # Configure database router
 DATABASE_ROUTERS = ['password_manager.utils.db_router.DatabaseRouter']
 
+# Vault item storage (password_manager.utils.vault_storage)
+# ORMVaultStorage keeps UserData in the default database. To use the UserVault
+# table created by password_manager/utils/dynamodb_setup.py instead, set
+# VAULT_STORAGE_BACKEND=password_manager.utils.vault_storage.DynamoDBVaultStorage
+# (and DYNAMODB_ENDPOINT_URL for DynamoDB Local).
+
+VAULT_STORAGE = {
+    "BACKEND": os.environ.get(
+        "VAULT_STORAGE_BACKEND", "password_manager.utils.vault_storage.ORMVaultStorage"
+    ),
+    "OPTIONS": {
+        "TABLE_NAME": os.environ.get("DYNAMODB_VAULT_TABLE", "UserVault"),
+        "REGION": os.environ.get("AWS_REGION", "us-east-1"),
+        "ENDPOINT_URL": os.environ.get("DYNAMODB_ENDPOINT_URL", None),
+        "MAX_POOL_CONNECTIONS": 10,
+        # Local secondary index used for newest-first listing; None for
+        # tables created without it
+        "UPDATED_AT_INDEX": "updated_at-index",
+    },
+}
+
+# Vault listing page size (user_data_list ?limit=)
+VAULT_PAGE_SIZE = 50
+VAULT_MAX_PAGE_SIZE = 200
+
+# Most item ids accepted by one vault/items/batch/ request, and by one that
+# streams its items back as NDJSON (nothing is buffered, so it can be larger)
+VAULT_BATCH_MAX_ITEMS = 100
+VAULT_BATCH_STREAM_MAX_ITEMS = 5000
+
+# Most operations accepted by one vault/items/batch-write/ request
+VAULT_BATCH_WRITE_MAX_ITEMS = 500
+
+# Binary vault items (vault/items/<id>/blob/) live in this Django storage;
+# set VAULT_BLOB_STORAGE_BACKEND=storages.backends.s3boto3.S3Boto3Storage
+# (and the AWS_STORAGE_BUCKET_NAME etc. django-storages settings) for S3
+VAULT_BLOB_STORAGE = {
+    "BACKEND": os.environ.get(
+        "VAULT_BLOB_STORAGE_BACKEND", "django.core.files.storage.FileSystemStorage"
+    ),
+    "OPTIONS": {},
+}
+if VAULT_BLOB_STORAGE["BACKEND"].endswith("FileSystemStorage"):
+    VAULT_BLOB_STORAGE["OPTIONS"]["location"] = os.environ.get(
+        "VAULT_BLOB_ROOT", BASE_DIR / "vault_blobs"
+    )
+VAULT_BLOB_MAX_SIZE = 100 * 1024 * 1024
+
+# Delta sync (vault/sync/): items per response, how far each final token
+# steps back to catch concurrent writes, and how long deletions are kept
+VAULT_SYNC = {
+    "MAX_ITEMS": 500,
+    "OVERLAP_SECONDS": 2,
+    "TOMBSTONE_RETENTION_DAYS": 90,
+}
+
+# Vault listings (user_data_list) are compressed per Accept-Encoding once at
+# least MIN_SIZE bytes: zstd or brotli when zstandard/brotli are installed,
+# else gzip. Responses can also be negotiated as MessagePack or CBOR (with
+# msgpack/cbor2 installed), carrying raw ciphertext instead of base64.
+VAULT_COMPRESSION = {
+    "ENABLED": True,
+    "MIN_SIZE": 1024,
+}
+
+# Serve login and the vault list/detail/create endpoints with their native
+# async views (views.*_async). Turn on when running under an ASGI server
+# (uvicorn security_tools.asgi:application); under WSGI the sync views are
+# cheaper, as each async view would run in its own event loop.
+ASYNC_VIEWS = os.environ.get("ASYNC_VIEWS_ENABLED", "false").lower() == "true"
+
 AUTH_USER_MODEL = "password_manager.CustomUser"
 
 # Password validation
@@ -133,9 +234,16 @@ PASSWORD_HASHERS = [
     "password_manager.hashers.MyScryptPasswordHasher",
 ]
 
-# PASSWORD_SCRYPT_N = 2**15
-# PASSWORD_SCRYPT_SCRYPT_R = 8
-# PASSWORD_SCRYPT_SCRYPT_P = 3
+# Hasher cost parameters, read by password_manager.hashers.
+# Regenerate for a host with `python manage.py calibrate_hashers`.
+
+PASSWORD_ARGON2_TIME_COST = 3
+PASSWORD_ARGON2_MEMORY_COST = 12 * 1024  # KiB
+PASSWORD_ARGON2_PARALLELISM = 1
+
+PASSWORD_SCRYPT_N = 2**15
+PASSWORD_SCRYPT_R = 8
+PASSWORD_SCRYPT_P = 1
 
 # Internationalization
 # https://docs.djangoproject.com/en/4.1/topics/i18n/
@@ -157,3 +265,142 @@ STATIC_URL = "static/"
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# Registration word list
+# Loaded once per worker process by password_manager.apps.PasswordManagerConfig
+
+WORD_LIST_PATH = BASE_DIR / "cli" / "my_list1.txt"
+DIRTY_WORDS_PATH = BASE_DIR / "cli" / "DirtyWords.json"
+# Re-stat the files on every draw and rebuild the index when they change
+WORD_LIST_RELOAD_ON_CHANGE = DEBUG
+
+# TOTP QR code rendering
+# Rendered on a bounded pool by the registration_qr view; when WORKERS jobs are
+# running and MAX_PENDING more are queued, further requests get a 503.
+# EXECUTOR is "thread" or "process".
+
+QR_RENDER_POOL = {
+    "WORKERS": 2,
+    "MAX_PENDING": 16,
+    "EXECUTOR": "thread",
+}
+# "svg" and "matrix" are built without Pillow; "png" uses it
+QR_CODE_FORMAT = "svg"
+
+# Password hashing pool
+# set_password/check_password run on a dedicated executor. Each job reserves
+# its hasher's memory (12 MiB for Argon2, 32 MiB for scrypt) from
+# MEMORY_BUDGET; jobs wait up to QUEUE_TIMEOUT seconds for admission, at most
+# MAX_QUEUE may wait, and the rest get a 503 with Retry-After: RETRY_AFTER.
+
+PASSWORD_HASHING = {
+    "WORKERS": 4,
+    "MEMORY_BUDGET": 512 * 1024 * 1024,
+    "QUEUE_TIMEOUT": 2.0,
+    "MAX_QUEUE": 32,
+    "RETRY_AFTER": 1,
+}
+
+# Prometheus-format metrics at password_manager/metrics/ (per worker process).
+# Off by default: they show throttle rejections and hashing queue and timing
+# data. When on, only scrapers connecting from METRICS_ALLOWED_IPS or sending
+# "Authorization: Bearer <METRICS_TOKEN>" are served.
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "false").lower() == "true"
+METRICS_ALLOWED_IPS = [
+    ip.strip() for ip in os.environ.get("METRICS_ALLOWED_IPS", "127.0.0.1,::1").split(",")
+    if ip.strip()
+]
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+# Per-request timing (password_manager.middleware.InstrumentationMiddleware):
+# view duration, DB time and query count, and spans such as hash, qr and
+# serialize, exported as view_* metrics. SERVER_TIMING also sends them to the
+# client in a Server-Timing header; turn it off where the header would tell
+# an attacker more than it should (it exposes e.g. hashing time).
+INSTRUMENTATION = {
+    "ENABLED": os.environ.get("INSTRUMENTATION_ENABLED", "false").lower() == "true",
+    "SERVER_TIMING": True,
+}
+
+# Cache and sessions. Without CACHE_URL everything stays in this process: an
+# LRU LocMemCache, DB-backed sessions and the in-process TOTP device cache
+# (right for a single worker). Set CACHE_URL=redis://host:6379/0 for several
+# workers or nodes: the cache, sessions and TOTP device lookups then all go
+# through the Redis-protocol server. `manage.py resp_server` runs a small
+# stand-in server for local development.
+CACHE_URL = os.environ.get("CACHE_URL")
+
+if CACHE_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_URL,
+            "KEY_PREFIX": "password-manager",
+        }
+    }
+    SESSION_ENGINE = "django.contrib.sessions.backends.cache"
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "password-manager",
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        }
+    }
+    SESSION_ENGINE = "django.contrib.sessions.backends.db"
+SESSION_ENGINE = os.environ.get("SESSION_ENGINE", SESSION_ENGINE)
+
+# Per-user TOTP device cache (password_manager.utils.device_cache)
+# In-process LRU by default, or SHARED_CACHE_ALIAS to share entries between
+# workers. Only the device's configuration is cached; last_t and throttling
+# state always come from the database, so either is safe with many workers.
+
+TOTP_DEVICE_CACHE = {
+    "MAX_SIZE": 1024,
+    "TTL": 30,
+    "SHARED_CACHE_ALIAS": "default" if CACHE_URL else None,
+}
+
+# Seconds a registration may stay pending between initial_registration and
+# complete_registration; `manage.py purge_pending_registrations` deletes
+# older placeholders (schedule it, e.g. every 15 minutes)
+PENDING_REGISTRATION_TTL = 3600
+
+# Stateless login: login_step1 issues a signed token instead of writing the
+# session, login_step2 returns a bearer access token for the vault endpoints.
+# Logged-out/revoked tokens are kept in the DENYLIST_CACHE_ALIAS cache, which
+# must be shared between workers in production: gunicorn.conf.py refuses to
+# start several workers while it is a per-process cache (no CACHE_URL).
+LOGIN_TOKENS = {
+    "ENABLED": os.environ.get("LOGIN_TOKENS_ENABLED", "false").lower() == "true",
+    "SECRET_KEY": os.environ.get("LOGIN_TOKEN_SECRET_KEY"),
+    "ALGORITHM": "HS256",
+    "LOGIN_TTL": 900,
+    "ACCESS_TTL": 3600,
+    "DENYLIST_CACHE_ALIAS": "default",
+}
+
+# Brute-force throttling (password_manager.utils.throttling): sliding-window
+# limits per scope, as (requests, window seconds) per key. Counters live in
+# CACHE_ALIAS: in-process by default, shared when CACHE_URL is set. Without
+# CACHE_URL every worker process counts on its own, so under the gunicorn
+# profiles (several workers) each limit is effectively multiplied by the
+# worker count; set CACHE_URL whenever more than one worker serves logins.
+# Set IP_HEADER (e.g. "HTTP_X_FORWARDED_FOR") only behind a trusted proxy.
+THROTTLING = {
+    "ENABLED": True,
+    "CACHE_ALIAS": "default",
+    "IP_HEADER": None,
+    "RULES": {
+        "login_step1": {"ip": (30, 60), "user": (10, 60), "username": (10, 60)},
+        "login_step2": {"ip": (30, 60), "user": (5, 60)},
+        "verify_totp": {"ip": (30, 60), "user": (5, 60)},
+    },
+}
+
+# Per-worker cache of the user fields vault views need (id, hmac_words_hash),
+# so vault requests skip the CustomUser query. Dropped on user save/delete.
+VAULT_PRINCIPAL_CACHE = {
+    "MAX_SIZE": 4096,
+    "TTL": 10,
+}